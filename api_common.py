@@ -0,0 +1,188 @@
+# api_common.py
+"""
+同步 (Flask) 與非同步 (async_app.py) 兩種服務模式共用的請求驗證與回應格式。
+
+兩邊的路由只負責 I/O (資料庫查詢、HTTP 框架)，參數解析、分頁游標、對獎結果格式與
+開獎資料的 ETag 都在這裡實作 (資料列與 JSON 編碼見 serializers.py)，確保兩種模式對同一個請求回傳完全相同的內容。
+"""
+import base64
+import binascii
+import hashlib
+import os
+from datetime import date, datetime
+
+# 列表 API 每頁預設與最大筆數
+DEFAULT_PAGE_LIMIT = int(os.getenv('DEFAULT_PAGE_LIMIT', '100'))
+MAX_PAGE_LIMIT = int(os.getenv('MAX_PAGE_LIMIT', '1000'))
+# 串流模式下伺服器端游標每次取回的筆數
+STREAM_YIELD_PER = int(os.getenv('STREAM_YIELD_PER', '1000'))
+
+STREAM_MIMETYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson"
+}
+
+# 獎項資料的快取時間 (秒)：max-age 給瀏覽器，s-maxage 給 CDN / 反向代理
+AWARDS_CACHE_MAX_AGE = int(os.getenv('AWARDS_CACHE_MAX_AGE', '60'))
+AWARDS_CACHE_S_MAXAGE = int(os.getenv('AWARDS_CACHE_S_MAXAGE', '600'))
+AWARDS_CACHE_CONTROL = f"public, max-age={AWARDS_CACHE_MAX_AGE}, s-maxage={AWARDS_CACHE_S_MAXAGE}"
+
+INVALID_JSON_MESSAGE = "請求數據無效，請提供JSON格式數據"
+
+# 中獎發票的領獎期間：開獎日次月 6 日起 3 個月
+CLAIM_PERIOD_MONTHS = 3
+
+
+def encode_cursor(sort_date, row_id):
+    """
+    將排序鍵 (日期, ID) 編碼成不透明的分頁游標字串。
+    """
+    raw = f"{sort_date.isoformat()}|{row_id}".encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    解析分頁游標，回傳 (日期, ID)；格式錯誤時拋出 ValueError。
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_date_str, row_id_str = base64.urlsafe_b64decode(padded).decode('ascii').split('|')
+        return datetime.strptime(sort_date_str, '%Y-%m-%d').date(), int(row_id_str)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError("cursor 無效")
+
+
+def parse_list_args(args):
+    """
+    解析列表 API 的查詢參數 (limit、cursor、stream)，回傳 (stream_format, limit, cursor)。
+    cursor 為解析後的 (日期, ID) 或 None；串流模式未指定 limit 時 limit 為 None (不限筆數)。
+    參數錯誤時拋出 ValueError (訊息可直接回傳給使用者)。
+    """
+    stream_format = args.get('stream')
+    if stream_format is not None and stream_format not in STREAM_MIMETYPES:
+        raise ValueError("stream 參數只支援 json 或 ndjson")
+
+    limit_arg = args.get('limit')
+    if limit_arg is None:
+        limit = None if stream_format else DEFAULT_PAGE_LIMIT
+    else:
+        try:
+            limit = int(limit_arg)
+        except ValueError:
+            raise ValueError("limit 應為正整數")
+        if limit < 1:
+            raise ValueError("limit 應為正整數")
+        if not stream_format:
+            limit = min(limit, MAX_PAGE_LIMIT)
+
+    cursor = args.get('cursor')
+    return stream_format, limit, decode_cursor(cursor) if cursor else None
+
+
+def awards_etag(version, query_string):
+    """
+    以開獎資料版本號與查詢參數 (bytes) 組成強 ETag，讓不同分頁、格式的回應各自快取。
+    """
+    return f"awards-v{version}-{hashlib.sha1(query_string).hexdigest()[:12]}"
+
+
+def award_date_for_purchase_date(purchase_date):
+    """
+    由發票開立 (購買) 日期推算該期的開獎日期 (parse_award_date_from_period 的反向)。
+    每期為單數月份起始的兩個月，在下一個單數月份的 25 日開獎，
+    例如 2024-02-10 開立的發票在 2024-03-25 開獎，2024-12-31 開立的在 2025-01-25 開獎。
+    """
+    award_month = purchase_date.month + (2 if purchase_date.month % 2 == 1 else 1)
+    if award_month > 12:
+        return date(purchase_date.year + 1, award_month - 12, 25)
+    return date(purchase_date.year, award_month, 25)
+
+
+def claim_deadline(award_date):
+    """
+    回傳該期中獎發票的領獎截止日 (開獎日次月 6 日起 CLAIM_PERIOD_MONTHS 個月，即之後某月的 5 日)。
+    例如 2024-03-25 開獎的發票可領獎至 2024-07-05。
+    """
+    month_index = award_date.year * 12 + award_date.month - 1 + 1 + CLAIM_PERIOD_MONTHS
+    return date(month_index // 12, month_index % 12 + 1, 5)
+
+
+def claimable_award_dates(today):
+    """
+    回傳截至 today 已開獎且尚未超過領獎期限的開獎日期 (由新至舊)。
+    """
+    award_year, award_month = today.year, today.month
+    if award_month % 2 == 0:
+        award_month -= 1
+    elif today.day < 25:
+        award_month -= 2
+    award_dates = []
+    while True:
+        if award_month < 1:
+            award_month += 12
+            award_year -= 1
+        award_date = date(award_year, award_month, 25)
+        if claim_deadline(award_date) < today:
+            return award_dates
+        award_dates.append(award_date)
+        award_month -= 2
+
+
+def parse_check_item(data):
+    """
+    驗證並清理單筆對獎資料。
+    開獎日期可直接以 invoice_date 指定，或以 purchase_date (發票開立日期) 自動推算。
+    成功時回傳 (invoice_number, check_date, None)；失敗時回傳 (None, None, 錯誤訊息)。
+    """
+    if not isinstance(data, dict):
+        return None, None, INVALID_JSON_MESSAGE
+
+    date_field = 'invoice_date' if 'invoice_date' in data or 'purchase_date' not in data else 'purchase_date'
+    required_fields = ['invoice_number', date_field]
+    for field in required_fields:
+        if field not in data:
+            return None, None, f"缺少必要欄位: {field}"
+
+    if not isinstance(data['invoice_number'], str):
+        return None, None, "發票號碼應為8位數字"
+    invoice_number = data['invoice_number'].strip().replace('-', '') # 清理發票號碼
+    try:
+        check_date = datetime.strptime(data[date_field], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None, None, f"{date_field} 格式不正確，應為YYYY-MM-DD"
+    if date_field == 'purchase_date':
+        check_date = award_date_for_purchase_date(check_date)
+
+    if len(invoice_number) != 8 or not invoice_number.isdigit(): # 增加數字檢查
+        return None, None, "發票號碼應為8位數字"
+
+    return invoice_number, check_date, None
+
+
+def no_award_data_message(check_date):
+    return f"該開獎日期 ({check_date.isoformat()}) 無任何獎項資料，無法檢核"
+
+
+def build_check_result(invoice_number, check_date, award_match):
+    """
+    將對獎結果組成 check_invoice 的回應格式。
+    """
+    if award_match is not None:
+        return {
+            "message": award_match.message,
+            "invoice_number": invoice_number,
+            "invoice_date": check_date.isoformat(),
+            "winning_status": True,
+            "award_details": {
+                "prize_name": award_match.prize_name,
+                "winning_numbers": award_match.winning_numbers
+            }
+        }
+    return {
+        "message": "很抱歉，您的發票未中獎。",
+        "invoice_number": invoice_number,
+        "invoice_date": check_date.isoformat(),
+        "winning_status": False,
+        "award_details": None
+    }
@@ -1,34 +1,98 @@
 import os
+import calendar
+import json
+import logging
+import re
+import click
 import requests
-from flask import Flask, jsonify, request, render_template
+import threading
+from flask import (
+    Flask, Response, jsonify, make_response, request, render_template, send_file, stream_with_context, url_for
+)
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, Date, Boolean, ForeignKey
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Date, DateTime, Boolean, ForeignKey, Index, Computed,
+    and_, case, func, or_, text, tuple_
+)
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship
 from dotenv import load_dotenv
-from datetime import datetime
-from bs4 import BeautifulSoup
+from contextlib import contextmanager
+from datetime import datetime, date, time, timedelta
+from zoneinfo import ZoneInfo
 from flask_apscheduler import APScheduler
+from api_common import (
+    AWARDS_CACHE_CONTROL, INVALID_JSON_MESSAGE, STREAM_MIMETYPES, STREAM_YIELD_PER,
+    award_date_for_purchase_date, awards_etag, build_check_result, claim_deadline, claimable_award_dates,
+    encode_cursor, no_award_data_message, parse_check_item, parse_list_args
+)
+from award_matcher import (
+    DRAW_BUNDLE_RULES, AwardMatcherCache, PRIZE_ORDER, PRIZE_MATCH_LENGTHS, build_award_match,
+    compile_award_matchers, compile_draw_bundle
+)
+from award_listener import AwardChangeListener, LatestVersion, build_award_change_payload
+from award_page_parser import parse_award_page
+from award_scraper import build_session, fetch_page, fetch_pages
+from draw_snapshot import DrawSnapshotReader, read_snapshot_version, write_snapshot
+from invoice_import import IMPORT_FORMATS, guess_import_format, import_invoices
+from serializers import AWARD_FIELDS, INVOICE_FIELDS, OrjsonProvider, award_to_dict, dumps, invoice_to_dict
+import db_routing
+import jobs
+import metrics
+import profiling
 
 # 加載 .env 檔案中的環境變數
 load_dotenv()
 
+# 日誌等級 (DEBUG 時輸出爬蟲解析的逐項偵錯訊息)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app) # 安裝 orjson 時以 orjson 編碼回應 (見 serializers.py)
 app.json.ensure_ascii = False # 確保 JSON 輸出正確顯示中文字符
 
 # 從環境變數配置資料庫
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False # 禁用事件追蹤，減少記憶體開銷
+# 記錄取得連線等待時間的連線池 (見 metrics.py)，大小與逾時等參數由環境變數設定 (見 db_routing.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'poolclass': metrics.TimedQueuePool, **db_routing.engine_options_from_env()}
+# 唯讀副本 (可選)：以 @db_routing.read_replica 標記的唯讀路由改由副本查詢，連線池參數與主資料庫相同
+if db_routing.DATABASE_REPLICA_URL:
+    app.config['SQLALCHEMY_BINDS'] = {
+        db_routing.REPLICA_BIND_KEY: {'url': db_routing.DATABASE_REPLICA_URL, **app.config['SQLALCHEMY_ENGINE_OPTIONS']}
+    }
+
+# PostgreSQL 唯一約束衝突的 SQLSTATE
+UNIQUE_VIOLATION_SQLSTATE = '23505'
 
 # --- Flask-APScheduler 初始化 ---
 scheduler = APScheduler()
 scheduler.init_app(app) 
 
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': db_routing.RoutingSession})
+
+# 請求延遲、SQL 查詢與 GET /metrics
+with app.app_context():
+    metrics.init_app(app, {
+        "primary" if bind_key is None else bind_key: engine for bind_key, engine in db.engines.items()
+    })
+# 請求剖析與慢請求日誌 (使用 metrics 記錄的請求開始時間與 SQL 時間)
+profiling.init_app(app)
 
 # --- 資料庫模型定義 ---
 
 class Invoice(db.Model):
     __tablename__ = 'invoices' # 資料表名稱
+    __table_args__ = (
+        # 列表分頁 (invoice_date desc, id desc) 與依期別對帳使用，INCLUDE 讓查詢可走 index-only scan
+        Index('ix_invoices_invoice_date_id', 'invoice_date', 'id',
+              postgresql_include=['invoice_number', 'winning_status', 'award_id']),
+        Index('ix_invoices_award_id', 'award_id'),
+    )
     id = Column(Integer, primary_key=True)
     invoice_number = Column(String(10), unique=True, nullable=False) # 發票號碼
     invoice_date = Column(Date, nullable=False) # 開獎日期 (購買發票的日期)
@@ -43,6 +107,13 @@ class Invoice(db.Model):
 
 class Award(db.Model):
     __tablename__ = 'awards' # 資料表名稱
+    __table_args__ = (
+        # 同一開獎日期的每個獎項只能有一筆，供開獎號碼 upsert 使用
+        Index('uq_awards_award_date_prize_name', 'award_date', 'prize_name', unique=True),
+        # 列表分頁 (award_date desc, id desc) 與依開獎日期載入對獎器使用
+        Index('ix_awards_award_date_id', 'award_date', 'id',
+              postgresql_include=['prize_name', 'winning_numbers']),
+    )
     id = Column(Integer, primary_key=True)
     prize_name = Column(String(50), nullable=False) # 獎項名稱 (特別獎, 特獎, 頭獎等)
     winning_numbers = Column(String(255), nullable=False) # 中獎號碼 (可能有多組，用逗號分隔)
@@ -51,10 +122,96 @@ class Award(db.Model):
 
     # 關聯到 Invoice 模型
     invoices = relationship("Invoice", back_populates="award")
+    # 正規化後的個別中獎號碼
+    numbers = relationship("AwardNumber", back_populates="award", passive_deletes=True)
 
     def __repr__(self):
         return f"<Award {self.prize_name} for {self.award_date}>"
 
+class AwardNumber(db.Model):
+    """
+    正規化的中獎號碼：每個獎項的每組號碼一列，並以產生欄位保存末 3~7 碼，
+    讓 SQL 可以直接以索引比對個別號碼，不需切割 winning_numbers 字串。
+    """
+    __tablename__ = 'award_numbers' # 資料表名稱
+    __table_args__ = (
+        Index('ix_award_numbers_award_date_number', 'award_date', 'number'),
+        Index('ix_award_numbers_award_date_suffix_7', 'award_date', 'suffix_7'),
+        Index('ix_award_numbers_award_date_suffix_6', 'award_date', 'suffix_6'),
+        Index('ix_award_numbers_award_date_suffix_5', 'award_date', 'suffix_5'),
+        Index('ix_award_numbers_award_date_suffix_4', 'award_date', 'suffix_4'),
+        Index('ix_award_numbers_award_date_suffix_3', 'award_date', 'suffix_3'),
+    )
+    id = Column(Integer, primary_key=True)
+    award_id = Column(Integer, ForeignKey('awards.id', ondelete='CASCADE'), nullable=False, index=True) # 所屬獎項ID
+    award_date = Column(Date, nullable=False) # 開獎日期 (與 awards.award_date 相同，方便依日期查詢)
+    number = Column(String(8), nullable=False) # 8 碼中獎號碼
+    suffix_7 = Column(String(7), Computed('right(number, 7)', persisted=True)) # 末 7 碼 (二獎)
+    suffix_6 = Column(String(6), Computed('right(number, 6)', persisted=True)) # 末 6 碼 (三獎)
+    suffix_5 = Column(String(5), Computed('right(number, 5)', persisted=True)) # 末 5 碼 (四獎)
+    suffix_4 = Column(String(4), Computed('right(number, 4)', persisted=True)) # 末 4 碼 (五獎)
+    suffix_3 = Column(String(3), Computed('right(number, 3)', persisted=True)) # 末 3 碼 (六獎、增開六獎)
+
+    award = relationship("Award", back_populates="numbers")
+
+    def __repr__(self):
+        return f"<AwardNumber {self.number} for award {self.award_id}>"
+
+class AwardDataVersion(db.Model):
+    """
+    開獎資料的版本戳記 (固定只有 id = 1 一列)。
+    開獎號碼有新增或變更時在同一個交易中遞增，作為 HTTP ETag / Last-Modified 的依據。
+    """
+    __tablename__ = 'award_data_version' # 資料表名稱
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0) # 版本號，每次寫入遞增
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now()) # 最後寫入時間
+
+    def __repr__(self):
+        return f"<AwardDataVersion {self.version} at {self.updated_at}>"
+
+class ScrapeState(db.Model):
+    """
+    開獎網頁上次成功抓取並儲存的狀態，供條件式請求與內容雜湊比對使用。
+    """
+    __tablename__ = 'scrape_states' # 資料表名稱
+    url = Column(String(255), primary_key=True) # 抓取的網址
+    etag = Column(String(255), nullable=True) # 伺服器回傳的 ETag
+    last_modified = Column(String(64), nullable=True) # 伺服器回傳的 Last-Modified (原字串)
+    content_hash = Column(String(64), nullable=True) # 網頁內容的 SHA-256
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now()) # 最後更新時間
+
+    def __repr__(self):
+        return f"<ScrapeState {self.url} {self.content_hash}>"
+
+class Job(db.Model):
+    """
+    背景工作 (大型批次對獎與匯入，見 jobs.py)。
+    scheduler 以 FOR UPDATE SKIP LOCKED 領取 pending 的工作，處理中每完成一塊就更新 processed 與 updated_at。
+    """
+    __tablename__ = 'jobs' # 資料表名稱
+    __table_args__ = (
+        # 領取工作時只掃描尚未完成的工作
+        Index('ix_jobs_unfinished', 'id', postgresql_where=text("status IN ('pending', 'running')")),
+    )
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(20), nullable=False) # check_invoices 或 import_invoices
+    status = Column(String(20), nullable=False, default='pending') # pending / running / succeeded / failed
+    import_format = Column(String(10), nullable=False) # 上傳內容格式 (csv 或 ndjson)
+    input_path = Column(String(255), nullable=False) # 上傳內容在 JOB_STORAGE_DIR 中的路徑
+    input_size = Column(BigInteger, nullable=False, default=0) # 上傳內容的位元組數
+    result_path = Column(String(255), nullable=True) # 對獎結果檔 (NDJSON) 的路徑
+    processed = Column(BigInteger, nullable=False, default=0) # 已處理的筆數
+    result = Column(JSONB, nullable=True) # 完成時的統計
+    error = Column(String, nullable=True) # 失敗原因
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now()) # 最後一次更新進度的時間
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status}>"
+
 # --- 應用程式路由 ---
 
 @app.route('/')
@@ -64,17 +221,87 @@ def index():
 @app.route('/health')
 def health_check():
     """
-    健康檢查路由，檢查資料庫連線狀態。
+    健康檢查路由，檢查資料庫連線狀態，並回報各連線池的使用狀況 (saturation 接近 1 時表示連線不足)。
     """
+    pools = {
+        "primary" if bind_key is None else bind_key: db_routing.pool_status(engine)
+        for bind_key, engine in db.engines.items()
+    }
     try:
         # 嘗試執行一個簡單的資料庫查詢來驗證連線
         db.session.execute(db.select(1))
-        return jsonify({"status": "ok", "database": "connected"}), 200
+        return jsonify({"status": "ok", "database": "connected", "pools": pools}), 200
     except Exception as e:
-        return jsonify({"status": "error", "database": "disconnected", "details": str(e)}), 500
+        return jsonify({"status": "error", "database": "disconnected", "details": str(e), "pools": pools}), 500
+
+# --- 列表 API 共用的分頁與串流輸出 ---
+
+# 列表與單筆查詢只選取輸出的欄位 (見 serializers.py)
+INVOICE_COLUMNS = tuple(getattr(Invoice, field) for field in INVOICE_FIELDS)
+AWARD_COLUMNS = tuple(getattr(Award, field) for field in AWARD_FIELDS)
+
+def _stream_rows(collection_name, stmt, row_to_dict, stream_format):
+    """
+    以伺服器端游標 (yield_per) 分批讀取資料列並逐批輸出 JSON 或 NDJSON 字串，
+    記憶體用量只與 STREAM_YIELD_PER 有關，與資料表大小無關。
+    """
+    result = db.session.execute(stmt.execution_options(yield_per=STREAM_YIELD_PER))
+    if stream_format == "ndjson":
+        for partition in result.partitions():
+            yield "".join(dumps(row_to_dict(row)) + "\n" for row in partition)
+        return
+
+    yield f'{{"{collection_name}": ['
+    first = True
+    for partition in result.partitions():
+        chunk = ",".join(dumps(row_to_dict(row)) for row in partition)
+        yield chunk if first else "," + chunk
+        first = False
+    yield "]}"
+
+def _keyset_list_response(collection_name, columns, sort_date_column, id_column, row_to_dict):
+    """
+    列表 API 共用邏輯：依 (日期 desc, ID desc) 做 keyset 分頁，或以串流模式輸出。
+    只查詢需要的欄位，不建立 ORM 物件。
+    """
+    try:
+        stream_format, limit, cursor = parse_list_args(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    stmt = db.select(*columns).order_by(sort_date_column.desc(), id_column.desc())
+    if cursor:
+        stmt = stmt.where(tuple_(sort_date_column, id_column) < tuple_(*cursor))
+
+    if stream_format:
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return Response(
+            stream_with_context(_stream_rows(collection_name, stmt, row_to_dict, stream_format)),
+            mimetype=STREAM_MIMETYPES[stream_format]
+        )
+
+    # 多取一筆用來判斷是否還有下一頁
+    rows = db.session.execute(stmt.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_row = rows[-1]
+        next_cursor = encode_cursor(getattr(last_row, sort_date_column.key), getattr(last_row, id_column.key))
+
+    return jsonify({
+        collection_name: [row_to_dict(row) for row in rows],
+        "next_cursor": next_cursor
+    }), 200
 
 # --- 發票 (Invoice) 相關 API ---
 
+def _is_unique_violation(error):
+    """
+    判斷資料庫錯誤是否為唯一約束衝突 (PostgreSQL SQLSTATE 23505)。
+    """
+    return isinstance(error, IntegrityError) and getattr(error.orig, 'pgcode', None) == UNIQUE_VIOLATION_SQLSTATE
+
 @app.route('/invoices', methods=['POST'])
 def add_invoice():
     """
@@ -82,16 +309,15 @@ def add_invoice():
     請求範例:
     {
         "invoice_number": "12345678",
-        "invoice_date": "2024-01-15",
-        "total_amount": 100
+        "invoice_date": "2024-01-15"
     }
     """
     data = request.get_json()
 
     if not data:
-        return jsonify({"message": "請求數據無效，請提供JSON格式數據"}), 400
+        return jsonify({"message": INVALID_JSON_MESSAGE}), 400
 
-    required_fields = ['invoice_number', 'invoice_date', 'total_amount']
+    required_fields = ['invoice_number', 'invoice_date']
     for field in required_fields:
         if field not in data:
             return jsonify({"message": f"缺少必要欄位: {field}"}), 400
@@ -111,62 +337,105 @@ def add_invoice():
         db.session.add(new_invoice)
         db.session.commit()
 
-        return jsonify({
-            "message": "發票新增成功",
-            "invoice": {
-                "id": new_invoice.id,
-                "invoice_number": new_invoice.invoice_number,
-                "invoice_date": new_invoice.invoice_date.isoformat(),
-                "total_amount": new_invoice.total_amount,
-                "winning_status": new_invoice.winning_status
-            }
-        }), 201
+        return jsonify({"message": "發票新增成功", "invoice": invoice_to_dict(new_invoice)}), 201
     except Exception as e:
         db.session.rollback()
         # 處理唯一約束錯誤 (例如發票號碼重複)
-        if "duplicate key value violates unique constraint" in str(e).lower():
+        if _is_unique_violation(e):
              return jsonify({"message": "新增發票失敗：發票號碼已存在", "error": str(e)}), 409 # 409 Conflict
         return jsonify({"message": "新增發票失敗", "error": str(e)}), 500
 
+UNKNOWN_IMPORT_FORMAT_MESSAGE = "無法判斷匯入格式，請使用 CSV 或 NDJSON 並設定 Content-Type，或以 format 參數指定 (csv、ndjson、carrier、qr)"
+
+def _upload_source():
+    """
+    取得上傳內容的 (二進位串流, 格式)：multipart 的 file 欄位或請求主體本身，
+    格式依 ?format=、檔名副檔名或 Content-Type 判斷 (無法判斷時為 None)。
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        return upload.stream, request.args.get('format') or guess_import_format(upload.filename, upload.content_type)
+    return request.stream, request.args.get('format') or guess_import_format(content_type=request.content_type)
+
+@app.route('/invoices/bulk', methods=['POST'])
+def bulk_import_invoices():
+    """
+    大量匯入發票。上傳內容以串流方式解析並透過 COPY 寫入，不會整份讀進記憶體。
+    支援兩種上傳方式:
+    - 直接以請求主體上傳，Content-Type 為 text/csv 或 application/x-ndjson
+    - multipart/form-data，檔案欄位名稱為 file (依副檔名 .csv / .ndjson 判斷格式)
+    也可用查詢參數 ?format=csv|ndjson|carrier|qr 指定格式。
+    CSV 第一行為欄位名稱，需包含 invoice_number 與 invoice_date；NDJSON 每行一個相同欄位的 JSON 物件。
+    財政部的載具消費發票 CSV 以 csv 上傳即可自動辨識；電子發票 QR Code 內容 (每行一筆) 需指定 format=qr。
+    回應會統計新增 (inserted)、已存在 (duplicates) 與不合法 (invalid) 的筆數，以及不合法資料的行號與原因。
+    """
+    binary_stream, import_format = _upload_source()
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({"message": UNKNOWN_IMPORT_FORMAT_MESSAGE}), 400
+
+    try:
+        stats = import_invoices(db.session.connection(), binary_stream, import_format)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"message": f"匯入發票失敗：{e}"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": "匯入發票失敗", "error": str(e)}), 500
+
+    logger.info("--- 大量匯入發票完成：共 %d 筆，新增 %d 筆，重複 %d 筆，不合法 %d 筆 ---",
+                stats.total, stats.inserted, stats.duplicates, stats.invalid)
+    return jsonify({"message": "發票匯入完成", "result": stats.to_dict()}), 200
+
+@app.cli.command('import-invoices')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'import_format', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='匯入格式，預設依副檔名判斷')
+def import_invoices_command(path, import_format):
+    """
+    從 CSV、NDJSON、載具消費發票 CSV 或 QR Code 內容檔案大量匯入發票。
+    """
+    import_format = import_format or guess_import_format(filename=path)
+    if import_format is None:
+        raise click.BadParameter("無法由副檔名判斷格式，請指定 --format", param_hint='--format')
+
+    with open(path, 'rb') as binary_stream:
+        try:
+            stats = import_invoices(db.session.connection(), binary_stream, import_format)
+            db.session.commit()
+        except ValueError as e:
+            db.session.rollback()
+            raise click.ClickException(f"匯入發票失敗：{e}")
+        except Exception:
+            db.session.rollback()
+            raise
+
+    click.echo(json.dumps(stats.to_dict(), ensure_ascii=False, indent=2))
+
 @app.route('/invoices', methods=['GET'])
+@db_routing.read_replica
 def get_all_invoices():
     """
-    取得所有發票列表。
-    """
-    # 依發票日期降序排列，再依 ID 降序排列，通常最新發票會比較重要
-    invoices = db.session.execute(db.select(Invoice).order_by(Invoice.invoice_date.desc(), Invoice.id.desc())).scalars().all()
-    output = []
-    for invoice in invoices:
-        invoice_data = {
-            "id": invoice.id,
-            "invoice_number": invoice.invoice_number,
-            "invoice_date": invoice.invoice_date.isoformat(),
-            "total_amount": invoice.total_amount,
-            "winning_status": invoice.winning_status,
-            "award_id": invoice.award_id # 即使為 None 也會顯示
-        }
-        output.append(invoice_data)
-    return jsonify({"invoices": output}), 200
+    取得發票列表，依發票日期降序、ID 降序排列 (通常最新發票會比較重要)。
+    查詢參數:
+    - limit: 每頁筆數 (預設 DEFAULT_PAGE_LIMIT，最多 MAX_PAGE_LIMIT)
+    - cursor: 上一頁回應中的 next_cursor，用來取得下一頁
+    - stream: json 或 ndjson，以伺服器端游標串流輸出 (未指定 limit 時輸出全部)
+    """
+    return _keyset_list_response(
+        "invoices", INVOICE_COLUMNS, Invoice.invoice_date, Invoice.id, invoice_to_dict
+    )
 
 @app.route('/invoices/<int:invoice_id>', methods=['GET'])
 def get_invoice(invoice_id):
     """
     根據 ID 取得單一發票資訊。
     """
-    # 使用 .get_or_404() 如果找不到會自動返回 404
-    invoice = db.session.get(Invoice, invoice_id)
+    # 只查詢輸出的欄位，不建立 ORM 物件
+    invoice = db.session.execute(db.select(*INVOICE_COLUMNS).where(Invoice.id == invoice_id)).first()
     if not invoice:
         return jsonify({"message": f"找不到 ID 為 {invoice_id} 的發票"}), 404
-
-    invoice_data = {
-        "id": invoice.id,
-        "invoice_number": invoice.invoice_number,
-        "invoice_date": invoice.invoice_date.isoformat(),
-        "total_amount": invoice.total_amount,
-        "winning_status": invoice.winning_status,
-        "award_id": invoice.award_id
-    }
-    return jsonify({"invoice": invoice_data}), 200
+    return jsonify({"invoice": invoice_to_dict(invoice)}), 200
 
 @app.route('/invoices/<int:invoice_id>', methods=['PUT'])
 def update_invoice(invoice_id):
@@ -179,7 +448,7 @@ def update_invoice(invoice_id):
 
     data = request.get_json()
     if not data:
-        return jsonify({"message": "請求數據無效，請提供JSON格式數據"}), 400
+        return jsonify({"message": INVALID_JSON_MESSAGE}), 400
 
     try:
         # 允許部分更新，只更新提供的欄位
@@ -187,8 +456,6 @@ def update_invoice(invoice_id):
             invoice.invoice_number = data['invoice_number']
         if 'invoice_date' in data:
             invoice.invoice_date = datetime.strptime(data['invoice_date'], '%Y-%m-%d').date()
-        if 'total_amount' in data:
-            invoice.total_amount = data['total_amount']
         if 'winning_status' in data:
             invoice.winning_status = data['winning_status']
         if 'award_id' in data:
@@ -198,7 +465,7 @@ def update_invoice(invoice_id):
         return jsonify({"message": f"ID 為 {invoice_id} 的發票更新成功"}), 200
     except Exception as e:
         db.session.rollback()
-        if "duplicate key value violates unique constraint" in str(e).lower():
+        if _is_unique_violation(e):
              return jsonify({"message": "更新發票失敗：發票號碼已存在", "error": str(e)}), 409
         return jsonify({"message": "更新發票失敗", "error": str(e)}), 500
 
@@ -221,26 +488,216 @@ def delete_invoice(invoice_id):
 
 # --- 獎項 (Award) 相關 API ---
 
+# 監聽開獎資料異動通知期間，程序內保存的最新版本號 (見 start_award_change_listener)
+award_data_version_cache = LatestVersion()
+
+def _get_award_data_version():
+    """
+    取得開獎資料目前的 (版本號, 最後寫入時間)；尚未寫入過時回傳 (0, None)。
+    監聽異動通知期間優先使用程序內的版本號，不需每個請求都查詢資料庫。
+    """
+    listening = award_change_listener is not None and award_change_listener.listening
+    if listening:
+        cached = award_data_version_cache.get()
+        if cached is not None:
+            return cached
+    row = db.session.execute(
+        db.select(AwardDataVersion.version, AwardDataVersion.updated_at).filter_by(id=1)
+    ).first()
+    if not row:
+        return 0, None
+    if listening:
+        award_data_version_cache.offer(row.version, row.updated_at)
+    return row.version, row.updated_at
+
+def _bump_award_data_version():
+    """
+    遞增開獎資料版本號，回傳新的 (版本號, 最後寫入時間)；交易由呼叫端提交。
+    """
+    return db.session.execute(text("""
+        INSERT INTO award_data_version (id, version, updated_at) VALUES (1, 1, now())
+        ON CONFLICT (id) DO UPDATE
+        SET version = award_data_version.version + 1, updated_at = now()
+        RETURNING version, updated_at
+    """)).one()
+
+def _cacheable_award_response(build_response):
+    """
+    以開獎資料版本號產生強 ETag 與 Last-Modified，條件式請求未變更時直接回傳 304 (不執行 build_response)。
+    ETag 也包含查詢參數，讓不同分頁、格式的回應各自快取。
+    只有 200 回應會加上 Cache-Control，錯誤回應不快取。
+    """
+    version, updated_at = _get_award_data_version()
+    etag = awards_etag(version, request.query_string)
+    last_modified = updated_at.replace(microsecond=0) if updated_at else None
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since and request.if_modified_since >= last_modified)
+
+    response = Response(status=304) if not_modified else make_response(build_response())
+    if response.status_code in (200, 304):
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = AWARDS_CACHE_CONTROL
+    return response
+
 @app.route('/awards', methods=['GET'])
+@db_routing.read_replica
 def get_all_awards():
     """
-    取得所有獎項列表，通常按開獎日期降序排列。
-    """
-    # 建議按日期降序排列，然後按 ID 降序排列，確保同一開獎日期有多個獎項時也有穩定排序
-    awards = db.session.execute(db.select(Award).order_by(Award.award_date.desc(), Award.id.desc())).scalars().all()
-    output = []
-    for award in awards:
-        award_data = {
-            "id": award.id,
-            "prize_name": award.prize_name,
-            "winning_numbers": award.winning_numbers,
-            "award_date": award.award_date.isoformat()
-        }
-        output.append(award_data)
-    return jsonify({"awards": output}), 200
+    取得獎項列表，依開獎日期降序、ID 降序排列，確保同一開獎日期有多個獎項時也有穩定排序。
+    查詢參數與 GET /invoices 相同 (limit、cursor、stream)。
+    回應帶有 ETag / Last-Modified / Cache-Control，條件式請求在資料未變更時回傳 304。
+    """
+    return _cacheable_award_response(lambda: _keyset_list_response(
+        "awards", AWARD_COLUMNS, Award.award_date, Award.id, award_to_dict
+    ))
+
+# GET /draw_bundle 未指定開獎日期時預設與最多回傳的期數 (每年 6 期)
+DRAW_BUNDLE_RECENT_DRAWS = int(os.getenv('DRAW_BUNDLE_RECENT_DRAWS', '6'))
+MAX_DRAW_BUNDLE_DRAWS = 24
+
+def _build_draw_bundle():
+    """
+    組成 GET /draw_bundle 的回應：指定 award_date 時只含該期，否則含最近 recent 期 (以單一查詢取得)。
+    """
+    award_date_str = request.args.get('award_date')
+    if award_date_str:
+        try:
+            award_date = datetime.strptime(award_date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({"message": "award_date 格式不正確，應為YYYY-MM-DD"}), 400
+        date_condition = Award.award_date == award_date
+    else:
+        try:
+            recent = int(request.args.get('recent', DRAW_BUNDLE_RECENT_DRAWS))
+        except ValueError:
+            return jsonify({"message": "recent 應為正整數"}), 400
+        if recent < 1:
+            return jsonify({"message": "recent 應為正整數"}), 400
+        recent_dates = (
+            db.select(Award.award_date).distinct()
+            .order_by(Award.award_date.desc()).limit(min(recent, MAX_DRAW_BUNDLE_DRAWS))
+        )
+        date_condition = Award.award_date.in_(recent_dates.scalar_subquery())
+
+    rows = db.session.execute(
+        db.select(Award.award_date, Award.prize_name, Award.winning_numbers).where(date_condition)
+    ).all()
+    if award_date_str and not rows:
+        return jsonify({"message": no_award_data_message(award_date)}), 404
+
+    version, _ = _get_award_data_version()
+    return jsonify({"version": version, "rules": DRAW_BUNDLE_RULES, "draws": compile_draw_bundle(rows)}), 200
+
+@app.route('/draw_bundle', methods=['GET'])
+@db_routing.read_replica
+def get_draw_bundle():
+    """
+    取得前端離線對獎用的精簡開獎資料 (8 碼獎項的號碼與對獎規則)，前端下載一次即可在本機對獎整期的發票。
+    查詢參數:
+    - award_date: 只取該開獎日期 (YYYY-MM-DD)
+    - recent: 未指定 award_date 時取最近幾期 (預設 DRAW_BUNDLE_RECENT_DRAWS，最多 MAX_DRAW_BUNDLE_DRAWS)
+    與 GET /awards 相同以開獎資料版本號產生 ETag，資料未變更時回傳 304。
+    """
+    return _cacheable_award_response(_build_draw_bundle)
 
 # --- 發票檢核 API ---
+
+# 批次對獎單次請求可包含的最大發票數量
+MAX_BATCH_CHECK_ITEMS = int(os.getenv('MAX_BATCH_CHECK_ITEMS', '1000'))
+
+# 各開獎日期預先編譯的對獎器快取 (設為 0 可停用)；寫入開獎號碼的程序直接使其失效，
+# 其他程序 (web worker) 則透過開獎資料異動通知失效 (見 start_award_change_listener)
+award_matcher_cache = AwardMatcherCache(maxsize=int(os.getenv('AWARD_MATCHER_CACHE_SIZE', '64')))
+
+# 開獎資料快照檔案 (未設定時停用)：由排程器寫入，各 web worker 以 mmap 共用同一份資料
+DRAW_SNAPSHOT_PATH = os.getenv('DRAW_SNAPSHOT_PATH')
+# web worker 最多每隔幾秒檢查一次快照檔案是否已被替換
+DRAW_SNAPSHOT_CHECK_INTERVAL = float(os.getenv('DRAW_SNAPSHOT_CHECK_INTERVAL', '1'))
+draw_snapshot_reader = (
+    DrawSnapshotReader(DRAW_SNAPSHOT_PATH, check_interval=DRAW_SNAPSHOT_CHECK_INTERVAL) if DRAW_SNAPSHOT_PATH else None
+)
+
+def _load_award_matchers(award_dates):
+    """
+    取得多個開獎日期的預先編譯對獎器，回傳 {award_date: AwardMatcher}。
+    快取命中時不查詢資料庫；未命中的日期以單一查詢載入後編譯並放入快取。
+    沒有任何獎項資料的日期不會出現在結果中 (也不會被快取)。
+    """
+    matchers = {}
+    missing_dates = []
+    for award_date in award_dates:
+        matcher = award_matcher_cache.get(award_date)
+        if matcher is None:
+            missing_dates.append(award_date)
+        else:
+            matchers[award_date] = matcher
+    metrics.record_award_lookups("matcher_cache", len(matchers), len(missing_dates))
+
+    if missing_dates:
+        generation = award_matcher_cache.generation
+        # 放入快取的資料一律從主資料庫讀取，避免副本落後時把舊的開獎號碼快取起來
+        with db_routing.use_primary():
+            rows = db.session.execute(
+                db.select(Award.award_date, Award.id, Award.prize_name, Award.winning_numbers)
+                .where(Award.award_date.in_(missing_dates))
+            ).all()
+        for award_date, matcher in compile_award_matchers(rows).items():
+            award_matcher_cache.put(award_date, matcher, generation)
+            matchers[award_date] = matcher
+
+    return matchers
+
+def _snapshot_matchers(award_dates):
+    """
+    從開獎資料快照取得多個開獎日期的對獎器，回傳 {award_date: 對獎器}，完全不查詢資料庫。
+    快照停用、尚未產生或版本落後於已知的最新開獎資料 (收到異動通知但快照尚未更新) 時回傳空 dict；
+    快照中沒有的日期不會出現在結果中，由呼叫端改走資料庫路徑。
+    """
+    if draw_snapshot_reader is None:
+        return {}
+    latest_version = award_data_version_cache.get()
+    matchers = draw_snapshot_reader.matchers(award_dates, min_version=latest_version[0] if latest_version else None)
+    metrics.record_award_lookups("snapshot", len(matchers), len(award_dates) - len(matchers))
+    return matchers
+
+def _find_winning_awards(invoice_number, award_dates):
+    """
+    以單一索引查詢 (award_numbers 的號碼與末 N 碼欄位) 比對一張發票在多個開獎日期的中獎情形，
+    不需載入或切割任何號碼字串。
+    回傳 {award_date: AwardMatch 或 None}；沒有任何獎項資料的開獎日期不會出現在結果中。
+    """
+    # 每個獎項依其比對碼數使用對應的索引欄位
+    match_conditions = []
+    for prize_name, match_length in PRIZE_MATCH_LENGTHS.items():
+        number_column = AwardNumber.number if match_length == 8 else getattr(AwardNumber, f"suffix_{match_length}")
+        match_conditions.append(and_(Award.prize_name == prize_name, number_column == invoice_number[-match_length:]))
+
+    prize_rank = case(PRIZE_ORDER, value=Award.prize_name, else_=99)
+    matched_award = db.aliased(Award)
+    stmt = (
+        db.select(Award.award_date, matched_award.id, matched_award.prize_name,
+                  matched_award.winning_numbers, AwardNumber.number)
+        .select_from(Award)
+        .outerjoin(AwardNumber, and_(AwardNumber.award_id == Award.id, or_(*match_conditions)))
+        .outerjoin(matched_award, matched_award.id == AwardNumber.award_id)
+        .where(Award.award_date.in_(award_dates))
+        # 每個開獎日期只取一列：有中獎的列優先，再依獎項等級由高至低
+        .order_by(Award.award_date, AwardNumber.id.is_(None), prize_rank)
+        .distinct(Award.award_date)
+    )
+
+    results = {}
+    for award_date, award_id, prize_name, winning_numbers, number in db.session.execute(stmt):
+        results[award_date] = build_award_match(prize_name, award_id, winning_numbers, number) if number else None
+    return results
+
 @app.route('/check_invoice', methods=['POST'])
+@db_routing.read_replica
 def check_invoice():
     """
     檢核發票是否中獎。
@@ -249,251 +706,356 @@ def check_invoice():
         "invoice_number": "12345678",
         "invoice_date": "2024-03-25" // 此日期應為該期發票的開獎日期
     }
+    不知道開獎日期時可改為提供發票開立日期，由伺服器推算該期的開獎日期:
+    {"invoice_number": "12345678", "purchase_date": "2024-02-10"}
     """
     data = request.get_json()
 
     if not data:
-        return jsonify({"message": "請求數據無效，請提供JSON格式數據"}), 400
+        return jsonify({"message": INVALID_JSON_MESSAGE}), 400
 
-    required_fields = ['invoice_number', 'invoice_date']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({"message": f"缺少必要欄位: {field}"}), 400
+    invoice_number, check_date, error_message = parse_check_item(data)
+    if error_message:
+        return jsonify({"message": error_message}), 400
 
-    invoice_number = data['invoice_number'].strip().replace('-', '') # 清理發票號碼
     try:
-        check_date = datetime.strptime(data['invoice_date'], '%Y-%m-%d').date()
-    except ValueError:
-        return jsonify({"message": "invoice_date 格式不正確，應為YYYY-MM-DD"}), 400
-    
-    if len(invoice_number) != 8 or not invoice_number.isdigit(): # 增加數字檢查
-        return jsonify({"message": "發票號碼應為8位數字"}), 400
-
-    # 2. 根據開獎日期查詢所有獎項號碼
-    awards_for_date = db.session.execute(
-        db.select(Award).filter_by(award_date=check_date)
-    ).scalars().all()
-
-    if not awards_for_date:
-        return jsonify({"message": f"該開獎日期 ({check_date.isoformat()}) 無任何獎項資料，無法檢核"}), 404
-
-    result_message = "很抱歉，您的發票未中獎。"
-    is_winning = False
-    winning_award = None
-    winning_details = [] # 儲存所有中獎的詳細資訊，即使只返回最高獎項
-
-    # 3. 比對發票號碼與中獎號碼
-    # 按照獎項等級從高到低比對，確保正確判斷中獎狀態和訊息
-    # 修正後的 prize_order，確保依獎金高低排序
-    prize_order = {
-        "特別獎": 1,
-        "特獎": 2,
-        "頭獎": 3,
-        "二獎": 4,
-        "三獎": 5,
-        "四獎": 6,
-        "五獎": 7,
-        "六獎": 8,
-        "增開六獎": 9 # 增開六獎放在最後，因為獎金最低且為額外增開
+        snapshot_matcher = _snapshot_matchers([check_date]).get(check_date)
+        if snapshot_matcher is not None:
+            # 1. 開獎資料快照中有該開獎日期時直接在共用的 mmap 上比對
+            has_awards = True
+            award_match = snapshot_matcher.match(invoice_number)
+        elif award_matcher_cache.maxsize > 0:
+            # 2. 取得該開獎日期的對獎器 (快取命中時不需查詢資料庫)，比對後回傳最高獎項
+            matcher = _load_award_matchers([check_date]).get(check_date)
+            has_awards = matcher is not None
+            award_match = matcher.match(invoice_number) if has_awards else None
+        else:
+            # 停用快取時直接以單一索引查詢比對
+            matches = _find_winning_awards(invoice_number, [check_date])
+            has_awards = check_date in matches
+            award_match = matches.get(check_date)
+
+        if not has_awards:
+            return jsonify({"message": no_award_data_message(check_date)}), 404
+        return jsonify(build_check_result(invoice_number, check_date, award_match)), 200
+    except Exception as e:
+        logger.exception("對獎過程中發生錯誤: %s", e)
+        return jsonify({"message": "檢核發票失敗，發生內部錯誤", "error": str(e)}), 500
+
+@app.route('/check_invoices', methods=['POST'])
+def check_invoices():
+    """
+    批次檢核多張發票是否中獎。
+    請求範例:
+    {
+        "invoices": [
+            {"invoice_number": "12345678", "invoice_date": "2024-03-25"},
+            {"invoice_number": "87654321", "invoice_date": "2024-05-25"}
+        ]
     }
+    每個不同的開獎日期只查詢一次獎項資料。
+    單筆資料有誤時只會在該筆結果中回報錯誤 (status 400/404/500)，不影響其他發票的檢核。
+    """
+    data = request.get_json(silent=True)
+    items = data.get('invoices') if isinstance(data, dict) else data
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"message": "請求數據無效，請提供包含 invoices 列表的JSON格式數據"}), 400
+    if len(items) > MAX_BATCH_CHECK_ITEMS:
+        return jsonify({"message": f"單次最多可檢核 {MAX_BATCH_CHECK_ITEMS} 張發票"}), 413
+
+    parsed_items = [parse_check_item(item) for item in items]
+
+    # 一次取得所有需要的開獎日期的對獎器
+    check_dates = {check_date for _, check_date, error_message in parsed_items if not error_message}
+    matchers = _snapshot_matchers(check_dates)
+    remaining_dates = check_dates - matchers.keys()
+    if remaining_dates:
+        matchers.update(_load_award_matchers(remaining_dates))
+
+    results = []
+    winning_count = 0
+    for index, (invoice_number, check_date, error_message) in enumerate(parsed_items):
+        if error_message:
+            results.append({"index": index, "status": 400, "message": error_message})
+            continue
+
+        matcher = matchers.get(check_date)
+        if matcher is None:
+            results.append({
+                "index": index,
+                "status": 404,
+                "message": no_award_data_message(check_date),
+                "invoice_number": invoice_number,
+                "invoice_date": check_date.isoformat()
+            })
+            continue
 
-    # 對獎項進行排序，確保高獎項先比對
-    awards_for_date.sort(key=lambda x: prize_order.get(x.prize_name, 99))
+        try:
+            result = build_check_result(invoice_number, check_date, matcher.match(invoice_number))
+        except Exception as e:
+            logger.exception("批次對獎第 %d 筆發生錯誤: %s", index, e)
+            results.append({"index": index, "status": 500, "message": "檢核發票失敗，發生內部錯誤", "error": str(e)})
+            continue
+
+        if result["winning_status"]:
+            winning_count += 1
+        results.append({"index": index, "status": 200, **result})
+
+    failed_count = sum(1 for result in results if result["status"] != 200)
+    return jsonify({
+        "results": results,
+        "summary": {
+            "total": len(results),
+            "checked": len(results) - failed_count,
+            "winning": winning_count,
+            "failed": failed_count
+        }
+    }), 200
 
-    # 提取頭獎號碼，用於後續二獎、三獎等比對
-    head_prize_numbers = [
-        n.strip() for award in awards_for_date
-        if award.prize_name == "頭獎"
-        for n in award.winning_numbers.split(',')
+@app.route('/draw_for_purchase_date', methods=['GET'])
+def draw_for_purchase_date():
+    """
+    由發票開立日期查詢所屬期別、開獎日期與領獎截止日，例如 GET /draw_for_purchase_date?purchase_date=2024-02-10。
+    """
+    try:
+        purchase_date = datetime.strptime(request.args.get('purchase_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({"message": "purchase_date 格式不正確，應為YYYY-MM-DD"}), 400
+    period_text, award_date = resolve_invoice_period(purchase_date)
+    return jsonify({
+        "purchase_date": purchase_date.isoformat(),
+        "period": period_text,
+        "award_date": award_date.isoformat(),
+        "claim_deadline": claim_deadline(award_date).isoformat()
+    }), 200
+
+@app.route('/check_invoice/claimable', methods=['POST'])
+@db_routing.read_replica
+def check_invoice_claimable():
+    """
+    以一張發票號碼比對所有仍在領獎期限內的期別 (不需知道開獎日期)。
+    請求範例: {"invoice_number": "12345678"}
+    所有期別的對獎器以快照、快取或單一查詢一次取得，不需逐期呼叫 /check_invoice。
+    已開獎但尚未取得獎項資料的期別列在 unavailable_award_dates。
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"message": INVALID_JSON_MESSAGE}), 400
+
+    award_dates = claimable_award_dates(datetime.now(DRAW_TIMEZONE).date())
+    invoice_number, _, error_message = parse_check_item({**data, "invoice_date": award_dates[0].isoformat()})
+    if error_message:
+        return jsonify({"message": error_message}), 400
+
+    matchers = _snapshot_matchers(award_dates)
+    remaining_dates = set(award_dates) - matchers.keys()
+    if remaining_dates:
+        matchers.update(_load_award_matchers(remaining_dates))
+    checked_dates = [award_date for award_date in award_dates if award_date in matchers]
+    if not checked_dates:
+        return jsonify({"message": "領獎期限內的期別都還沒有獎項資料，無法檢核"}), 404
+
+    results = [
+        {
+            **build_check_result(invoice_number, award_date, matchers[award_date].match(invoice_number)),
+            "period": period_text_for_award_date(award_date),
+            "claim_deadline": claim_deadline(award_date).isoformat()
+        }
+        for award_date in checked_dates
     ]
+    winning_results = [result for result in results if result["winning_status"]]
+    return jsonify({
+        "invoice_number": invoice_number,
+        "winning_status": bool(winning_results),
+        "message": winning_results[0]["message"] if winning_results else "很抱歉，您的發票在領獎期限內的各期都未中獎。",
+        "results": results,
+        "unavailable_award_dates": [
+            award_date.isoformat() for award_date in award_dates if award_date not in matchers
+        ]
+    }), 200
 
-    for award in awards_for_date:
-        # winning_numbers_list 只用於特別獎、特獎、頭獎的完全比對 (或增開六獎的末三碼比對，如果它有自己的獨立號碼)
-        # 對於二獎到六獎和增開六獎，我們將使用 head_prize_numbers
-        winning_numbers_list = [n.strip() for n in award.winning_numbers.split(',')]
-
-        # 首先處理需要完全比對的獎項 (特別獎, 特獎, 頭獎)
-        if award.prize_name == "特別獎":
-            for winning_num_exact in winning_numbers_list: 
-                if invoice_number == winning_num_exact:
-                    is_winning = True
-                    winning_award = award
-                    winning_details.append({"prize": award.prize_name, "message": f"恭喜您，中了 {award.prize_name}！號碼: {winning_num_exact}"})
-                    break 
-            if is_winning: 
-                break 
-
-        elif award.prize_name == "特獎":
-            for winning_num_exact in winning_numbers_list:
-                if invoice_number == winning_num_exact:
-                    is_winning = True
-                    winning_award = award
-                    winning_details.append({"prize": award.prize_name, "message": f"恭喜您，中了 {award.prize_name}！號碼: {winning_num_exact}"})
-                    break 
-            if is_winning: 
-                break
-
-        elif award.prize_name == "頭獎":
-            for winning_num_exact in winning_numbers_list:
-                if invoice_number == winning_num_exact:
-                    is_winning = True
-                    winning_award = award
-                    winning_details.append({"prize": award.prize_name, "message": f"恭喜您，中了 {award.prize_name}！號碼: {winning_num_exact}"})
-                    break 
-            if is_winning: 
-                break
-
-        # 處理二獎、三獎、四獎、五獎、六獎，以及增開六獎
-        # 這些獎項都使用頭獎號碼的末幾碼進行比對
-        elif award.prize_name in ["二獎", "三獎", "四獎", "五獎", "六獎", "增開六獎"]:
-            for head_num_for_suffix in head_prize_numbers: 
-                print(f"--- 偵錯 ---", flush=True)
-                print(f"發票號碼: {invoice_number}", flush=True)
-                print(f"當前頭獎號碼 (完整): {head_num_for_suffix}", flush=True)
-                print(f"比對獎項: {award.prize_name}", flush=True) 
-
-                matched_suffix = ""
-                if award.prize_name == "二獎" and invoice_number[-7:] == head_num_for_suffix[-7:]:
-                    is_winning = True; winning_award = award; matched_suffix = head_num_for_suffix[-7:]
-                    winning_details.append({"prize": award.prize_name, "message": f"恭喜您，中了 {award.prize_name}！號碼後七碼: {matched_suffix}"}); break
-                elif award.prize_name == "三獎" and invoice_number[-6:] == head_num_for_suffix[-6:]:
-                    is_winning = True; winning_award = award; matched_suffix = head_num_for_suffix[-6:]
-                    winning_details.append({"prize": award.prize_name, "message": f"恭喜您，中了 {award.prize_name}！號碼後六碼: {matched_suffix}"}); break
-                elif award.prize_name == "四獎" and invoice_number[-5:] == head_num_for_suffix[-5:]:
-                    is_winning = True; winning_award = award; matched_suffix = head_num_for_suffix[-5:]
-                    winning_details.append({"prize": award.prize_name, "message": f"恭喜您，中了 {award.prize_name}！號碼後五碼: {matched_suffix}"}); break
-                elif award.prize_name == "五獎" and invoice_number[-4:] == head_num_for_suffix[-4:]:
-                    is_winning = True; winning_award = award; matched_suffix = head_num_for_suffix[-4:]
-                    winning_details.append({"prize": award.prize_name, "message": f"恭喜您，中了 {award.prize_name}！號碼後四碼: {matched_suffix}"}); break
-                elif award.prize_name == "六獎" and invoice_number[-3:] == head_num_for_suffix[-3:]:
-                    is_winning = True; winning_award = award; matched_suffix = head_num_for_suffix[-3:]
-                    winning_details.append({"prize": award.prize_name, "message": f"恭喜您，中了 {award.prize_name}！號碼後三碼: {matched_suffix}"}); break
-                elif award.prize_name == "增開六獎" and invoice_number[-3:] == head_num_for_suffix[-3:]:
-                    is_winning = True; winning_award = award; matched_suffix = head_num_for_suffix[-3:]
-                    winning_details.append({"prize": award.prize_name, "message": f"恭喜您，中了 {award.prize_name}！號碼後三碼: {matched_suffix}"}); break
-            if is_winning: 
-                break 
+# --- 自動獲取開獎號碼 API (網頁爬蟲版本) ---
 
-    try:
-        if is_winning: 
-            highest_prize_detail = winning_details[0]
+# 財政部開獎網頁，可改指向本機的替身伺服器 (見 benchmarks/fixture_server.py) 做測試
+INVOICE_WEB_URL = os.getenv('INVOICE_WEB_URL', 'https://invoice.etax.nat.gov.tw/')
+# 單次請求的連線/讀取逾時 (秒)
+SCRAPER_TIMEOUT = float(os.getenv('SCRAPER_TIMEOUT', '10'))
+# 連線錯誤或 429/5xx 時的重試次數與退避係數 (第 n 次重試前等待 backoff * 2^(n-1) 秒)
+SCRAPER_RETRIES = int(os.getenv('SCRAPER_RETRIES', '3'))
+SCRAPER_BACKOFF = float(os.getenv('SCRAPER_BACKOFF', '1.0'))
+
+_scraper_session = None
+_scraper_session_lock = threading.Lock()
+
+def _get_scraper_session():
+    """
+    取得程序內共用的 requests.Session (第一次使用時建立)，讓每次抓取都能重複使用連線。
+    """
+    global _scraper_session
+    with _scraper_session_lock:
+        if _scraper_session is None:
+            _scraper_session = build_session(retries=SCRAPER_RETRIES, backoff_factor=SCRAPER_BACKOFF)
+        return _scraper_session
 
-            return jsonify({
-                "message": highest_prize_detail["message"],
-                "invoice_number": invoice_number,
-                "invoice_date": check_date.isoformat(),
-                "winning_status": True, 
-                "award_details": {
-                    "prize_name": highest_prize_detail["prize"],
-                    "winning_numbers": winning_award.winning_numbers 
-                } if winning_award else None 
-            }), 200
-        else: 
-            return jsonify({
-                "message": result_message, 
-                "invoice_number": invoice_number,
-                "invoice_date": check_date.isoformat(),
-                "winning_status": False, 
-                "award_details": None 
-            }), 200
-    except Exception as e:
-        print(f"對獎過程中發生錯誤: {e}", flush=True) 
-        return jsonify({"message": "檢核發票失敗，發生內部錯誤", "error": str(e)}), 500
-    
-# --- 自動獲取開獎號碼 API (網頁爬蟲版本) ---
 @app.route('/fetch_awards', methods=['POST'])
 def fetch_awards():
     """
     從財政部電子發票平台（網頁）獲取最新開獎號碼並存入資料庫。
+    加上 ?force=true 可忽略網頁未變更的判斷，強制重新解析與儲存。
     """
+    force = request.args.get('force', '').lower() in ('1', 'true', 'yes')
     try:
-        _execute_fetch_awards_logic()
-        return jsonify({"message": "開獎號碼已成功獲取並更新至資料庫 (來自手動觸發)"}), 200
+        with _try_advisory_lock(FETCH_AWARDS_LOCK_KEY) as acquired:
+            if not acquired:
+                return jsonify({"message": "其他 worker 正在抓取開獎號碼，請稍後再試"}), 409
+            result = _execute_fetch_awards_logic(force=force)
+            if result["status"] == "updated":
+                refresh_draw_snapshot()
     except Exception as e:
         return jsonify({"message": "手動獲取開獎號碼失敗", "error": str(e)}), 500
+    if result["status"] == "unchanged":
+        return jsonify({"message": "財政部網頁沒有變更，無需更新 (來自手動觸發)", **result}), 200
+    return jsonify({"message": "開獎號碼已成功獲取並更新至資料庫 (來自手動觸發)", **result}), 200
 
 # 將核心爬蟲和儲存邏輯抽離成一個獨立的函數
-def _execute_fetch_awards_logic():
-    invoice_web_url = "https://invoice.etax.nat.gov.tw/"
+def _execute_fetch_awards_logic(force=False):
+    """
+    抓取開獎網頁並儲存開獎號碼。
+    先以上次的 ETag / Last-Modified 發出條件式請求，伺服器回應 304 或內容雜湊與上次相同時，
+    直接回傳 {"status": "unchanged"}，不解析網頁也不開啟資料庫寫入交易；
+    否則解析並儲存，回傳 {"status": "updated", "award_date": ..., "changed": 異動獎項數}。
+    """
+    invoice_web_url = INVOICE_WEB_URL
+
+    logger.info("--- 開始從財政部網頁獲取開獎數據 ---")
+    previous = None
+    if not force:
+        previous = db.session.execute(
+            db.select(ScrapeState.etag, ScrapeState.last_modified, ScrapeState.content_hash)
+            .where(ScrapeState.url == invoice_web_url)
+        ).first()
+    # 讀取完狀態就結束唯讀交易，抓取網頁期間不佔用資料庫連線
+    db.session.rollback()
 
-    print("--- 開始從財政部網頁獲取開獎數據 ---", flush=True)
     try:
-        response = requests.get(invoice_web_url)
-        response.encoding = 'utf-8' # 強制設定編碼為 UTF-8
-        response.raise_for_status() # 如果請求失敗，拋出 HTTPError
-        html_content = response.text
+        page = fetch_page(
+            _get_scraper_session(), invoice_web_url, SCRAPER_TIMEOUT,
+            etag=previous.etag if previous else None,
+            last_modified=previous.last_modified if previous else None
+        )
     except requests.exceptions.RequestException as e:
+        metrics.record_scraper_fetch("error")
         raise Exception(f"無法從財政部網頁獲取開獎數據: {str(e)}")
+    metrics.observe_scraper_phase("fetch", page.elapsed)
 
-    soup = BeautifulSoup(html_content, 'html.parser')
+    if page.not_modified:
+        logger.info("--- 財政部網頁回應 304 Not Modified，略過解析與儲存 ---")
+        metrics.record_scraper_fetch("not_modified")
+        return {"status": "unchanged"}
+    if previous is not None and previous.content_hash == page.content_hash:
+        logger.info("--- 財政部網頁內容與上次相同，略過解析與儲存 ---")
+        metrics.record_scraper_fetch("unchanged")
+        return {"status": "unchanged"}
+
+    with metrics.time_scraper_phase("parse"):
+        actual_award_date, awards_to_save = _parse_award_page(page.text)
 
     try:
-        # 尋找帶有 etw-on class 的 <a> 標籤，並從 title 屬性獲取期別
-        period_element = soup.find('a', class_='etw-on')
-        
-        if not period_element:
+        with metrics.time_scraper_phase("save"):
+            changed_awards = _upsert_awards(awards_to_save)
+            # 與開獎號碼在同一個交易中記錄抓取狀態；解析或儲存失敗時下次會重新抓取
+            _save_scrape_state(invoice_web_url, page)
+            db.session.commit()
+        logger.info("--- 開獎號碼已成功儲存至資料庫 ---")
+    except Exception as e:
+        db.session.rollback()
+        raise Exception(f"儲存開獎號碼失敗: {str(e)}")
+
+    # 開獎號碼有新增或變更時，讓該開獎日期的對獎器快取失效
+    if changed_awards:
+        award_matcher_cache.invalidate([actual_award_date])
+
+        # 開獎號碼有異動時重新對帳該期發票；失敗不影響已儲存的開獎號碼，可再透過 reconcile-invoices 重跑
+        try:
+            _reconcile_invoices_for_award_date(actual_award_date)
+        except Exception as e:
+            logger.warning("開獎日期 %s 的發票對帳失敗: %s", actual_award_date.isoformat(), e)
+
+    metrics.record_scraper_fetch("updated")
+    return {"status": "updated", "award_date": actual_award_date.isoformat(), "changed": len(changed_awards)}
+
+def _save_scrape_state(url, page):
+    """
+    以 upsert 記錄網頁的 ETag、Last-Modified 與內容雜湊；交易由呼叫端提交。
+    """
+    stmt = pg_insert(ScrapeState).values(
+        url=url, etag=page.etag, last_modified=page.last_modified, content_hash=page.content_hash
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[ScrapeState.url],
+        set_={
+            "etag": stmt.excluded.etag,
+            "last_modified": stmt.excluded.last_modified,
+            "content_hash": stmt.excluded.content_hash,
+            "updated_at": func.now()
+        }
+    ))
+
+def _parse_award_page(html_content, expected_period_text=None):
+    """
+    解析開獎網頁，回傳 (開獎日期, 待儲存的獎項 dict 列表)。
+    網頁本身的解析 (期別與獎項表格) 由 award_page_parser 負責。
+    回補歷史期別時以 expected_period_text 指定期別：網頁上沒有標示期別時使用該期別，
+    標示的期別不同 (例如被導回首頁) 時視為解析失敗。
+    """
+    try:
+        page = parse_award_page(html_content)
+        period_text = page.period_text
+
+        if expected_period_text:
+            if period_text and period_text.replace(' ', '') != expected_period_text:
+                raise Exception(f"網頁期別 {period_text} 與要求的期別 {expected_period_text} 不同")
+            period_text = expected_period_text
+
+        if not period_text:
             raise Exception("無法解析網頁中的開獎期別信息，未找到包含期別的<a>標籤或其class已變更")
 
-        period_title = period_element.get('title', '')
-        period_text_raw = period_title.replace('中獎號碼單', '').strip()
-        
-        if not period_text_raw:
-            raise Exception("解析開獎期別文本失敗，title屬性內容無效")
+        actual_award_date = parse_award_date_from_period(period_text)
+        logger.info("解析到開獎日期: %s", actual_award_date.isoformat())
 
-        actual_award_date = parse_award_date_from_period(period_text_raw)
-        print(f"解析到開獎日期: {actual_award_date.isoformat()}", flush=True)
-        
         awards_to_save = []
 
         # 用於暫存頭獎號碼，以便賦予二獎到六獎和增開六獎
         current_head_prize_numbers = []
-        
-        # 尋找所有 class 為 'text-center' 且 headers 為 'th01' 的 <td> 標籤作為獎項名稱
-        prize_name_tds = soup.find_all('td', headers='th01', class_='text-center')
-
-        for prize_name_td in prize_name_tds:
-            prize_name = prize_name_td.get_text(strip=True)
-            winning_numbers = []
-            
-            # 獲取下一個 td 元素，它應該包含中獎號碼或說明
-            numbers_td = prize_name_td.find_next_sibling('td')
-            
-            if numbers_td:
-                # 針對 特別獎, 特獎, 頭獎 獲取實際號碼
-                if prize_name in ["特別獎", "特獎", "頭獎"]:
-                    num_elements = numbers_td.find_all(class_='etw-tbiggest')
-                    for elem in num_elements:
-                        num = elem.get_text(strip=True)
-                        if num:
-                            winning_numbers.append(num)
-                    # 如果是頭獎，額外保存號碼供後續獎項使用
-                    if prize_name == "頭獎":
-                        current_head_prize_numbers = winning_numbers
-                        print(f"--- 偵錯 --- 已獲取頭獎號碼: {current_head_prize_numbers}", flush=True)
-
-
-                # 處理二獎、三獎、四獎、五獎、六獎，以及【增開六獎】
-                # 這些獎項的中獎號碼實際上就是頭獎號碼
-                # 這樣 check_invoice 函數才能根據獎項名稱（例如六獎對末三碼）進行比對
-                elif prize_name in ["二獎", "三獎", "四獎", "五獎", "六獎", "增開六獎"]:
-                    if current_head_prize_numbers:
-                        # 將這些獎項的 winning_numbers 設置為當期所有頭獎號碼
-                        winning_numbers = current_head_prize_numbers
-                        print(f"--- 偵錯 --- {prize_name} 的號碼被設置為頭獎號碼: {winning_numbers}", flush=True)
-                    else:
-                        print(f"警告: 嘗試處理 {prize_name} 但未找到頭獎號碼，可能導致數據不完整。跳過此獎項。", flush=True)
-                        continue # 如果沒有頭獎號碼，跳過當前獎項
+
+        for prize_name, winning_numbers in page.prizes:
+            # 如果是頭獎，額外保存號碼供後續獎項使用
+            if prize_name == "頭獎":
+                current_head_prize_numbers = winning_numbers
+                logger.debug("已獲取頭獎號碼: %s", current_head_prize_numbers)
+
+            # 處理二獎、三獎、四獎、五獎、六獎，以及【增開六獎】
+            # 這些獎項的中獎號碼實際上就是頭獎號碼
+            # 這樣 check_invoice 函數才能根據獎項名稱（例如六獎對末三碼）進行比對
+            elif prize_name in ["二獎", "三獎", "四獎", "五獎", "六獎", "增開六獎"]:
+                if current_head_prize_numbers:
+                    # 將這些獎項的 winning_numbers 設置為當期所有頭獎號碼
+                    winning_numbers = current_head_prize_numbers
+                    logger.debug("%s 的號碼被設置為頭獎號碼: %s", prize_name, winning_numbers)
+                else:
+                    logger.warning("嘗試處理 %s 但未找到頭獎號碼，可能導致數據不完整。跳過此獎項。", prize_name)
+                    continue # 如果沒有頭獎號碼，跳過當前獎項
 
             if winning_numbers:
-                awards_to_save.append(Award(
-                    prize_name=prize_name,
-                    winning_numbers=",".join(winning_numbers),
-                    award_date=actual_award_date
-                ))
-                print(f"已解析獎項: {prize_name}, 號碼: {','.join(winning_numbers)}", flush=True)
+                awards_to_save.append({
+                    "prize_name": prize_name,
+                    "winning_numbers": ",".join(winning_numbers),
+                    "award_date": actual_award_date
+                })
+                logger.debug("已解析獎項: %s, 號碼: %s", prize_name, awards_to_save[-1]["winning_numbers"])
             else:
-                print(f"警告: 未能為 {prize_name} 找到中獎號碼，跳過此獎項。", flush=True)
-
+                logger.warning("未能為 %s 找到中獎號碼，跳過此獎項。", prize_name)
 
     except Exception as e:
         raise Exception(f"解析網頁內容失敗，請檢查網頁結構是否變更或聯繫開發者。錯誤: {str(e)}")
@@ -501,34 +1063,69 @@ def _execute_fetch_awards_logic():
     if not awards_to_save:
         raise Exception("未能從網頁提取任何有效的開獎號碼，請檢查網頁結構或期別。")
 
-    try:
-        with db.session.begin():
-            for new_award_entry in awards_to_save:
-                existing_award = db.session.execute(
-                    db.select(Award).filter_by(
-                        award_date=new_award_entry.award_date,
-                        prize_name=new_award_entry.prize_name
-                    )
-                ).scalar_one_or_none()
-
-                if existing_award:
-                    # 只有當號碼確實不同時才更新，避免不必要的資料庫操作
-                    if existing_award.winning_numbers != new_award_entry.winning_numbers:
-                        existing_award.winning_numbers = new_award_entry.winning_numbers
-                        db.session.add(existing_award) # 標記為需要更新
-                        print(f"更新現有獎項: {new_award_entry.prize_name} for {new_award_entry.award_date}, 號碼: {new_award_entry.winning_numbers}", flush=True)
-                    else:
-                        print(f"獎項已存在且號碼相同，無需更新: {new_award_entry.prize_name} for {new_award_entry.award_date}", flush=True)
-                else:
-                    db.session.add(new_award_entry)
-                    print(f"新增獎項: {new_award_entry.prize_name} for {new_award_entry.award_date}, 號碼: {new_award_entry.winning_numbers}", flush=True)
+    return actual_award_date, awards_to_save
 
-            db.session.commit()
-            print("--- 開獎號碼已成功儲存至資料庫 ---", flush=True)
-    except Exception as e:
-        db.session.rollback()
-        raise Exception(f"儲存開獎號碼失敗: {str(e)}")
+def _upsert_awards(award_rows):
+    """
+    以單一 INSERT ... ON CONFLICT (award_date, prize_name) DO UPDATE 寫入多筆獎項，
+    只有號碼確實不同時才會更新，一次往返即可完成整期的儲存。
+    award_rows 為含 prize_name、winning_numbers、award_date 的 dict 列表。
+    回傳實際新增或變更的 (id, award_date, prize_name, winning_numbers) 列表；交易由呼叫端提交。
+    """
+    # 同一批內相同 (award_date, prize_name) 只保留第一筆，避免 ON CONFLICT 在同一語句中更新同一列兩次
+    unique_rows = {}
+    for row in award_rows:
+        unique_rows.setdefault((row["award_date"], row["prize_name"]), row)
+    if not unique_rows:
+        return []
+
+    stmt = pg_insert(Award).values(list(unique_rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Award.award_date, Award.prize_name],
+        set_={"winning_numbers": stmt.excluded.winning_numbers},
+        where=Award.winning_numbers.is_distinct_from(stmt.excluded.winning_numbers)
+    ).returning(Award.id, Award.award_date, Award.prize_name, Award.winning_numbers)
+    changed_awards = db.session.execute(stmt).all()
+
+    _sync_award_numbers([changed.id for changed in changed_awards])
+    if changed_awards:
+        version, updated_at = _bump_award_data_version()
+        # NOTIFY 會在交易提交後才送出，交易回滾時不會通知
+        _notify_award_changes({changed.award_date for changed in changed_awards}, version, updated_at)
+
+    for changed in changed_awards:
+        logger.info("新增或更新獎項: %s for %s, 號碼: %s", changed.prize_name, changed.award_date, changed.winning_numbers)
+    if len(changed_awards) < len(unique_rows):
+        logger.info("%d 個獎項已存在且號碼相同，無需更新", len(unique_rows) - len(changed_awards))
+    return changed_awards
+
+def _notify_award_changes(award_dates, version, updated_at):
+    """
+    發出開獎資料異動通知 (pg_notify)，讓各 web worker 的快取失效或預先載入；交易由呼叫端提交。
+    """
+    db.session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": AWARD_CHANGES_CHANNEL, "payload": build_award_change_payload(award_dates, version, updated_at)}
+    )
 
+def _sync_award_numbers(award_ids):
+    """
+    依 awards.winning_numbers 重建指定獎項在 award_numbers 中的個別號碼 (在資料庫內切割，不經過 Python)。
+    交易由呼叫端提交。
+    """
+    if not award_ids:
+        return
+    db.session.execute(
+        text("DELETE FROM award_numbers WHERE award_id = ANY(:award_ids)"),
+        {"award_ids": list(award_ids)}
+    )
+    db.session.execute(text("""
+        INSERT INTO award_numbers (award_id, award_date, number)
+        SELECT a.id, a.award_date, btrim(n.number)
+        FROM awards a
+        CROSS JOIN LATERAL unnest(string_to_array(a.winning_numbers, ',')) AS n(number)
+        WHERE a.id = ANY(:award_ids) AND btrim(n.number) <> ''
+    """), {"award_ids": list(award_ids)})
 
 # 輔助函數：從期別字串解析開獎日期
 def parse_award_date_from_period(period_str):
@@ -566,11 +1163,357 @@ def parse_award_date_from_period(period_str):
         
         return datetime(ce_year, award_month, award_day).date()
     except Exception as e:
-        print(f"解析期別 '{period_str}' 失敗: {e}", flush=True)
+        logger.warning("解析期別 '%s' 失敗: %s", period_str, e)
         # 如果解析失敗，提供一個合理的預設值或拋出錯誤
         # 這裡為了繼續流程，可以返回 None 或拋出，但在實際應用中應有更完善的錯誤處理
         raise ValueError(f"無法從期別 '{period_str}' 解析出正確的開獎日期: {e}")
 
+# 期別字串，例如 "110年01-02月" (民國年、單數起始月份)
+PERIOD_TEXT_PATTERN = re.compile(r'^(\d{2,3})年(\d{1,2})-(\d{1,2})月$')
+
+def parse_period_text(period_str):
+    """
+    解析期別字串，回傳 (民國年, 起始月份)；格式不正確時拋出 ValueError。
+    """
+    match = PERIOD_TEXT_PATTERN.match(period_str.strip().replace(' ', '').replace('期', ''))
+    if not match:
+        raise ValueError(f"期別 '{period_str}' 格式不正確，應為例如 110年01-02月")
+    roc_year, start_month, end_month = (int(group) for group in match.groups())
+    if start_month % 2 != 1 or end_month != start_month + 1:
+        raise ValueError(f"期別 '{period_str}' 的月份應為單數月份起始的兩個月，例如 01-02")
+    return roc_year, start_month
+
+def format_period_text(roc_year, start_month):
+    return f"{roc_year}年{start_month:02d}-{start_month + 1:02d}月"
+
+def iter_periods(start_period, end_period):
+    """
+    依序產生從 start_period 到 end_period (皆包含) 的每一期 (民國年, 起始月份)。
+    """
+    roc_year, start_month = start_period
+    while (roc_year, start_month) <= end_period:
+        yield roc_year, start_month
+        start_month += 2
+        if start_month > 12:
+            start_month = 1
+            roc_year += 1
+
+def latest_drawn_period(today=None):
+    """
+    回傳截至 today 為止最近一期已開獎的期別 (民國年, 起始月份)。
+    每期在單數月份 25 日開獎，開獎的是前兩個月的發票。
+    """
+    today = today or date.today()
+    award_year, award_month = today.year, today.month
+    if award_month % 2 == 0:
+        award_month -= 1
+    elif today.day < 25:
+        award_month -= 2
+    if award_month < 1:
+        award_month += 12
+        award_year -= 1
+    period_start, _ = get_invoice_period_for_award_date(date(award_year, award_month, 25))
+    return period_start.year - 1911, period_start.month
+
+# 輔助函數：由開獎日期推算該期發票的開立期間
+def get_invoice_period_for_award_date(award_date):
+    """
+    由開獎日期推算該期發票的開立期間 (parse_award_date_from_period 的反向)。
+    例如 2024-03-25 開獎的是 2024-01-01 ~ 2024-02-29 開立的發票；
+    2024-01-25 開獎的是 2023-11-01 ~ 2023-12-31 開立的發票。
+    回傳 (period_start, period_end)，兩端皆包含。
+    """
+    end_year = award_date.year
+    end_month = award_date.month - 1
+    if end_month == 0:
+        # 1 月開獎的是前一年 11-12 月的發票
+        end_month = 12
+        end_year -= 1
+    period_start = date(end_year, end_month - 1, 1)
+    period_end = date(end_year, end_month, calendar.monthrange(end_year, end_month)[1])
+    return period_start, period_end
+
+def period_text_for_award_date(award_date):
+    period_start, _ = get_invoice_period_for_award_date(award_date)
+    return format_period_text(period_start.year - 1911, period_start.month)
+
+def resolve_invoice_period(purchase_date):
+    """
+    由發票開立 (購買) 日期推算所屬期別與開獎日期，回傳 (期別字串, 開獎日期)，
+    例如 2024-02-10 -> ("113年01-02月", 2024-03-25)。
+    """
+    award_date = award_date_for_purchase_date(purchase_date)
+    return period_text_for_award_date(award_date), award_date
+
+# --- 發票中獎狀態對帳 ---
+
+def _prize_rules_values_sql():
+    """
+    產生獎項規則 (prize_name, prize_rank, match_length) 的 VALUES 子句與綁定參數，
+    讓 SQL 對帳與 award_matcher 共用同一份獎項規則。
+    """
+    rows = []
+    params = {}
+    for i, (prize_name, match_length) in enumerate(PRIZE_MATCH_LENGTHS.items()):
+        rows.append(f"(:prize_name_{i}, :prize_rank_{i}, :match_length_{i})")
+        params[f"prize_name_{i}"] = prize_name
+        params[f"prize_rank_{i}"] = PRIZE_ORDER[prize_name]
+        params[f"match_length_{i}"] = match_length
+    return ", ".join(rows), params
+
+def _reconcile_invoices_for_award_date(award_date):
+    """
+    將該期 (開獎日期 award_date) 所有已儲存發票的 winning_status 與 award_id 更新為正確的對獎結果。
+    全部以集合式 SQL 在資料庫內完成，不會把發票逐筆載入 Python：
+    1. 以 award_numbers 的末三碼 (所有獎項的最低比對碼數) 做雜湊連接，再依各獎項碼數過濾，取每張發票的最高獎項
+    2. 更新中獎發票
+    3. 清除該期已不再中獎的發票
+    更新條件只挑選結果確實不同的列，因此重複執行不會產生任何額外寫入。
+    """
+    period_start, period_end = get_invoice_period_for_award_date(award_date)
+    prize_rules_sql, params = _prize_rules_values_sql()
+    params.update({
+        "award_date": award_date,
+        "period_start": period_start,
+        "period_end": period_end
+    })
+
+    try:
+        db.session.execute(text(f"""
+            CREATE TEMP TABLE invoice_reconcile_matches ON COMMIT DROP AS
+            WITH prize_rules (prize_name, prize_rank, match_length) AS (
+                VALUES {prize_rules_sql}
+            ),
+            winning_numbers AS (
+                SELECT an.award_id, r.prize_rank, r.match_length, an.number, an.suffix_3
+                FROM award_numbers an
+                JOIN awards a ON a.id = an.award_id
+                JOIN prize_rules r ON r.prize_name = a.prize_name
+                WHERE an.award_date = :award_date
+            ),
+            period_invoices AS (
+                SELECT id, replace(btrim(invoice_number), '-', '') AS number
+                FROM invoices
+                WHERE invoice_date BETWEEN :period_start AND :period_end
+            )
+            SELECT DISTINCT ON (i.id) i.id AS invoice_id, w.award_id
+            FROM period_invoices i
+            JOIN winning_numbers w
+              ON right(i.number, 3) = w.suffix_3
+             AND right(i.number, w.match_length) = right(w.number, w.match_length)
+            ORDER BY i.id, w.prize_rank
+        """), params)
+        db.session.execute(text("ALTER TABLE invoice_reconcile_matches ADD PRIMARY KEY (invoice_id)"))
+        db.session.execute(text("ANALYZE invoice_reconcile_matches"))
+
+        winning_count = db.session.execute(text("SELECT count(*) FROM invoice_reconcile_matches")).scalar()
+
+        updated_count = db.session.execute(text("""
+            UPDATE invoices i
+            SET winning_status = TRUE, award_id = m.award_id
+            FROM invoice_reconcile_matches m
+            WHERE i.id = m.invoice_id
+              AND (i.winning_status IS NOT TRUE OR i.award_id IS DISTINCT FROM m.award_id)
+        """)).rowcount
+
+        cleared_count = db.session.execute(text("""
+            UPDATE invoices i
+            SET winning_status = FALSE, award_id = NULL
+            WHERE i.invoice_date BETWEEN :period_start AND :period_end
+              AND (i.winning_status IS DISTINCT FROM FALSE OR i.award_id IS NOT NULL)
+              AND NOT EXISTS (SELECT 1 FROM invoice_reconcile_matches m WHERE m.invoice_id = i.id)
+        """), {"period_start": period_start, "period_end": period_end}).rowcount
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info("--- 發票對帳完成：開獎日期 %s，中獎 %d 張，更新 %d 張，清除 %d 張 ---",
+                award_date.isoformat(), winning_count, updated_count, cleared_count)
+    return {
+        "award_date": award_date.isoformat(),
+        "period_start": period_start.isoformat(),
+        "period_end": period_end.isoformat(),
+        "winning": winning_count,
+        "updated": updated_count,
+        "cleared": cleared_count
+    }
+
+def _resolve_reconcile_award_date(award_date_str):
+    """
+    解析對帳的開獎日期；未指定時使用資料庫中最新的開獎日期。
+    找不到可用的開獎日期時回傳 None。
+    """
+    if award_date_str:
+        return datetime.strptime(award_date_str, '%Y-%m-%d').date()
+    return db.session.execute(db.select(db.func.max(Award.award_date))).scalar()
+
+@app.route('/reconcile_invoices', methods=['POST'])
+def reconcile_invoices():
+    """
+    依開獎號碼重新計算該期所有發票的中獎狀態。
+    請求範例 (award_date 可省略，預設為最新一期):
+    {
+        "award_date": "2024-03-25"
+    }
+    """
+    data = request.get_json(silent=True) or {}
+
+    try:
+        award_date = _resolve_reconcile_award_date(data.get('award_date'))
+    except (TypeError, ValueError):
+        return jsonify({"message": "award_date 格式不正確，應為YYYY-MM-DD"}), 400
+    if award_date is None:
+        return jsonify({"message": "資料庫中沒有任何獎項資料，無法對帳"}), 404
+
+    try:
+        result = _reconcile_invoices_for_award_date(award_date)
+        return jsonify({"message": "發票中獎狀態對帳完成", "result": result}), 200
+    except Exception as e:
+        return jsonify({"message": "發票中獎狀態對帳失敗", "error": str(e)}), 500
+
+@app.cli.command('reconcile-invoices')
+@click.option('--award-date', default=None, help='開獎日期 (YYYY-MM-DD)，預設為最新一期')
+def reconcile_invoices_command(award_date):
+    """
+    依開獎號碼重新計算該期所有發票的中獎狀態。
+    """
+    try:
+        resolved_award_date = _resolve_reconcile_award_date(award_date)
+    except ValueError:
+        raise click.BadParameter("格式應為YYYY-MM-DD", param_hint='--award-date')
+    if resolved_award_date is None:
+        raise click.ClickException("資料庫中沒有任何獎項資料，無法對帳")
+    _reconcile_invoices_for_award_date(resolved_award_date)
+
+# --- 回補歷史期別的開獎號碼 ---
+
+# 各期開獎網頁的網址樣板，{period_code} 為民國年 3 碼加起始月份 2 碼 (例如 11001)
+INVOICE_PERIOD_URL_TEMPLATE = os.getenv(
+    'INVOICE_PERIOD_URL_TEMPLATE', 'https://www.etax.nat.gov.tw/etw-main/ETW183W2_{period_code}/'
+)
+# 回補時同時抓取的網頁數上限
+BACKFILL_MAX_WORKERS = int(os.getenv('BACKFILL_MAX_WORKERS', '4'))
+
+def _period_url(roc_year, start_month):
+    return INVOICE_PERIOD_URL_TEMPLATE.format(
+        period_code=f"{roc_year:03d}{start_month:02d}", roc_year=roc_year, start_month=start_month
+    )
+
+def _backfill_awards(periods, max_workers=BACKFILL_MAX_WORKERS, chunk_size=6, force=False):
+    """
+    回補多個期別的開獎號碼。
+    每 chunk_size 期為一批：以執行緒池並行抓取，解析後以一次 _upsert_awards 寫入並提交，
+    中斷後重新執行時，已有開獎號碼的期別會被略過 (force 為 True 時全部重新抓取)。
+    回傳統計 dict，failed 為抓取或解析失敗的期別列表。
+    """
+    pending = [
+        (format_period_text(roc_year, start_month), roc_year, start_month)
+        for roc_year, start_month in periods
+    ]
+    skipped = 0
+    if not force and pending:
+        award_dates = [parse_award_date_from_period(period_text) for period_text, _, _ in pending]
+        existing_dates = set(db.session.execute(
+            db.select(Award.award_date).where(Award.award_date.in_(award_dates)).distinct()
+        ).scalars())
+        db.session.rollback()
+        remaining = [item for item, award_date in zip(pending, award_dates) if award_date not in existing_dates]
+        skipped = len(pending) - len(remaining)
+        pending = remaining
+
+    saved = 0
+    changed_count = 0
+    failed = []
+    session = build_session(retries=SCRAPER_RETRIES, backoff_factor=SCRAPER_BACKOFF, pool_maxsize=max_workers)
+    try:
+        for chunk_start in range(0, len(pending), chunk_size):
+            chunk = pending[chunk_start:chunk_start + chunk_size]
+            urls = {_period_url(roc_year, start_month): period_text for period_text, roc_year, start_month in chunk}
+
+            award_rows = []
+            for url, page, error in fetch_pages(session, urls, SCRAPER_TIMEOUT, max_workers):
+                period_text = urls[url]
+                if error is not None:
+                    logger.warning("無法抓取 %s 的開獎網頁 (%s): %s", period_text, url, error)
+                    metrics.record_scraper_fetch("error")
+                    failed.append(period_text)
+                    continue
+                metrics.observe_scraper_phase("fetch", page.elapsed)
+                try:
+                    with metrics.time_scraper_phase("parse"):
+                        _, awards_to_save = _parse_award_page(page.text, expected_period_text=period_text)
+                except Exception as e:
+                    logger.warning("%s 的開獎網頁解析失敗: %s", period_text, e)
+                    failed.append(period_text)
+                    continue
+                award_rows.extend(awards_to_save)
+                saved += 1
+
+            if not award_rows:
+                continue
+            try:
+                with metrics.time_scraper_phase("save"):
+                    changed_awards = _upsert_awards(award_rows)
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                raise Exception(f"儲存開獎號碼失敗: {str(e)}")
+            changed_count += len(changed_awards)
+
+            changed_dates = sorted({changed.award_date for changed in changed_awards})
+            if changed_dates:
+                award_matcher_cache.invalidate(changed_dates)
+                for award_date in changed_dates:
+                    try:
+                        _reconcile_invoices_for_award_date(award_date)
+                    except Exception as e:
+                        logger.warning("開獎日期 %s 的發票對帳失敗: %s", award_date.isoformat(), e)
+            logger.info("--- 回補進度：已處理 %d/%d 期 ---", min(chunk_start + chunk_size, len(pending)), len(pending))
+    finally:
+        session.close()
+
+    failed_periods = set(failed)
+    return {
+        "periods": len(periods),
+        "skipped": skipped,
+        "saved": saved,
+        "changed": changed_count,
+        "failed": [period_text for period_text, _, _ in pending if period_text in failed_periods]
+    }
+
+@app.cli.command('backfill-awards')
+@click.option('--start', 'start_period', required=True, help='起始期別，例如 110年01-02月')
+@click.option('--end', 'end_period', default=None, help='結束期別 (包含)，預設為最近一期已開獎的期別')
+@click.option('--workers', default=BACKFILL_MAX_WORKERS, show_default=True, type=click.IntRange(1, 32),
+              help='同時抓取的網頁數')
+@click.option('--chunk-size', default=6, show_default=True, type=click.IntRange(1),
+              help='每個交易寫入的期別數')
+@click.option('--force', is_flag=True, help='連同資料庫中已有開獎號碼的期別一起重新抓取')
+def backfill_awards_command(start_period, end_period, workers, chunk_size, force):
+    """
+    回補歷史期別的開獎號碼；中斷後重新執行同一指令即可從未完成的期別繼續。
+    """
+    try:
+        start = parse_period_text(start_period)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--start')
+    try:
+        end = parse_period_text(end_period) if end_period else latest_drawn_period()
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--end')
+    if end < start:
+        raise click.BadParameter("結束期別不可早於起始期別", param_hint='--end')
+
+    result = _backfill_awards(list(iter_periods(start, end)), max_workers=workers, chunk_size=chunk_size, force=force)
+    if result["changed"]:
+        refresh_draw_snapshot()
+    click.echo(f"期別 {result['periods']} 期：略過 {result['skipped']} 期 (已有資料)，"
+               f"儲存 {result['saved']} 期，異動獎項 {result['changed']} 筆，失敗 {len(result['failed'])} 期")
+    if result["failed"]:
+        raise click.ClickException(f"以下期別回補失敗，可重新執行同一指令重試: {', '.join(result['failed'])}")
+
 # --- 檢視排程任務狀態 ---
 @app.route('/scheduler_status', methods=['GET'])
 def scheduler_status():
@@ -592,32 +1535,403 @@ def scheduler_status():
     return jsonify({"status": "scheduler running", "jobs": jobs}), 200
 
 
-# 設定排程任務
-# 這裡設定為每 12 小時執行一次 fetch_awards
-# 您可以根據實際需求調整 interval 或使用 cron 設定更精確的時間
-@scheduler.task('interval', id='do_fetch_awards', hours=12, misfire_grace_time=900)
+# --- 開獎資料異動通知 (LISTEN/NOTIFY) ---
+
+# 開獎資料異動通知的頻道
+AWARD_CHANGES_CHANNEL = os.getenv('AWARD_CHANGES_CHANNEL', 'award_changes')
+# 收到通知時是否立即重新載入異動日期的對獎器 (否則只讓快取失效，等下一個請求載入)
+AWARD_CHANGE_PREWARM = os.getenv('AWARD_CHANGE_PREWARM', 'true').lower() in ('1', 'true', 'yes')
+
+award_change_listener = None
+
+def _handle_award_change(award_dates, version, updated_at):
+    award_matcher_cache.invalidate(award_dates)
+    award_data_version_cache.offer(version, updated_at)
+    if AWARD_CHANGE_PREWARM and award_matcher_cache.maxsize > 0:
+        with app.app_context():
+            _load_award_matchers(award_dates)
+    logger.info("--- 收到開獎資料異動通知：版本 %s，開獎日期 %s ---",
+                version, ", ".join(award_date.isoformat() for award_date in award_dates))
+
+def _handle_award_listener_reconnect():
+    # 連線中斷期間可能漏接通知，讓所有程序內快取失效
+    award_matcher_cache.invalidate()
+    award_data_version_cache.reset()
+
+def start_award_change_listener():
+    """
+    在目前程序啟動開獎資料異動通知的監聽執行緒 (每個 web worker 一個，由 gunicorn.conf.py 呼叫)。
+    監聽使用獨立於連線池之外的專用連線。
+    """
+    global award_change_listener
+    if award_change_listener is None:
+        with app.app_context():
+            engine = db.engine
+
+        def connect():
+            connection = engine.raw_connection()
+            connection.detach() # 不歸還連線池，由監聽執行緒獨佔
+            return connection.dbapi_connection
+
+        award_change_listener = AwardChangeListener(
+            connect, AWARD_CHANGES_CHANNEL, _handle_award_change,
+            on_reconnect=_handle_award_listener_reconnect
+        )
+        award_change_listener.start()
+    return award_change_listener
+
+def stop_award_change_listener():
+    if award_change_listener is not None:
+        award_change_listener.stop(timeout=10)
+
+# --- 開獎資料快照 ---
+
+def refresh_draw_snapshot(force=False):
+    """
+    以資料庫中所有開獎資料重新產生快照 (快照版本與資料庫相同時略過，force 為 True 時一律重寫)。
+    回傳快照的版本號；未設定 DRAW_SNAPSHOT_PATH 時回傳 None。
+    """
+    if not DRAW_SNAPSHOT_PATH:
+        return None
+    # 先讀版本號再讀資料：兩者之間有新的寫入時，快照內容只會比標示的版本新，讀取端不會誤用舊資料
+    version = db.session.execute(db.select(AwardDataVersion.version).filter_by(id=1)).scalar() or 0
+    if not force and read_snapshot_version(DRAW_SNAPSHOT_PATH) == version:
+        db.session.rollback()
+        return version
+
+    rows = db.session.execute(
+        db.select(Award.award_date, Award.id, Award.prize_name, Award.winning_numbers)
+        .order_by(Award.award_date, Award.id)
+    ).all()
+    db.session.rollback()
+    draws = {}
+    for award_date, award_id, prize_name, winning_numbers in rows:
+        draws.setdefault(award_date, []).append((award_id, prize_name, winning_numbers))
+
+    size = write_snapshot(DRAW_SNAPSHOT_PATH, version, draws)
+    logger.info("--- 開獎資料快照已更新：版本 %s，%d 期，%d bytes ---", version, len(draws), size)
+    return version
+
+@app.cli.command('write-draw-snapshot')
+@click.option('--force', is_flag=True, help='即使版本相同也重新寫入')
+def write_draw_snapshot_command(force):
+    """
+    重新產生開獎資料快照 (DRAW_SNAPSHOT_PATH)。
+    """
+    if not DRAW_SNAPSHOT_PATH:
+        raise click.ClickException("未設定 DRAW_SNAPSHOT_PATH")
+    refresh_draw_snapshot(force=force)
+
+# --- 依開獎日程排程抓取 ---
+
+# 每期在單數月份 25 日開獎 (與 parse_award_date_from_period 相同的規則)；以下時間皆為 DRAW_TIMEZONE 的當地時間
+DRAW_TIMEZONE = ZoneInfo(os.getenv('DRAW_TIMEZONE', 'Asia/Taipei'))
+# 開獎日從幾點開始密集抓取
+DRAW_POLL_START_HOUR = int(os.getenv('DRAW_POLL_START_HOUR', '13'))
+# 密集抓取的間隔 (分鐘) 與持續時間 (小時)
+DRAW_POLL_INTERVAL_MINUTES = int(os.getenv('DRAW_POLL_INTERVAL_MINUTES', '10'))
+DRAW_POLL_WINDOW_HOURS = int(os.getenv('DRAW_POLL_WINDOW_HOURS', '48'))
+# 超過密集抓取時間仍未取得該期號碼時，改以較長的間隔 (小時) 持續抓取
+DRAW_FALLBACK_INTERVAL_HOURS = int(os.getenv('DRAW_FALLBACK_INTERVAL_HOURS', '6'))
+
+# 抓取開獎號碼的 PostgreSQL advisory lock 鍵值，整個叢集同時只會有一個 worker 在抓取
+FETCH_AWARDS_LOCK_KEY = int(os.getenv('FETCH_AWARDS_LOCK_KEY', '727362001'))
+
+FETCH_AWARDS_JOB_ID = 'do_fetch_awards'
+
+@contextmanager
+def _try_advisory_lock(lock_key):
+    """
+    以獨立的資料庫連線嘗試取得 session 層級的 advisory lock，產生是否取得。
+    取得後立即提交，持有鎖期間連線不會停在交易中；結束時釋放鎖。
+    """
+    with db.engine.connect() as connection:
+        acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": lock_key}).scalar()
+        connection.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": lock_key})
+                connection.commit()
+
+def _shift_draw_date(award_date, periods):
+    """
+    回傳 award_date 之後 (periods 為負數時為之前) 第 periods 期的開獎日期。
+    """
+    month_index = award_date.year * 12 + award_date.month - 1 + 2 * periods
+    return date(month_index // 12, month_index % 12 + 1, 25)
+
+def _draw_poll_start(award_date):
+    return datetime.combine(award_date, time(DRAW_POLL_START_HOUR), tzinfo=DRAW_TIMEZONE)
+
+def next_fetch_awards_time(now, latest_award_date):
+    """
+    依開獎日程計算下一次抓取的時間。
+    now 為帶時區的目前時間，latest_award_date 為資料庫中最新的開獎日期 (沒有資料時為 None)。
+    - 最近一期已開獎的號碼已入庫：閒置到下一期開獎日的 DRAW_POLL_START_HOUR
+    - 尚未入庫且仍在密集抓取時間內：DRAW_POLL_INTERVAL_MINUTES 後再抓
+    - 尚未入庫且已超過密集抓取時間：DRAW_FALLBACK_INTERVAL_HOURS 後再抓
+    """
+    local_now = now.astimezone(DRAW_TIMEZONE)
+    current_draw = parse_award_date_from_period(format_period_text(*latest_drawn_period(local_now.date())))
+    if local_now < _draw_poll_start(current_draw):
+        # 開獎日當天但還沒到開始抓取的時間，最近一期仍是上一期
+        current_draw = _shift_draw_date(current_draw, -1)
+    next_poll_start = _draw_poll_start(_shift_draw_date(current_draw, 1))
+
+    if latest_award_date is not None and latest_award_date >= current_draw:
+        return next_poll_start
+    if local_now < _draw_poll_start(current_draw) + timedelta(hours=DRAW_POLL_WINDOW_HOURS):
+        candidate = local_now + timedelta(minutes=DRAW_POLL_INTERVAL_MINUTES)
+    else:
+        candidate = local_now + timedelta(hours=DRAW_FALLBACK_INTERVAL_HOURS)
+    return min(candidate, next_poll_start)
+
+def schedule_next_fetch_awards():
+    """
+    依資料庫中最新的開獎日期排定下一次抓取 (取代既有的排程)，回傳排定的時間。
+    """
+    now = datetime.now(DRAW_TIMEZONE)
+    try:
+        latest_award_date = db.session.execute(db.select(func.max(Award.award_date))).scalar()
+        db.session.rollback()
+        run_date = next_fetch_awards_time(now, latest_award_date)
+    except Exception as e:
+        db.session.rollback()
+        run_date = now + timedelta(minutes=DRAW_POLL_INTERVAL_MINUTES)
+        logger.warning("無法依開獎日程計算下一次抓取時間，%d 分鐘後重試。錯誤: %s", DRAW_POLL_INTERVAL_MINUTES, e)
+
+    scheduler.add_job(
+        id=FETCH_AWARDS_JOB_ID, func=scheduled_fetch_awards, trigger='date', run_date=run_date,
+        replace_existing=True, misfire_grace_time=900
+    )
+    logger.info("--- 下一次抓取開獎號碼排定於 %s ---", run_date.isoformat())
+    return run_date
+
 def scheduled_fetch_awards():
     with app.app_context(): # 確保在應用程式上下文中執行
-        print("--- 排程任務啟動：自動獲取開獎號碼 ---", flush=True)
+        logger.info("--- 排程任務啟動：自動獲取開獎號碼 ---")
         try:
-            # 調用抽離出來的核心邏輯函數
-            _execute_fetch_awards_logic()
-            print("--- 排程任務完成：開獎號碼已成功獲取並更新至資料庫 ---", flush=True)
+            with _try_advisory_lock(FETCH_AWARDS_LOCK_KEY) as acquired:
+                if not acquired:
+                    logger.info("--- 排程任務略過：其他 worker 正在抓取開獎號碼 ---")
+                else:
+                    # 調用抽離出來的核心邏輯函數
+                    result = _execute_fetch_awards_logic()
+                    if result["status"] == "unchanged":
+                        logger.info("--- 排程任務完成：財政部網頁沒有變更，無需更新 ---")
+                    else:
+                        logger.info("--- 排程任務完成：開獎號碼已成功獲取並更新至資料庫 ---")
         except Exception as e:
             # 任務失敗時，回滾可能存在的資料庫事務（_execute_fetch_awards_logic 內部已有處理）
-            # 並打印錯誤信息
-            print(f"--- 排程任務失敗：儲存開獎號碼失敗。錯誤: {str(e)} ---", flush=True)
+            # 並記錄錯誤信息
+            logger.error("--- 排程任務失敗：儲存開獎號碼失敗。錯誤: %s ---", e)
+        try:
+            # 開獎資料有異動 (包含回補或手動觸發寫入的資料) 時重新產生快照
+            refresh_draw_snapshot()
+        except Exception as e:
+            logger.warning("更新開獎資料快照失敗: %s", e)
+        finally:
+            # 每次執行後依是否已取得最新一期的號碼排定下一次抓取
+            schedule_next_fetch_awards()
+
+
+# --- 背景工作 (大型批次對獎與匯入，見 jobs.py) ---
+
+# scheduler 每隔幾秒檢查一次是否有待處理的工作
+JOB_POLL_INTERVAL = int(os.getenv('JOB_POLL_INTERVAL', '5'))
+# 處理中的工作超過此秒數沒有更新進度 (例如 scheduler 被重新啟動) 時，可被重新領取
+JOB_STALE_AFTER = int(os.getenv('JOB_STALE_AFTER', '600'))
+PROCESS_JOBS_JOB_ID = 'process_jobs'
+
+def _job_to_dict(job):
+    data = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "format": job.import_format,
+        "input_size": job.input_size,
+        "processed": job.processed,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+    if job.kind == "check_invoices" and job.status == "succeeded":
+        data["result_url"] = url_for('get_job_result', job_id=job.id)
+    return data
+
+def _submit_job(kind):
+    """
+    將上傳內容串流寫入 JOB_STORAGE_DIR 並新增一筆 pending 工作，回傳 202 與查詢進度的網址。
+    """
+    binary_stream, import_format = _upload_source()
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({"message": UNKNOWN_IMPORT_FORMAT_MESSAGE}), 400
+
+    input_path, result_path = jobs.new_job_paths(kind)
+    try:
+        input_size = jobs.save_upload(binary_stream, input_path)
+        job = Job(kind=kind, status='pending', import_format=import_format, input_path=input_path,
+                  input_size=input_size, result_path=result_path, processed=0)
+        db.session.add(job)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if os.path.exists(input_path):
+            os.remove(input_path)
+        return jsonify({"message": "建立背景工作失敗", "error": str(e)}), 500
+
+    status_url = url_for('get_job', job_id=job.id)
+    response = jsonify({"message": "背景工作已建立", "job_id": job.id, "status_url": status_url})
+    response.headers['Location'] = status_url
+    return response, 202
 
+@app.route('/jobs/check_invoices', methods=['POST'])
+def submit_check_invoices_job():
+    """
+    以背景工作檢核大量發票 (上傳方式與 POST /invoices/bulk 相同，每筆需有 invoice_number 與
+    invoice_date 或 purchase_date；載具 CSV 與 QR Code 內容的日期為開立日期，會換算成開獎期別)，
+    回傳 job_id；完成後由 GET /jobs/<id>/result 下載 NDJSON 結果。
+    """
+    return _submit_job("check_invoices")
+
+@app.route('/jobs/import_invoices', methods=['POST'])
+def submit_import_invoices_job():
+    """
+    以背景工作匯入大量發票 (格式與 POST /invoices/bulk 相同)，回傳 job_id。
+    """
+    return _submit_job("import_invoices")
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    查詢背景工作的狀態、已處理筆數與完成後的統計。
+    """
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({"message": f"找不到 ID 為 {job_id} 的背景工作"}), 404
+    return jsonify({"job": _job_to_dict(job)}), 200
+
+@app.route('/jobs/<int:job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """
+    下載對獎工作的結果 (NDJSON，每行對應上傳內容的一筆，line 為原始行號)。
+    """
+    job = db.session.get(Job, job_id)
+    if not job or job.kind != "check_invoices":
+        return jsonify({"message": f"找不到 ID 為 {job_id} 的對獎工作"}), 404
+    if job.status != "succeeded":
+        return jsonify({"message": f"背景工作尚未完成 (目前狀態: {job.status})"}), 409
+    return send_file(job.result_path, mimetype=STREAM_MIMETYPES["ndjson"],
+                     as_attachment=True, download_name=f"job-{job.id}-result.ndjson")
+
+def _claim_next_job():
+    """
+    領取一個待處理 (或處理中但已逾時) 的工作並標記為 running，沒有工作時回傳 None。
+    FOR UPDATE SKIP LOCKED 讓多個 scheduler 同時領取時不會拿到同一個工作。
+    """
+    row = db.session.execute(text("""
+        UPDATE jobs SET status = 'running', started_at = now(), updated_at = now(), processed = 0
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE status = 'pending'
+               OR (status = 'running' AND updated_at < now() - make_interval(secs => :stale_after))
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id
+    """), {"stale_after": JOB_STALE_AFTER}).first()
+    db.session.commit()
+    return db.session.get(Job, row.id) if row else None
+
+def _update_job(job_id, **values):
+    db.session.execute(db.update(Job).where(Job.id == job_id).values(updated_at=func.now(), **values))
+    db.session.commit()
+
+def _run_check_job(job, executor):
+    version = db.session.execute(db.select(AwardDataVersion.version).filter_by(id=1)).scalar() or 0
+    award_rows = [tuple(row) for row in db.session.execute(
+        db.select(Award.award_date, Award.id, Award.prize_name, Award.winning_numbers)
+    )]
+    db.session.rollback()
+
+    summary = {"total": 0, "checked": 0, "winning": 0, "failed": 0}
+    with open(job.result_path, 'w', encoding='utf-8') as result_file:
+        def on_result(chunk_result):
+            lines, counts = chunk_result
+            result_file.write(lines)
+            for key, value in counts.items():
+                summary[key] += value
+            _update_job(job.id, processed=summary["total"])
+
+        jobs.run_chunks(executor, jobs.check_chunk, jobs.iter_record_chunks(job.input_path, job.import_format),
+                        (version, award_rows), on_result)
+    return summary
+
+def _run_import_job(job, executor):
+    summary = {}
+
+    def on_result(chunk_stats):
+        jobs.merge_import_stats(summary, chunk_stats)
+        _update_job(job.id, processed=summary["total"])
+
+    jobs.run_chunks(executor, jobs.import_chunk, jobs.iter_record_chunks(job.input_path, job.import_format),
+                    (app.config['SQLALCHEMY_DATABASE_URI'],), on_result)
+    return summary
+
+def process_pending_jobs():
+    """
+    依序處理所有待處理的背景工作 (由 scheduler 服務定期執行)。
+    """
+    with app.app_context():
+        while True:
+            try:
+                job = _claim_next_job()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning("領取背景工作失敗: %s", e)
+                return
+            if job is None:
+                return
+
+            logger.info("--- 背景工作開始：#%d %s ---", job.id, job.kind)
+            try:
+                executor = jobs.get_executor()
+                run = _run_check_job if job.kind == "check_invoices" else _run_import_job
+                summary = run(job, executor)
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("--- 背景工作失敗：#%d %s ---", job.id, e)
+                _update_job(job.id, status='failed', error=str(e), finished_at=func.now())
+                continue
+
+            _update_job(job.id, status='succeeded', result=summary, finished_at=func.now())
+            if os.path.exists(job.input_path):
+                os.remove(job.input_path) # 上傳內容處理完就不再需要
+            logger.info("--- 背景工作完成：#%d %s，共 %d 筆 ---", job.id, job.kind, summary.get("total", 0))
+
+def schedule_job_processing():
+    """
+    在 scheduler 服務中定期處理背景工作 (同一時間只執行一個 process_pending_jobs)。
+    """
+    scheduler.add_job(
+        id=PROCESS_JOBS_JOB_ID, func=process_pending_jobs, trigger='interval', seconds=JOB_POLL_INTERVAL,
+        replace_existing=True, max_instances=1, coalesce=True
+    )
 
 # --- 資料庫初始化函數 ---
 def init_db():
     with app.app_context():
-        print("--- 正在創建或更新資料庫表結構 ---", flush=True)
+        logger.info("--- 正在創建或更新資料庫表結構 ---")
         db.create_all()
-        print("--- 資料庫表結構已完成 ---", flush=True)
+        logger.info("--- 資料庫表結構已完成 ---")
 
 if __name__ == '__main__':
-    print("Flask 應用程式已啟動。請確保您的資料庫Schema已通過Alembic正確初始化和更新。", flush=True)
+    logger.info("Flask 應用程式已啟動。請確保您的資料庫Schema已通過Alembic正確初始化和更新。")
     # 如果您只是在本地測試，可以在這裡呼叫 init_db()
     # init_db() 
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,379 @@
+# async_app.py
+"""
+唯讀查詢路由 (/health、POST /check_invoice、GET /awards) 的非同步服務模式 (選用)。
+
+同步版本 (gunicorn gthread) 每個 worker 同時只能處理與執行緒數相同的請求，
+開獎當晚大部分時間都花在等待 psycopg2 回應；這裡改以 asyncio + asyncpg 處理，
+單一程序即可同時保持數千個對獎請求，資料庫連線數則由有上限的連線池控制
+(ASYNC_DB_POOL_SIZE + ASYNC_DB_MAX_OVERFLOW)，等待連線超過 ASYNC_DB_POOL_TIMEOUT 秒時回傳 503。
+
+參數驗證、對獎器、回應格式與 ETag 都與同步版本共用 (api_common.py、award_matcher.py、draw_snapshot.py)，
+同一個請求在兩種模式下回傳相同的內容；寫入與管理類的路由仍只由同步版本提供。
+
+啟動方式 (需要 starlette、uvicorn、asyncpg):
+    uvicorn async_app:app --host 0.0.0.0 --port 5001
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+import asyncpg
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.http import http_date, parse_date, parse_etags, quote_etag
+
+from api_common import (
+    AWARDS_CACHE_CONTROL, INVALID_JSON_MESSAGE, STREAM_MIMETYPES, STREAM_YIELD_PER,
+    awards_etag, build_check_result, encode_cursor, no_award_data_message, parse_check_item, parse_list_args
+)
+from award_listener import LatestVersion, parse_award_change_payload
+from award_matcher import AwardMatcherCache, compile_award_matchers
+from draw_snapshot import DrawSnapshotReader
+from serializers import award_to_dict, dumps, dumps_bytes, loads
+
+# 加載 .env 檔案中的環境變數
+load_dotenv()
+
+# 與 app.py 相同的日誌設定
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+                    format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+if not DATABASE_URL:
+    raise RuntimeError("未設定 DATABASE_URL")
+
+# 非同步連線池大小：同時查詢資料庫的請求數上限，其餘請求在事件迴圈中等待連線
+ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', '10'))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv('ASYNC_DB_MAX_OVERFLOW', '0'))
+# 等待連線的最長秒數，超過時回傳 503 而不是無限排隊
+ASYNC_DB_POOL_TIMEOUT = float(os.getenv('ASYNC_DB_POOL_TIMEOUT', '5'))
+
+# 與同步版本相同的設定 (見 app.py)
+AWARD_CHANGES_CHANNEL = os.getenv('AWARD_CHANGES_CHANNEL', 'award_changes')
+AWARD_CHANGE_PREWARM = os.getenv('AWARD_CHANGE_PREWARM', 'true').lower() in ('1', 'true', 'yes')
+AWARD_LISTENER_RETRY_DELAY = 5.0
+DRAW_SNAPSHOT_PATH = os.getenv('DRAW_SNAPSHOT_PATH')
+DRAW_SNAPSHOT_CHECK_INTERVAL = float(os.getenv('DRAW_SNAPSHOT_CHECK_INTERVAL', '1'))
+
+_database_url = make_url(DATABASE_URL)
+engine = create_async_engine(
+    _database_url.set(drivername='postgresql+asyncpg'),
+    pool_size=ASYNC_DB_POOL_SIZE,
+    max_overflow=ASYNC_DB_MAX_OVERFLOW,
+    pool_timeout=ASYNC_DB_POOL_TIMEOUT
+)
+# 監聽異動通知使用連線池之外的專用連線
+_listen_dsn = _database_url.set(drivername='postgresql').render_as_string(hide_password=False)
+
+award_matcher_cache = AwardMatcherCache(maxsize=int(os.getenv('AWARD_MATCHER_CACHE_SIZE', '64')))
+award_data_version_cache = LatestVersion()
+draw_snapshot_reader = (
+    DrawSnapshotReader(DRAW_SNAPSHOT_PATH, check_interval=DRAW_SNAPSHOT_CHECK_INTERVAL) if DRAW_SNAPSHOT_PATH else None
+)
+# 目前是否正在監聽開獎資料異動通知；中斷期間每個請求都向資料庫確認版本號
+award_change_listening = False
+
+# 正在從資料庫載入的開獎日期 -> 載入工作；同一日期同時快取未命中的請求共用同一次查詢
+_matcher_loads = {}
+# 背景預熱工作 (保留參考避免被回收)
+_background_tasks = set()
+
+AWARD_ROWS_SQL = text(
+    "SELECT award_date, id, prize_name, winning_numbers FROM awards WHERE award_date IN :award_dates"
+).bindparams(bindparam('award_dates', expanding=True))
+AWARD_DATA_VERSION_SQL = text("SELECT version, updated_at FROM award_data_version WHERE id = 1")
+
+
+class AppJSONResponse(JSONResponse):
+    # 與 Flask 的 jsonify 相同的編碼 (見 serializers.py)，結尾加上換行
+    def render(self, content):
+        return dumps_bytes(content) + b"\n"
+
+
+def _database_busy():
+    return AppJSONResponse({"message": "資料庫連線忙碌中，請稍後再試"}, status_code=503)
+
+
+# --- 對獎器載入 ---
+
+async def _fetch_award_matchers(award_dates):
+    generation = award_matcher_cache.generation
+    async with engine.connect() as connection:
+        rows = (await connection.execute(AWARD_ROWS_SQL, {"award_dates": list(award_dates)})).all()
+    matchers = compile_award_matchers(rows)
+    for award_date, matcher in matchers.items():
+        award_matcher_cache.put(award_date, matcher, generation)
+    return matchers
+
+
+def _forget_matcher_load(award_dates, task):
+    for award_date in award_dates:
+        if _matcher_loads.get(award_date) is task:
+            del _matcher_loads[award_date]
+
+
+async def _load_award_matchers(award_dates):
+    """
+    取得多個開獎日期的對獎器，回傳 {award_date: AwardMatcher}；與 app._load_award_matchers 相同，
+    但快取未命中時同一日期只會有一個進行中的查詢，其他請求等待同一個結果。
+    停用快取 (AWARD_MATCHER_CACHE_SIZE=0) 時每個請求都會查詢並編譯。
+    """
+    matchers = {}
+    missing_dates = []
+    for award_date in award_dates:
+        matcher = award_matcher_cache.get(award_date)
+        if matcher is None:
+            missing_dates.append(award_date)
+        else:
+            matchers[award_date] = matcher
+    if not missing_dates:
+        return matchers
+
+    pending_dates = [award_date for award_date in missing_dates if award_date not in _matcher_loads]
+    if pending_dates:
+        task = asyncio.ensure_future(_fetch_award_matchers(pending_dates))
+        for award_date in pending_dates:
+            _matcher_loads[award_date] = task
+        task.add_done_callback(lambda done, dates=pending_dates: _forget_matcher_load(dates, done))
+
+    tasks = {_matcher_loads[award_date] for award_date in missing_dates}
+    # shield：發出請求的用戶端中斷時，其他等待同一個查詢的請求不受影響
+    for loaded in await asyncio.shield(asyncio.gather(*tasks)):
+        for award_date in missing_dates:
+            if award_date in loaded:
+                matchers[award_date] = loaded[award_date]
+    return matchers
+
+
+def _snapshot_matchers(award_dates):
+    if draw_snapshot_reader is None:
+        return {}
+    latest_version = award_data_version_cache.get()
+    return draw_snapshot_reader.matchers(award_dates, min_version=latest_version[0] if latest_version else None)
+
+
+async def _get_award_data_version():
+    if award_change_listening:
+        cached = award_data_version_cache.get()
+        if cached is not None:
+            return cached
+    async with engine.connect() as connection:
+        row = (await connection.execute(AWARD_DATA_VERSION_SQL)).first()
+    if not row:
+        return 0, None
+    if award_change_listening:
+        award_data_version_cache.offer(row.version, row.updated_at)
+    return row.version, row.updated_at
+
+
+# --- 路由 ---
+
+async def health_check(request):
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        return AppJSONResponse({"status": "ok", "database": "connected"})
+    except Exception as e:
+        return AppJSONResponse({"status": "error", "database": "disconnected", "details": str(e)}, status_code=500)
+
+
+async def check_invoice(request):
+    """
+    檢核發票是否中獎，請求與回應格式與同步版本的 POST /check_invoice 相同。
+    """
+    try:
+        data = loads(await request.body())
+    except ValueError:
+        data = None
+    if not data:
+        return AppJSONResponse({"message": INVALID_JSON_MESSAGE}, status_code=400)
+
+    invoice_number, check_date, error_message = parse_check_item(data)
+    if error_message:
+        return AppJSONResponse({"message": error_message}, status_code=400)
+
+    try:
+        matcher = _snapshot_matchers([check_date]).get(check_date)
+        if matcher is None:
+            matcher = (await _load_award_matchers([check_date])).get(check_date)
+        if matcher is None:
+            return AppJSONResponse({"message": no_award_data_message(check_date)}, status_code=404)
+        return AppJSONResponse(build_check_result(invoice_number, check_date, matcher.match(invoice_number)))
+    except PoolTimeoutError:
+        return _database_busy()
+    except Exception as e:
+        logger.exception("對獎過程中發生錯誤: %s", e)
+        return AppJSONResponse({"message": "檢核發票失敗，發生內部錯誤", "error": str(e)}, status_code=500)
+
+
+def _awards_statement(cursor, limit):
+    sql = "SELECT id, prize_name, winning_numbers, award_date FROM awards"
+    params = {}
+    if cursor:
+        sql += " WHERE (award_date, id) < (:cursor_date, :cursor_id)"
+        params.update(cursor_date=cursor[0], cursor_id=cursor[1])
+    sql += " ORDER BY award_date DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return text(sql), params
+
+
+async def _stream_awards(stmt, params, stream_format):
+    async with engine.connect() as connection:
+        result = await connection.stream(stmt.execution_options(yield_per=STREAM_YIELD_PER), params)
+        if stream_format == "ndjson":
+            async for partition in result.partitions():
+                yield "".join(dumps(award_to_dict(row)) + "\n" for row in partition)
+            return
+
+        yield '{"awards": ['
+        first = True
+        async for partition in result.partitions():
+            chunk = ",".join(dumps(award_to_dict(row)) for row in partition)
+            yield chunk if first else "," + chunk
+            first = False
+        yield "]}"
+
+
+async def get_all_awards(request):
+    """
+    取得獎項列表，查詢參數、分頁游標與 ETag / Last-Modified / Cache-Control 都與同步版本的 GET /awards 相同。
+    """
+    try:
+        stream_format, limit, cursor = parse_list_args(request.query_params)
+    except ValueError as e:
+        return AppJSONResponse({"message": str(e)}, status_code=400)
+
+    try:
+        version, updated_at = await _get_award_data_version()
+    except PoolTimeoutError:
+        return _database_busy()
+    etag = awards_etag(version, request.scope["query_string"])
+    last_modified = updated_at.replace(microsecond=0) if updated_at else None
+    cache_headers = {"ETag": quote_etag(etag), "Cache-Control": AWARDS_CACHE_CONTROL}
+    if last_modified:
+        cache_headers["Last-Modified"] = http_date(last_modified)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        not_modified = parse_etags(if_none_match).contains(etag)
+    else:
+        if_modified_since = parse_date(request.headers.get("if-modified-since"))
+        not_modified = bool(last_modified and if_modified_since and if_modified_since >= last_modified)
+    if not_modified:
+        return Response(status_code=304, headers=cache_headers)
+
+    if stream_format:
+        stmt, params = _awards_statement(cursor, limit)
+        return StreamingResponse(
+            _stream_awards(stmt, params, stream_format),
+            media_type=STREAM_MIMETYPES[stream_format], headers=cache_headers
+        )
+
+    # 多取一筆用來判斷是否還有下一頁
+    stmt, params = _awards_statement(cursor, limit + 1)
+    try:
+        async with engine.connect() as connection:
+            rows = (await connection.execute(stmt, params)).all()
+    except PoolTimeoutError:
+        return _database_busy()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].award_date, rows[-1].id)
+    return AppJSONResponse(
+        {"awards": [award_to_dict(row) for row in rows], "next_cursor": next_cursor},
+        headers=cache_headers
+    )
+
+
+# --- 開獎資料異動通知 ---
+
+def _run_in_background(coroutine):
+    task = asyncio.ensure_future(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _prewarm_award_matchers(award_dates):
+    try:
+        await _load_award_matchers(award_dates)
+    except Exception as e:
+        logger.warning("預先載入對獎器失敗: %s", e)
+
+
+def _handle_award_change(connection, pid, channel, payload):
+    try:
+        award_dates, version, updated_at = parse_award_change_payload(payload)
+    except ValueError as e:
+        logger.warning("處理開獎資料異動通知失敗: %s", e)
+        return
+    award_matcher_cache.invalidate(award_dates)
+    award_data_version_cache.offer(version, updated_at)
+    if AWARD_CHANGE_PREWARM and award_matcher_cache.maxsize > 0:
+        _run_in_background(_prewarm_award_matchers(award_dates))
+    logger.info("--- 收到開獎資料異動通知：版本 %s，開獎日期 %s ---",
+                version, ", ".join(award_date.isoformat() for award_date in award_dates))
+
+
+async def _listen_award_changes():
+    """
+    以專用的 asyncpg 連線 LISTEN 開獎資料異動頻道，中斷時重新連線 (與 award_listener.AwardChangeListener 相同)。
+    """
+    global award_change_listening
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(_listen_dsn)
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda _: closed.set())
+            await connection.add_listener(AWARD_CHANGES_CHANNEL, _handle_award_change)
+            # 連線中斷期間可能漏接通知，讓所有程序內快取失效
+            award_matcher_cache.invalidate()
+            award_data_version_cache.reset()
+            award_change_listening = True
+            logger.info("--- 開始監聽開獎資料異動通知 (頻道 %s) ---", AWARD_CHANGES_CHANNEL)
+            await closed.wait()
+            logger.warning("開獎資料異動通知連線已中斷")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("開獎資料異動通知監聽中斷，%s 秒後重新連線。錯誤: %s", AWARD_LISTENER_RETRY_DELAY, e)
+        finally:
+            award_change_listening = False
+            if connection is not None and not connection.is_closed():
+                connection.terminate()
+        await asyncio.sleep(AWARD_LISTENER_RETRY_DELAY)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    listener = asyncio.ensure_future(_listen_award_changes())
+    try:
+        yield
+    finally:
+        listener.cancel()
+        try:
+            await listener
+        except asyncio.CancelledError:
+            pass
+        await engine.dispose()
+
+
+app = Starlette(
+    routes=[
+        Route('/health', health_check, methods=['GET']),
+        Route('/check_invoice', check_invoice, methods=['POST']),
+        Route('/awards', get_all_awards, methods=['GET']),
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,138 @@
+# award_listener.py
+"""
+以 PostgreSQL LISTEN/NOTIFY 接收開獎資料異動通知。
+
+寫入開獎號碼的程序 (排程器、回補指令) 在同一個交易中發出 pg_notify，
+交易提交後每個 web worker 的監聽執行緒會在毫秒內收到異動的開獎日期與新的資料版本號，
+讓程序內快取不需在每個請求都查詢資料庫也能保持最新。
+連線中斷期間可能漏接通知，因此每次 (重新) 連線後都會呼叫 on_reconnect 讓快取整個失效。
+"""
+import json
+import logging
+import re
+import select
+import threading
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+_CHANNEL_PATTERN = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+def build_award_change_payload(award_dates, version, updated_at):
+    """
+    組成異動通知的 JSON 內容 (pg_notify 的 payload 上限約 8000 bytes)。
+    """
+    return json.dumps({
+        "award_dates": sorted({award_date.isoformat() for award_date in award_dates}),
+        "version": version,
+        "updated_at": updated_at.isoformat() if updated_at else None
+    })
+
+
+def parse_award_change_payload(payload):
+    """
+    解析異動通知，回傳 (開獎日期列表, 版本號, 最後寫入時間)；格式不正確時拋出 ValueError。
+    """
+    try:
+        data = json.loads(payload)
+        award_dates = [date.fromisoformat(value) for value in data["award_dates"]]
+        updated_at = datetime.fromisoformat(data["updated_at"]) if data.get("updated_at") else None
+        return award_dates, data.get("version"), updated_at
+    except (TypeError, KeyError, ValueError) as e:
+        raise ValueError(f"無效的開獎資料異動通知: {payload!r} ({e})")
+
+
+class LatestVersion:
+    """
+    程序內保存的最新 (版本號, 最後寫入時間)；只會往較新的版本更新。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = None
+
+    def get(self):
+        return self._value
+
+    def offer(self, version, updated_at):
+        if version is None:
+            return
+        with self._lock:
+            if self._value is None or version > self._value[0]:
+                self._value = (version, updated_at)
+
+    def reset(self):
+        with self._lock:
+            self._value = None
+
+
+class AwardChangeListener:
+    """
+    在背景執行緒中 LISTEN 指定頻道，收到通知時以 (開獎日期列表, 版本號, 最後寫入時間) 呼叫 on_change。
+    connect 為回傳 psycopg2 連線的函數，連線會切換為 autocommit 並由監聽執行緒獨佔。
+    """
+
+    def __init__(self, connect, channel, on_change, on_reconnect=None, poll_timeout=5.0, retry_delay=5.0):
+        if not _CHANNEL_PATTERN.match(channel):
+            raise ValueError(f"無效的通知頻道名稱: {channel}")
+        self._connect = connect
+        self.channel = channel
+        self._on_change = on_change
+        self._on_reconnect = on_reconnect
+        self._poll_timeout = poll_timeout
+        self._retry_delay = retry_delay
+        self._stop_event = threading.Event()
+        self._thread = None
+        # 目前是否正在監聽；中斷期間快取不可依賴通知保持最新
+        self.listening = False
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="award-change-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            connection = None
+            try:
+                connection = self._connect()
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                self.listening = True
+                logger.info("--- 開始監聽開獎資料異動通知 (頻道 %s) ---", self.channel)
+                if self._on_reconnect:
+                    self._on_reconnect()
+                self._listen(connection)
+            except Exception as e:
+                logger.warning("開獎資料異動通知監聽中斷，%s 秒後重新連線。錯誤: %s", self._retry_delay, e)
+            finally:
+                self.listening = False
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            self._stop_event.wait(self._retry_delay)
+
+    def _listen(self, connection):
+        while not self._stop_event.is_set():
+            if select.select([connection], [], [], self._poll_timeout) == ([], [], []):
+                continue
+            connection.poll()
+            while connection.notifies:
+                notify = connection.notifies.pop(0)
+                self._dispatch(notify.payload)
+
+    def _dispatch(self, payload):
+        try:
+            award_dates, version, updated_at = parse_award_change_payload(payload)
+            self._on_change(award_dates, version, updated_at)
+        except Exception as e:
+            logger.exception("處理開獎資料異動通知失敗: %s", e)
@@ -0,0 +1,224 @@
+# award_matcher.py
+"""
+統一發票對獎規則與預先編譯的對獎器。
+
+每個開獎日期的獎項資料只需編譯一次：
+特別獎、特獎、頭獎編譯成「完整號碼 -> 獎項」的雜湊表；
+二獎到增開六獎依比對碼數編譯成「末 N 碼 -> 獎項」的雜湊表。
+單次對獎只需要幾次雜湊查詢，不需重新排序或切割號碼字串。
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+# 獎項等級，數字越小獎金越高，比對時由高至低
+PRIZE_ORDER = {
+    "特別獎": 1,
+    "特獎": 2,
+    "頭獎": 3,
+    "二獎": 4,
+    "三獎": 5,
+    "四獎": 6,
+    "五獎": 7,
+    "六獎": 8,
+    "增開六獎": 9 # 增開六獎放在最後，因為獎金最低且為額外增開
+}
+
+# 需要 8 碼完全相同才中獎的獎項
+EXACT_MATCH_PRIZES = ("特別獎", "特獎", "頭獎")
+
+# 使用頭獎號碼末幾碼比對的獎項與其比對碼數
+SUFFIX_MATCH_PRIZES = {
+    "二獎": 7,
+    "三獎": 6,
+    "四獎": 5,
+    "五獎": 4,
+    "六獎": 3,
+    "增開六獎": 3
+}
+
+# 各獎項的比對碼數 (完全比對的獎項為 8 碼)
+PRIZE_MATCH_LENGTHS = {
+    **{prize_name: 8 for prize_name in EXACT_MATCH_PRIZES},
+    **SUFFIX_MATCH_PRIZES
+}
+
+HEAD_PRIZE_NAME = "頭獎"
+
+_SUFFIX_LENGTH_LABELS = {7: "七", 6: "六", 5: "五", 4: "四", 3: "三"}
+
+# 對獎結果：中獎獎項名稱、獎項 ID、該獎項的中獎號碼字串，以及回傳給使用者的訊息
+AwardMatch = namedtuple('AwardMatch', ['prize_name', 'award_id', 'winning_numbers', 'message'])
+
+
+def build_award_match(prize_name, award_id, winning_numbers, winning_number):
+    """
+    依獎項比對碼數組成 AwardMatch，winning_number 為比對到的 8 碼中獎號碼。
+    """
+    match_length = PRIZE_MATCH_LENGTHS[prize_name]
+    if match_length == 8:
+        message = f"恭喜您，中了 {prize_name}！號碼: {winning_number}"
+    else:
+        message = f"恭喜您，中了 {prize_name}！號碼後{_SUFFIX_LENGTH_LABELS[match_length]}碼: {winning_number[-match_length:]}"
+    return AwardMatch(prize_name, award_id, winning_numbers, message)
+
+
+def split_winning_numbers(winning_numbers):
+    """
+    將以逗號分隔的中獎號碼字串切割成號碼列表。
+    """
+    return [n.strip() for n in winning_numbers.split(',') if n.strip()]
+
+
+class AwardMatcher:
+    """
+    單一開獎日期的預先編譯對獎器。
+    """
+    __slots__ = ('award_date', '_exact', '_suffix_rules')
+
+    def __init__(self, award_date, award_rows):
+        """
+        award_rows 為 (award_id, prize_name, winning_numbers) 序列，
+        winning_numbers 為資料庫中以逗號分隔的號碼字串。
+        """
+        self.award_date = award_date
+        ordered_rows = sorted(
+            (row for row in award_rows if row[1] in PRIZE_ORDER),
+            key=lambda row: PRIZE_ORDER[row[1]]
+        )
+
+        # 高獎項先寫入，相同號碼不會被低獎項覆蓋
+        self._exact = {}
+        head_prize_numbers = []
+        for award_id, prize_name, winning_numbers in ordered_rows:
+            if prize_name not in EXACT_MATCH_PRIZES:
+                continue
+            for number in split_winning_numbers(winning_numbers):
+                if number not in self._exact:
+                    self._exact[number] = build_award_match(prize_name, award_id, winning_numbers, number)
+                if prize_name == HEAD_PRIZE_NAME:
+                    head_prize_numbers.append(number)
+
+        # 二獎到增開六獎都以頭獎號碼的末幾碼比對
+        self._suffix_rules = []
+        for award_id, prize_name, winning_numbers in ordered_rows:
+            suffix_length = SUFFIX_MATCH_PRIZES.get(prize_name)
+            if suffix_length is None:
+                continue
+            table = {}
+            for head_number in head_prize_numbers:
+                suffix = head_number[-suffix_length:]
+                if suffix not in table:
+                    table[suffix] = build_award_match(prize_name, award_id, winning_numbers, head_number)
+            if table:
+                self._suffix_rules.append((suffix_length, table))
+
+    def match(self, invoice_number):
+        """
+        比對已清理過的 8 碼發票號碼，回傳最高獎項的 AwardMatch；未中獎回傳 None。
+        """
+        hit = self._exact.get(invoice_number)
+        if hit is not None:
+            return hit
+        for suffix_length, table in self._suffix_rules:
+            hit = table.get(invoice_number[-suffix_length:])
+            if hit is not None:
+                return hit
+        return None
+
+
+def compile_award_matchers(rows):
+    """
+    將 (award_date, award_id, prize_name, winning_numbers) 資料列依開獎日期分組並編譯，
+    回傳 {award_date: AwardMatcher}。
+    """
+    rows_by_date = {}
+    for award_date, award_id, prize_name, winning_numbers in rows:
+        rows_by_date.setdefault(award_date, []).append((award_id, prize_name, winning_numbers))
+    return {award_date: AwardMatcher(award_date, award_rows) for award_date, award_rows in rows_by_date.items()}
+
+
+# 前端離線對獎所需的規則 (GET /draw_bundle)，與 AwardMatcher 的比對順序相同：
+# 依 prize_order 由高至低逐一比對，8 碼獎項比對該獎項的號碼，其餘獎項比對 suffix_source (頭獎) 號碼的末幾碼
+DRAW_BUNDLE_RULES = {
+    "prize_order": sorted(PRIZE_ORDER, key=PRIZE_ORDER.get),
+    "match_lengths": PRIZE_MATCH_LENGTHS,
+    "suffix_source": HEAD_PRIZE_NAME
+}
+
+
+def compile_draw_bundle(rows):
+    """
+    將 (award_date, prize_name, winning_numbers) 資料列整理成前端對獎用的精簡格式，
+    回傳 {"YYYY-MM-DD": {"prizes": [該期有的獎項], "numbers": {8 碼獎項: [號碼]}}}。
+    末幾碼比對的獎項號碼都來自頭獎，不重複輸出。
+    """
+    draws = {}
+    for award_date, prize_name, winning_numbers in rows:
+        if prize_name not in PRIZE_ORDER:
+            continue
+        draw = draws.setdefault(award_date.isoformat(), {"prizes": [], "numbers": {}})
+        draw["prizes"].append(prize_name)
+        if prize_name in EXACT_MATCH_PRIZES:
+            draw["numbers"][prize_name] = split_winning_numbers(winning_numbers)
+    for draw in draws.values():
+        draw["prizes"].sort(key=PRIZE_ORDER.get)
+    return draws
+
+
+class AwardMatcherCache:
+    """
+    以開獎日期為鍵、容量有限 (LRU) 的程序內對獎器快取。
+    maxsize 為 0 時停用快取。
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # 每次失效都會遞增，用來丟棄失效前就開始載入的舊資料
+        self._generation = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, award_date):
+        with self._lock:
+            matcher = self._data.get(award_date)
+            if matcher is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(award_date)
+            self.hits += 1
+            return matcher
+
+    def put(self, award_date, matcher, generation=None):
+        """
+        放入快取。若提供 generation 且快取在載入期間已失效，則不寫入。
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[award_date] = matcher
+            self._data.move_to_end(award_date)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, award_dates=None):
+        """
+        讓指定開獎日期 (未指定時為全部) 的快取失效。
+        """
+        with self._lock:
+            self._generation += 1
+            if award_dates is None:
+                self._data.clear()
+                return
+            for award_date in award_dates:
+                self._data.pop(award_date, None)
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,119 @@
+# award_page_parser.py
+"""
+財政部開獎網頁解析。
+
+只擷取開獎期別 (帶 etw-on class 的 <a> 的 title) 與獎項表格
+(headers="th01" 的獎項名稱 <td> 及其後的號碼 <td>)，不涉及資料庫。
+
+解析方式依序嘗試：
+- lxml：安裝 lxml 時以 XPath 直接定位所需節點 (最快)
+- strainer：BeautifulSoup + SoupStrainer，只為 <a> 與 <tr> 建立節點
+- html.parser：完整建立 BeautifulSoup 樹 (原本的作法)
+快速路徑找不到期別或獎項時，會自動改用完整解析，避免網頁結構細節差異造成漏抓。
+"""
+from collections import namedtuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+except ImportError: # lxml 為選用套件，未安裝時使用 SoupStrainer 路徑
+    lxml = None
+
+# 需要從網頁讀取號碼的獎項；其餘獎項 (二獎~六獎、增開六獎) 以頭獎號碼比對，網頁上只有說明文字
+NUMBERED_PRIZES = ("特別獎", "特獎", "頭獎")
+
+PERIOD_TITLE_SUFFIX = "中獎號碼單"
+
+BACKENDS = ("lxml", "strainer", "html.parser")
+
+# 解析結果：period_text 為期別文字 (例如 "113年05-06月")，
+# prizes 為依網頁順序排列的 (獎項名稱, 號碼列表)；不需讀取號碼的獎項號碼列表為空
+AwardPage = namedtuple('AwardPage', ['period_text', 'prizes'])
+
+_AWARD_PAGE_STRAINER = SoupStrainer(["a", "tr"])
+
+# 相當於 CSS 的 .etw-on / .text-center / .etw-tbiggest
+_PERIOD_XPATH = "//a[contains(concat(' ', normalize-space(@class), ' '), ' etw-on ')]"
+_PRIZE_NAME_XPATH = "//td[@headers='th01'][contains(concat(' ', normalize-space(@class), ' '), ' text-center ')]"
+_NUMBER_XPATH = ".//*[contains(concat(' ', normalize-space(@class), ' '), ' etw-tbiggest ')]"
+
+
+def available_backends():
+    """
+    回傳目前環境可用的解析方式。
+    """
+    return tuple(backend for backend in BACKENDS if backend != "lxml" or lxml is not None)
+
+
+def _period_text_from_title(title):
+    return (title or '').replace(PERIOD_TITLE_SUFFIX, '').strip()
+
+
+def _parse_with_lxml(html_content):
+    tree = lxml.html.fromstring(html_content)
+    period_elements = tree.xpath(_PERIOD_XPATH)
+    period_text = _period_text_from_title(period_elements[0].get('title')) if period_elements else ''
+
+    prizes = []
+    for prize_name_td in tree.xpath(_PRIZE_NAME_XPATH):
+        prize_name = ''.join(text.strip() for text in prize_name_td.itertext())
+        numbers = []
+        if prize_name in NUMBERED_PRIZES:
+            numbers_tds = prize_name_td.xpath("following-sibling::td[1]")
+            if numbers_tds:
+                for elem in numbers_tds[0].xpath(_NUMBER_XPATH):
+                    number = ''.join(text.strip() for text in elem.itertext())
+                    if number:
+                        numbers.append(number)
+        prizes.append((prize_name, numbers))
+    return AwardPage(period_text, prizes)
+
+
+def _parse_with_soup(soup):
+    period_element = soup.find('a', class_='etw-on')
+    period_text = _period_text_from_title(period_element.get('title')) if period_element else ''
+
+    prizes = []
+    for prize_name_td in soup.find_all('td', headers='th01', class_='text-center'):
+        prize_name = prize_name_td.get_text(strip=True)
+        numbers = []
+        if prize_name in NUMBERED_PRIZES:
+            numbers_td = prize_name_td.find_next_sibling('td')
+            if numbers_td:
+                for elem in numbers_td.find_all(class_='etw-tbiggest'):
+                    number = elem.get_text(strip=True)
+                    if number:
+                        numbers.append(number)
+        prizes.append((prize_name, numbers))
+    return AwardPage(period_text, prizes)
+
+
+def parse_award_page_with(html_content, backend):
+    """
+    以指定的解析方式解析網頁，不做任何自動改用。
+    """
+    if backend == "lxml":
+        if lxml is None:
+            raise ValueError("未安裝 lxml，無法使用 lxml 解析")
+        return _parse_with_lxml(html_content)
+    if backend == "strainer":
+        return _parse_with_soup(BeautifulSoup(html_content, 'html.parser', parse_only=_AWARD_PAGE_STRAINER))
+    if backend == "html.parser":
+        return _parse_with_soup(BeautifulSoup(html_content, 'html.parser'))
+    raise ValueError(f"不支援的解析方式: {backend}")
+
+
+def parse_award_page(html_content):
+    """
+    解析開獎網頁，回傳 AwardPage。
+    先走快速路徑 (lxml 或 SoupStrainer)，找不到期別或獎項時改用完整的 html.parser 解析。
+    """
+    fast_backend = "lxml" if lxml is not None else "strainer"
+    try:
+        page = parse_award_page_with(html_content, fast_backend)
+        if page.period_text and page.prizes:
+            return page
+    except Exception:
+        pass # 快速路徑解析失敗時同樣改用完整解析
+    return parse_award_page_with(html_content, "html.parser")
@@ -0,0 +1,103 @@
+# award_scraper.py
+"""
+財政部開獎網頁的 HTTP 抓取。
+
+以單一 requests.Session 重複使用連線，搭配逾時與重試/退避策略；
+並以 If-None-Match / If-Modified-Since 條件式請求與網頁內容的 SHA-256 雜湊判斷網頁是否有變更，
+網頁沒有變更時呼叫端可以完全略過解析與資料庫交易。
+回補歷史期別時則以有上限的執行緒池並行抓取多個網頁。
+"""
+import hashlib
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 遇到這些狀態碼時依退避策略重試
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# 抓取結果：
+# not_modified 為 True 表示伺服器回應 304，此時 text 與 content_hash 皆為 None；
+# elapsed 為請求 (含重試) 到讀完內容的秒數
+PageFetch = namedtuple('PageFetch', ['not_modified', 'text', 'content_hash', 'etag', 'last_modified', 'elapsed'])
+
+
+def build_session(retries=3, backoff_factor=1.0, pool_maxsize=4):
+    """
+    建立帶有重試/退避策略與連線池的 requests.Session。
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": "invoice-lottery-checker/1.0"})
+    return session
+
+
+def content_hash(content):
+    """
+    計算網頁原始內容 (bytes) 的 SHA-256 雜湊。
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+def fetch_page(session, url, timeout, etag=None, last_modified=None):
+    """
+    以條件式請求抓取網頁，回傳 PageFetch。
+    etag / last_modified 為上次成功抓取時伺服器回傳的值；請求失敗時拋出 requests.exceptions.RequestException。
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    started = time.perf_counter()
+    response = session.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return PageFetch(
+            True, None, None,
+            response.headers.get("ETag", etag),
+            response.headers.get("Last-Modified", last_modified),
+            time.perf_counter() - started
+        )
+
+    response.raise_for_status() # 如果請求失敗，拋出 HTTPError
+    response.encoding = 'utf-8' # 強制設定編碼為 UTF-8
+    return PageFetch(
+        False,
+        response.text,
+        content_hash(response.content),
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+        time.perf_counter() - started
+    )
+
+
+def fetch_pages(session, urls, timeout, max_workers):
+    """
+    以最多 max_workers 個執行緒並行抓取多個網頁 (不帶條件式標頭)，
+    依完成順序產生 (url, PageFetch 或 None, RequestException 或 None)。
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_page, session, url, timeout): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                yield url, future.result(), None
+            except requests.exceptions.RequestException as e:
+                yield url, None, e
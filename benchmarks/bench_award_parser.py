@@ -0,0 +1,121 @@
+# benchmarks/bench_award_parser.py
+"""
+開獎網頁解析效能比較。
+
+對一組儲存的網頁 (預設為 benchmarks/fixtures/*.html) 以每一種解析方式
+(lxml、SoupStrainer、完整 html.parser) 重複解析，輸出每秒解析頁數與記憶體用量。
+每種解析方式在獨立的子程序中執行，記憶體數據彼此不受影響：
+- tracemalloc_peak_kb：Python 物件配置的峰值 (lxml 的 C 函式庫配置不在其中)
+- maxrss_delta_kb：解析期間程序常駐記憶體峰值的增加量 (含 lxml 的 C 配置)
+
+使用方式:
+    python benchmarks/bench_award_parser.py --repeat 200
+    python benchmarks/bench_award_parser.py --corpus /path/to/saved/pages --json
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_corpus(corpus):
+    paths = sorted(glob.glob(os.path.join(corpus, "*.html"))) if os.path.isdir(corpus) else [corpus]
+    if not paths:
+        sys.exit(f"{corpus} 中沒有任何 .html 網頁")
+    pages = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+def run_backend(backend, pages, repeat):
+    """
+    在目前程序中以指定解析方式重複解析整個網頁集合，回傳統計 dict。
+    """
+    from award_page_parser import parse_award_page_with
+
+    # 先解析一輪暖機，並確認每頁都能解析出期別與獎項
+    for html in pages:
+        page = parse_award_page_with(html, backend)
+        if not page.period_text or not page.prizes:
+            raise RuntimeError(f"{backend} 無法解析出期別或獎項")
+
+    maxrss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            parse_award_page_with(html, backend)
+    elapsed = time.perf_counter() - started
+    maxrss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # tracemalloc 會拖慢解析，記憶體峰值另外以單輪解析量測
+    tracemalloc.start()
+    for html in pages:
+        parse_award_page_with(html, backend)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    parsed = repeat * len(pages)
+    return {
+        "backend": backend,
+        "pages": parsed,
+        "seconds": round(elapsed, 4),
+        "pages_per_sec": round(parsed / elapsed, 1) if elapsed else None,
+        "tracemalloc_peak_kb": round(peak / 1024, 1),
+        "maxrss_delta_kb": maxrss_after - maxrss_before
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較開獎網頁各解析方式的速度與記憶體用量")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="網頁目錄或單一網頁檔案")
+    parser.add_argument("--repeat", type=int, default=100, help="整個網頁集合重複解析的次數")
+    parser.add_argument("--backend", help="只測試指定的解析方式 (供子程序使用)")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    pages = load_corpus(args.corpus)
+
+    if args.backend:
+        print(json.dumps(run_backend(args.backend, pages, args.repeat)))
+        return
+
+    from award_page_parser import BACKENDS, available_backends
+    results = []
+    for backend in BACKENDS:
+        if backend not in available_backends():
+            results.append({"backend": backend, "skipped": "未安裝"})
+            continue
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--corpus", args.corpus,
+             "--repeat", str(args.repeat), "--backend", backend],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps({"corpus_pages": len(pages), "repeat": args.repeat, "results": results}, ensure_ascii=False))
+        return
+
+    print(f"網頁數: {len(pages)}，重複 {args.repeat} 次")
+    print(f"{'backend':<12} {'pages/sec':>10} {'tracemalloc peak KB':>20} {'maxrss delta KB':>16}")
+    for result in results:
+        if "skipped" in result:
+            print(f"{result['backend']:<12} {'(' + result['skipped'] + ')':>10}")
+            continue
+        print(f"{result['backend']:<12} {result['pages_per_sec']:>10} "
+              f"{result['tracemalloc_peak_kb']:>20} {result['maxrss_delta_kb']:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_utils.py
+"""
+各效能測試腳本共用的計時與伺服器子程序工具。
+"""
+import socket
+import statistics
+import time
+import urllib.request
+
+
+def measure(name, call, arguments):
+    """
+    依序以每組參數呼叫 call，回傳每秒次數與延遲百分位數 (微秒)。
+    """
+    durations = []
+    started = time.perf_counter()
+    for args in arguments:
+        call_started = time.perf_counter()
+        call(*args)
+        durations.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    durations.sort()
+    return {
+        "name": name,
+        "calls": len(arguments),
+        "ops_per_sec": round(len(arguments) / elapsed, 1),
+        "p50_us": round(statistics.median(durations) * 1e6, 1),
+        "p99_us": round(durations[max(0, int(len(durations) * 0.99) - 1)] * 1e6, 1)
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_healthy(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + "/health", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} 在 {timeout} 秒內沒有通過健康檢查")
+
+
+def peak_rss_kb(pid):
+    """
+    讀取處理請求的程序 (gunicorn 為 worker 子程序) 的常駐記憶體峰值；只支援 Linux /proc，其他平台回傳 None。
+    """
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+        peaks = []
+        for worker_pid in children or [pid]:
+            with open(f"/proc/{worker_pid}/status") as f:
+                peaks.extend(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+        return max(peaks) if peaks else None
+    except OSError:
+        return None
@@ -0,0 +1,65 @@
+# benchmarks/compare_results.py
+"""
+比較兩次 run_suite.py 的輸出，列出每個項目吞吐量的變化；任何項目變慢超過門檻時以非零結束碼結束。
+
+吞吐量以 ops_per_sec (微基準、test client) 或 requests_per_sec (gunicorn) 比較，
+不同機器或資料集的結果不具可比性，會先印出警告。
+
+使用方式:
+    python benchmarks/compare_results.py results/before.json results/after.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+THROUGHPUT_KEYS = ("ops_per_sec", "requests_per_sec")
+
+
+def throughput(result):
+    for key in THROUGHPUT_KEYS:
+        if result.get(key) is not None:
+            return result[key]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較兩次效能測試套件的結果")
+    parser.add_argument("baseline", help="比較基準的結果 JSON")
+    parser.add_argument("candidate", help="新的結果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="吞吐量下降超過此比例視為退步 (預設 0.1)")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    if baseline["dataset"] != candidate["dataset"]:
+        print(f"警告: 資料集不同 ({baseline['dataset']} vs {candidate['dataset']})", file=sys.stderr)
+    if baseline["environment"].get("cpu_count") != candidate["environment"].get("cpu_count"):
+        print("警告: 兩次結果的 CPU 數不同，數據可能不具可比性", file=sys.stderr)
+
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    print(f"{'name':<45} {'baseline':>12} {'candidate':>12} {'change':>8}")
+    for result in candidate["results"]:
+        before = baseline_results.get(result["name"])
+        before_value = throughput(before) if before else None
+        after_value = throughput(result)
+        if not before_value or after_value is None:
+            print(f"{result['name']:<45} {'-':>12} {after_value!s:>12} {'new':>8}")
+            continue
+        change = after_value / before_value - 1
+        marker = ""
+        if change < -args.threshold:
+            regressions.append(result["name"])
+            marker = "  <-- 退步"
+        print(f"{result['name']:<45} {before_value:>12} {after_value:>12} {change:>+8.1%}{marker}")
+
+    if regressions:
+        print(f"{len(regressions)} 個項目吞吐量下降超過 {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# benchmarks/datasets.py
+"""
+效能測試使用的合成資料集。
+
+每個資料集是固定筆數的發票加上多年份的開獎資料，以 query_plans.seed (generate_series) 在資料庫內產生。
+大型資料集分批灌入並逐批提交，中斷後重新執行會從已灌入的筆數繼續；
+資料庫中的發票多於目標筆數時 (換成較小的資料集) 會清空後重新灌入。
+不同資料集建議使用各自的資料庫，切換時就不需要重新灌入。
+"""
+from query_plans import seed
+
+# 資料集名稱 -> 發票筆數
+DATASETS = {
+    "1k": 1_000,
+    "100k": 100_000,
+    "10m": 10_000_000,
+}
+
+# 每批灌入並提交的發票筆數
+SEED_BATCH_SIZE = 1_000_000
+
+
+def prepare_dataset(app_module, name, years):
+    """
+    確保資料庫內是指定的資料集 (需在 app context 中呼叫)，回傳一個有開獎資料的開獎日期。
+    """
+    invoice_count = DATASETS[name]
+    db = app_module.db
+    db.create_all()
+    current_count = db.session.execute(app_module.text("SELECT count(*) FROM invoices")).scalar()
+    db.session.rollback()
+
+    reseed = current_count > invoice_count
+    target = 0 if reseed else current_count
+    award_date = None
+    while award_date is None or target < invoice_count:
+        target = min(invoice_count, target + SEED_BATCH_SIZE)
+        award_date = seed(app_module, target, years, reseed)
+        reseed = False
+    return award_date
@@ -0,0 +1,154 @@
+# benchmarks/fixture_server.py
+"""
+財政部開獎網頁的本機替身伺服器。
+
+以儲存的網頁 (benchmarks/fixtures/*.html) 回應 GET /，並模擬正式網站的條件式請求行為：
+回傳 ETag 與 Last-Modified，收到相符的 If-None-Match / If-Modified-Since 時回應 304。
+路徑中含有 5 碼期別代碼 (例如 /ETW183W2_11305/) 時，回應 fixtures 目錄中的 award_page_<代碼>.html，
+找不到對應網頁時回應 404。
+搭配 INVOICE_WEB_URL 與 INVOICE_PERIOD_URL_TEMPLATE 環境變數即可在不連外網的情況下測試爬蟲與回補。
+
+使用方式:
+    python benchmarks/fixture_server.py --port 8765 benchmarks/fixtures/award_page_11305.html
+    INVOICE_WEB_URL=http://127.0.0.1:8765/ python app.py
+    curl -X POST http://127.0.0.1:5000/fetch_awards
+    INVOICE_PERIOD_URL_TEMPLATE='http://127.0.0.1:8765/ETW183W2_{period_code}/' \
+        flask --app app backfill-awards --start 113年05-06月 --end 113年07-08月
+
+    --no-validators   不回傳 ETag / Last-Modified，測試以內容雜湊判斷未變更的路徑
+    --fail-first N    前 N 個請求回應 503，測試重試與退避
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DEFAULT_FIXTURE = os.path.join(FIXTURES_DIR, "award_page_11305.html")
+
+PERIOD_CODE_PATTERN = re.compile(r'(\d{5})')
+
+
+def _load_page(path):
+    with open(path, "rb") as f:
+        body = f.read()
+    return body, '"' + hashlib.sha256(body).hexdigest()[:16] + '"', int(os.path.getmtime(path))
+
+
+class FixtureState:
+    """
+    替身伺服器目前提供的網頁與行為設定，可在執行中以 set_page() 換頁模擬開獎。
+    """
+
+    def __init__(self, path, validators=True, fail_first=0, corpus_dir=FIXTURES_DIR):
+        self.validators = validators
+        self.fail_remaining = fail_first
+        self.request_count = 0
+        self.corpus_dir = corpus_dir
+        self.lock = threading.Lock()
+        self.set_page(path)
+
+    def set_page(self, path):
+        page = _load_page(path)
+        with self.lock:
+            self.page = page
+
+    def page_for(self, request_path):
+        """
+        回傳 request_path 對應的 (內容, ETag, 修改時間)，找不到時回傳 None。
+        """
+        if request_path.split("?")[0] == "/":
+            return self.page
+        match = PERIOD_CODE_PATTERN.search(request_path)
+        if not match:
+            return None
+        path = os.path.join(self.corpus_dir, f"award_page_{match.group(1)}.html")
+        return _load_page(path) if os.path.exists(path) else None
+
+
+def make_handler(state):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with state.lock:
+                state.request_count += 1
+                if state.fail_remaining > 0:
+                    state.fail_remaining -= 1
+                    self.send_error(503, "fixture server: simulated failure")
+                    return
+                page = state.page_for(self.path)
+
+            if page is None:
+                self.send_error(404, "fixture server: no such page")
+                return
+            body, etag, mtime = page
+
+            if state.validators and self._not_modified(etag, mtime):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if state.validators:
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", formatdate(mtime, usegmt=True))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _not_modified(self, etag, mtime):
+            if_none_match = self.headers.get("If-None-Match")
+            if if_none_match is not None:
+                return etag in [tag.strip() for tag in if_none_match.split(",")]
+            if_modified_since = self.headers.get("If-Modified-Since")
+            if if_modified_since:
+                try:
+                    return int(parsedate_to_datetime(if_modified_since).timestamp()) >= mtime
+                except (TypeError, ValueError):
+                    return False
+            return False
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+def start_server(state, host="127.0.0.1", port=0):
+    """
+    在背景執行緒啟動替身伺服器，回傳 (server, 網址)；port 為 0 時自動選擇可用埠。
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="財政部開獎網頁的本機替身伺服器")
+    parser.add_argument("fixture", nargs="?", default=DEFAULT_FIXTURE, help="要提供的網頁檔案")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-validators", action="store_true", help="不回傳 ETag / Last-Modified")
+    parser.add_argument("--fail-first", type=int, default=0, help="前 N 個請求回應 503")
+    parser.add_argument("--corpus", default=FIXTURES_DIR, help="各期開獎網頁 (award_page_<期別代碼>.html) 所在目錄")
+    args = parser.parse_args()
+
+    state = FixtureState(args.fixture, validators=not args.no_validators, fail_first=args.fail_first,
+                         corpus_dir=args.corpus)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"提供 {args.fixture} 於 http://{args.host}:{args.port}/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# benchmarks/loadgen.py
+"""
+不需額外套件的 HTTP/1.1 壓力測試產生器。
+
+以 asyncio 在單一程序中開啟 concurrency 條 keep-alive 連線，每條連線不斷送出下一個請求、
+讀完回應後再送下一個 (封閉式負載)，統計每秒請求數、延遲百分位數與各狀態碼數量。
+請求內容事先組成 bytes，產生器本身的額外負擔很小，適合比較不同服務模式在高並行下的表現。
+
+使用方式:
+    python benchmarks/loadgen.py --url http://127.0.0.1:5000/check_invoice \
+        --body '{"invoice_number": "12345678", "invoice_date": "2024-03-25"}' --concurrency 500 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+def build_request(url, method="GET", body=None, headers=None):
+    """
+    組成一個原始 HTTP/1.1 請求 (bytes)；body 為 dict/list 時以 JSON 送出。
+    """
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}"]
+    payload = b""
+    if body is not None:
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        lines.append("Content-Type: application/json")
+        lines.append(f"Content-Length: {len(payload)}")
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("ascii") + payload
+
+
+async def _read_response(reader):
+    """
+    讀取一個回應，回傳 (狀態碼, 是否可沿用連線)。
+    """
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    status = int(status_line.split(" ", 2)[1])
+    headers = {}
+    for line in header_lines:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif status not in (204, 304):
+        await reader.read()
+        return status, False
+    return status, headers.get("connection", "").lower() != "close"
+
+
+async def _connection_loop(host, port, requests, offset, deadline, record):
+    reader = writer = None
+    index = offset
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            writer.write(requests[index % len(requests)])
+            index += 1
+            status, keep_alive = await _read_response(reader)
+            record(status, time.perf_counter() - started)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            record(type(e).__name__, None)
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url, requests, concurrency, duration, warmup=1.0):
+    """
+    以 concurrency 條連線輪流送出 requests (build_request 產生的 bytes 列表) duration 秒。
+    前 warmup 秒的結果不列入統計。回傳統計 dict。
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    statuses = Counter()
+    latencies = []
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+
+    def record(status, latency):
+        if time.perf_counter() < measure_from:
+            return
+        statuses[status] += 1
+        if latency is not None:
+            latencies.append(latency)
+
+    await asyncio.gather(*(
+        _connection_loop(host, port, requests, offset, deadline, record) for offset in range(concurrency)
+    ))
+
+    latencies.sort()
+    completed = len(latencies)
+
+    def percentile(fraction):
+        return round(latencies[min(completed - 1, int(completed * fraction))] * 1000, 2) if completed else None
+
+    return {
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "requests": completed,
+        "requests_per_sec": round(completed / duration, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2) if completed else None,
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(latencies[-1] * 1000, 2) if completed else None,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以大量 keep-alive 連線對單一網址施加負載")
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--method", default=None, help="預設有 --body 時為 POST，否則為 GET")
+    parser.add_argument("--body", help="JSON 請求內容")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=1)
+    args = parser.parse_args()
+
+    body = json.loads(args.body) if args.body else None
+    method = args.method or ("POST" if body is not None else "GET")
+    request = build_request(args.url, method, body)
+    print(json.dumps(asyncio.run(run_load(args.url, [request], args.concurrency, args.duration, args.warmup))))
+
+
+if __name__ == "__main__":
+    main()
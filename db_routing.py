@@ -0,0 +1,141 @@
+# db_routing.py
+"""
+資料庫連線池設定與唯讀副本 (read replica) 路由。
+
+- engine_options_from_env：從環境變數讀取連線池大小、溢出數、pre-ping、回收時間與 statement_timeout。
+- 設定 DATABASE_REPLICA_URL 時，以 read_replica 標記的唯讀路由改由副本查詢；
+  副本無法連線時改用主資料庫，並在 REPLICA_RETRY_INTERVAL 秒內不再嘗試副本。
+- pool_status：回傳連線池目前的使用狀況 (供 /health 與監控指標使用)。
+
+副本的資料可能落後主資料庫，會被放進程序內快取的查詢 (例如對獎器快取) 應以 use_primary 改回主資料庫，
+避免落後的資料在收到異動通知後又被快取起來。
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_KEY = "replica"
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+# 副本連線失敗後，改用主資料庫的秒數
+REPLICA_RETRY_INTERVAL = float(os.getenv('REPLICA_RETRY_INTERVAL', '30'))
+
+
+def _env_bool(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+def engine_options_from_env():
+    """
+    從環境變數產生 create_engine 的連線池參數 (主資料庫與副本共用)：
+    - DB_POOL_SIZE / DB_MAX_OVERFLOW：常駐連線數與尖峰時可額外建立的連線數
+    - DB_POOL_TIMEOUT：連線池已滿時等待連線的秒數
+    - DB_POOL_PRE_PING：取得連線時先確認連線仍可用 (資料庫重啟或切換副本後不會拿到斷線)
+    - DB_POOL_RECYCLE：連線使用超過此秒數後重新建立，-1 為不回收
+    - DB_STATEMENT_TIMEOUT_MS：單一 SQL 的執行時間上限 (毫秒)，0 為不限制；
+      排程器的對帳與回補可能執行較久，建議只在 web 服務設定
+    """
+    options = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', 'false'),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '-1')),
+    }
+    statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+    if statement_timeout > 0:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+
+class ReplicaState:
+    """
+    記錄副本是否暫時無法使用 (各執行緒共用)。
+    """
+
+    def __init__(self, retry_interval):
+        self.retry_interval = retry_interval
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    def available(self):
+        return time.monotonic() >= self._down_until
+
+    def mark_down(self):
+        with self._lock:
+            self._down_until = time.monotonic() + self.retry_interval
+
+
+replica_state = ReplicaState(REPLICA_RETRY_INTERVAL)
+
+
+class RoutingSession(Session):
+    """
+    目前請求標記為使用副本時，所有查詢都改由副本執行；其餘情況與 Flask-SQLAlchemy 的 Session 相同。
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and g.get("db_use_replica"):
+            engine = self._db.engines.get(REPLICA_BIND_KEY)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(view):
+    """
+    將唯讀路由的查詢導向副本 (未設定副本時不做任何事)。
+    進入路由前先取得副本連線，連線失敗時改用主資料庫，請求仍會成功。
+    串流回應在 stream_with_context 中仍沿用同一個請求的設定。
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        db = current_app.extensions["sqlalchemy"]
+        engine = db.engines.get(REPLICA_BIND_KEY)
+        if engine is not None and replica_state.available():
+            try:
+                db.session.connection(bind_arguments={"bind": engine})
+                g.db_use_replica = True
+            except OperationalError as e:
+                db.session.rollback()
+                replica_state.mark_down()
+                logger.warning("無法連線至唯讀副本，%s 秒內改用主資料庫。錯誤: %s", REPLICA_RETRY_INTERVAL, e)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def use_primary():
+    """
+    在區塊內暫時改用主資料庫 (即使目前請求標記為使用副本)。
+    """
+    previous = g.get("db_use_replica", False)
+    g.db_use_replica = False
+    try:
+        yield
+    finally:
+        g.db_use_replica = previous
+
+
+def pool_status(engine):
+    """
+    回傳連線池的使用狀況；saturation 為使用中連線數 / 連線數上限 (pool_size + max_overflow)。
+    """
+    pool = engine.pool
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "capacity": capacity,
+        "checked_out": checked_out,
+        "overflow": max(pool.overflow(), 0),
+        "saturation": round(checked_out / capacity, 3) if capacity else None,
+    }
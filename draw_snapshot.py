@@ -0,0 +1,342 @@
+# draw_snapshot.py
+"""
+開獎資料的共用二進位快照。
+
+排程器將所有開獎日期的中獎號碼寫成一個精簡的二進位檔，web worker 以 mmap 唯讀開啟：
+所有 worker 共用作業系統的同一份分頁快取，不需各自在記憶體中保存與預熱開獎資料，
+對獎時也不需要任何資料庫往返。寫入時先寫暫存檔再以 os.replace 原子替換，
+讀取端偵測到檔案變更後整個切換到新的快照。
+
+檔案格式 (little-endian)：
+    檔頭      magic "IVDS"、格式版本、開獎資料版本號 (award_data_version)、產生時間、開獎日期數
+    目錄      每個開獎日期一筆 (日期序數, 區段位移, 區段長度)，依日期排序以二分搜尋
+    區段      每個開獎日期一個：
+              區段檔頭 (日期序數、獎項數、號碼數、各比對碼數的表格筆數)
+              獎項表   (獎項等級、比對碼數、獎項 ID、winning_numbers 字串位置)
+              號碼表   固定寬度的 8 碼 ASCII 號碼
+              比對表   依比對碼數 8、7、6、5、4、3 各一張，每筆為 (末 N 碼數值, 獎項索引, 號碼索引)，
+                       依 (數值, 獎項等級) 排序以二分搜尋
+              字串     各獎項原始的 winning_numbers (UTF-8)
+比對規則與 award_matcher.AwardMatcher 相同。
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import date
+
+from award_matcher import (
+    EXACT_MATCH_PRIZES, HEAD_PRIZE_NAME, PRIZE_MATCH_LENGTHS, PRIZE_ORDER,
+    build_award_match, split_winning_numbers
+)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IVDS"
+FORMAT_VERSION = 1
+
+# 比對表的順序：碼數越多的獎項越高，由長到短比對即可得到最高獎項
+MATCH_LENGTHS = (8, 7, 6, 5, 4, 3)
+
+_FILE_HEADER = struct.Struct('<4sHHQqI4x')
+_DIRECTORY_ENTRY = struct.Struct('<iII')
+_SECTION_HEADER = struct.Struct('<iBB6H')
+_PRIZE_ENTRY = struct.Struct('<BBHIII')
+_TABLE_ENTRY = struct.Struct('<IBB2x')
+_NUMBER_WIDTH = 8
+
+_PRIZE_NAMES_BY_RANK = {rank: prize_name for prize_name, rank in PRIZE_ORDER.items()}
+
+
+def _build_section(award_date, award_rows):
+    """
+    將單一開獎日期的 (award_id, prize_name, winning_numbers) 編譯成快照區段。
+    """
+    ordered_rows = sorted(
+        (row for row in award_rows if row[1] in PRIZE_ORDER),
+        key=lambda row: PRIZE_ORDER[row[1]]
+    )
+
+    numbers = []
+    number_indexes = {}
+
+    def number_index(number):
+        if number not in number_indexes:
+            number_indexes[number] = len(numbers)
+            numbers.append(number)
+        return number_indexes[number]
+
+    head_prize_numbers = [
+        number
+        for _, prize_name, winning_numbers in ordered_rows if prize_name == HEAD_PRIZE_NAME
+        for number in split_winning_numbers(winning_numbers)
+        if len(number) == _NUMBER_WIDTH and number.isdigit()
+    ]
+
+    prizes = []
+    tables = {match_length: {} for match_length in MATCH_LENGTHS}
+    for award_id, prize_name, winning_numbers in ordered_rows:
+        prize_slot = len(prizes)
+        match_length = PRIZE_MATCH_LENGTHS[prize_name]
+        prizes.append((PRIZE_ORDER[prize_name], match_length, award_id, winning_numbers.encode('utf-8')))
+        if prize_name in EXACT_MATCH_PRIZES:
+            candidates = [
+                number for number in split_winning_numbers(winning_numbers)
+                if len(number) == _NUMBER_WIDTH and number.isdigit()
+            ]
+        else:
+            # 二獎到增開六獎都以頭獎號碼的末幾碼比對
+            candidates = head_prize_numbers
+        for number in candidates:
+            # 同一個末 N 碼只保留最高獎項 (與 AwardMatcher 相同，先寫入者優先)
+            tables[match_length].setdefault(int(number[-match_length:]), (prize_slot, number_index(number)))
+
+    if len(prizes) > 255 or len(numbers) > 255:
+        raise ValueError(f"開獎日期 {award_date.isoformat()} 的獎項或號碼數量過多，無法寫入快照")
+
+    table_counts = [len(tables[match_length]) for match_length in MATCH_LENGTHS]
+    strings_offset = (
+        _SECTION_HEADER.size + _PRIZE_ENTRY.size * len(prizes) + _NUMBER_WIDTH * len(numbers)
+        + _TABLE_ENTRY.size * sum(table_counts)
+    )
+
+    parts = [_SECTION_HEADER.pack(award_date.toordinal(), len(prizes), len(numbers), *table_counts)]
+    strings = []
+    offset = strings_offset
+    for rank, match_length, award_id, encoded in prizes:
+        parts.append(_PRIZE_ENTRY.pack(rank, match_length, 0, award_id, offset, len(encoded)))
+        strings.append(encoded)
+        offset += len(encoded)
+    parts.extend(number.encode('ascii') for number in numbers)
+    for match_length in MATCH_LENGTHS:
+        entries = sorted(tables[match_length].items(), key=lambda item: (item[0], prizes[item[1][0]][0]))
+        parts.extend(_TABLE_ENTRY.pack(key, prize_slot, index) for key, (prize_slot, index) in entries)
+    parts.extend(strings)
+    return b''.join(parts)
+
+
+def build_snapshot_bytes(data_version, draws, generated_at=None):
+    """
+    產生快照內容。draws 為 {award_date: [(award_id, prize_name, winning_numbers), ...]}。
+    """
+    award_dates = sorted(draws)
+    sections = [_build_section(award_date, draws[award_date]) for award_date in award_dates]
+
+    offset = _FILE_HEADER.size + _DIRECTORY_ENTRY.size * len(award_dates)
+    directory = []
+    for award_date, section in zip(award_dates, sections):
+        directory.append(_DIRECTORY_ENTRY.pack(award_date.toordinal(), offset, len(section)))
+        offset += len(section)
+
+    generated_at = int(time.time() if generated_at is None else generated_at)
+    header = _FILE_HEADER.pack(MAGIC, FORMAT_VERSION, 0, data_version, generated_at, len(award_dates))
+    return b''.join([header, *directory, *sections])
+
+
+def write_snapshot(path, data_version, draws, generated_at=None):
+    """
+    原子地寫入快照：先寫入同目錄的暫存檔並 fsync，再以 os.replace 替換，讀取端不會看到寫到一半的檔案。
+    回傳寫入的位元組數。
+    """
+    content = build_snapshot_bytes(data_version, draws, generated_at)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return len(content)
+
+
+def read_snapshot_version(path):
+    """
+    只讀取快照檔頭的開獎資料版本號；檔案不存在或格式不符時回傳 None。
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_FILE_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < _FILE_HEADER.size:
+        return None
+    magic, format_version, _, data_version, _, _ = _FILE_HEADER.unpack(header)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        return None
+    return data_version
+
+
+class DrawSnapshot:
+    """
+    以 mmap 唯讀開啟的快照。
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < _FILE_HEADER.size:
+            raise ValueError(f"{path} 不是有效的開獎資料快照")
+        magic, format_version, _, self.version, self.generated_at, self.draw_count = _FILE_HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"{path} 不是有效的開獎資料快照 (格式版本 {format_version})")
+        if len(self._mm) < _FILE_HEADER.size + _DIRECTORY_ENTRY.size * self.draw_count:
+            raise ValueError(f"{path} 內容不完整")
+
+    def _directory_entry(self, index):
+        return _DIRECTORY_ENTRY.unpack_from(self._mm, _FILE_HEADER.size + _DIRECTORY_ENTRY.size * index)
+
+    def award_dates(self):
+        return [date.fromordinal(self._directory_entry(i)[0]) for i in range(self.draw_count)]
+
+    def matcher(self, award_date):
+        """
+        回傳該開獎日期的對獎器 (介面與 AwardMatcher 相同)；快照中沒有該日期時回傳 None。
+        """
+        ordinal = award_date.toordinal()
+        low, high = 0, self.draw_count
+        while low < high:
+            middle = (low + high) // 2
+            entry_ordinal, offset, _ = self._directory_entry(middle)
+            if entry_ordinal < ordinal:
+                low = middle + 1
+            elif entry_ordinal > ordinal:
+                high = middle
+            else:
+                return SnapshotDrawMatcher(self._mm, award_date, offset)
+        return None
+
+    def match(self, award_date, invoice_number):
+        """
+        比對已清理過的 8 碼發票號碼，回傳最高獎項的 AwardMatch；未中獎或沒有該日期時回傳 None。
+        """
+        matcher = self.matcher(award_date)
+        return matcher.match(invoice_number) if matcher is not None else None
+
+
+class SnapshotDrawMatcher:
+    """
+    快照中單一開獎日期的對獎器，直接在 mmap 上以二分搜尋比對。
+    """
+    __slots__ = ('award_date', '_mm', '_offset', '_prize_count', '_numbers_offset', '_tables')
+
+    def __init__(self, mm, award_date, offset):
+        self.award_date = award_date
+        self._mm = mm
+        self._offset = offset
+        _, self._prize_count, number_count, *table_counts = _SECTION_HEADER.unpack_from(mm, offset)
+        self._numbers_offset = offset + _SECTION_HEADER.size + _PRIZE_ENTRY.size * self._prize_count
+        table_offset = self._numbers_offset + _NUMBER_WIDTH * number_count
+        self._tables = []
+        for match_length, count in zip(MATCH_LENGTHS, table_counts):
+            if count:
+                self._tables.append((match_length, table_offset, count))
+            table_offset += _TABLE_ENTRY.size * count
+
+    def _search(self, table_offset, count, key):
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if _TABLE_ENTRY.unpack_from(self._mm, table_offset + _TABLE_ENTRY.size * middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < count:
+            entry_key, prize_slot, number_index = _TABLE_ENTRY.unpack_from(self._mm, table_offset + _TABLE_ENTRY.size * low)
+            if entry_key == key:
+                return prize_slot, number_index
+        return None
+
+    def match(self, invoice_number):
+        for match_length, table_offset, count in self._tables:
+            hit = self._search(table_offset, count, int(invoice_number[-match_length:]))
+            if hit is None:
+                continue
+            prize_slot, number_index = hit
+            rank, _, _, award_id, strings_offset, strings_length = _PRIZE_ENTRY.unpack_from(
+                self._mm, self._offset + _SECTION_HEADER.size + _PRIZE_ENTRY.size * prize_slot
+            )
+            number_offset = self._numbers_offset + _NUMBER_WIDTH * number_index
+            winning_number = self._mm[number_offset:number_offset + _NUMBER_WIDTH].decode('ascii')
+            strings_start = self._offset + strings_offset
+            winning_numbers = self._mm[strings_start:strings_start + strings_length].decode('utf-8')
+            return build_award_match(_PRIZE_NAMES_BY_RANK[rank], award_id, winning_numbers, winning_number)
+        return None
+
+
+class DrawSnapshotReader:
+    """
+    追蹤快照檔案並在檔案被替換時切換到新版本。
+    每隔 check_interval 秒最多檢查一次檔案狀態；切換只是替換參考，進行中的比對仍使用舊的 mmap。
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._file_key = None
+        self._checked_at = None
+
+    def current(self):
+        """
+        回傳目前的 DrawSnapshot；檔案不存在或無法讀取時回傳 None。
+        """
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.check_interval:
+                self._reload_if_changed()
+                self._checked_at = now
+            return self._snapshot
+
+    def matchers(self, award_dates, min_version=None):
+        """
+        取得多個開獎日期的快照對獎器，回傳 {award_date: SnapshotDrawMatcher}。
+        快照尚未產生或版本低於 min_version (已知有更新的開獎資料但快照尚未重新產生) 時回傳空 dict；
+        快照中沒有的日期不會出現在結果中。
+        """
+        snapshot = self.current()
+        if snapshot is None or (min_version is not None and snapshot.version < min_version):
+            return {}
+        matchers = {}
+        for award_date in award_dates:
+            matcher = snapshot.matcher(award_date)
+            if matcher is not None:
+                matchers[award_date] = matcher
+        return matchers
+
+    def refresh(self):
+        """
+        立即檢查檔案是否已被替換。
+        """
+        with self._lock:
+            self._reload_if_changed()
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def _reload_if_changed(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._snapshot = None
+            self._file_key = None
+            return
+        file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_key == self._file_key:
+            return
+        try:
+            snapshot = DrawSnapshot(self.path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("無法載入開獎資料快照 %s: %s", self.path, e)
+            return
+        self._snapshot = snapshot
+        self._file_key = file_key
+        logger.info("--- 已載入開獎資料快照 (版本 %s，%d 期) ---", snapshot.version, snapshot.draw_count)
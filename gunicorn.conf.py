@@ -0,0 +1,39 @@
+# gunicorn.conf.py
+# gunicorn 啟動時會自動讀取工作目錄下的此設定檔 (命令列參數優先)
+import os
+import shutil
+
+
+def on_starting(server):
+    """
+    多程序監控指標 (PROMETHEUS_MULTIPROC_DIR) 的目錄在啟動時清空，避免沿用上次執行留下的數值。
+    """
+    multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def post_worker_init(worker):
+    """
+    每個 worker 載入應用程式後，開始監聽開獎資料異動通知，讓程序內快取保持最新。
+    """
+    from app import start_award_change_listener
+    start_award_change_listener()
+
+
+def worker_exit(server, worker):
+    from app import stop_award_change_listener
+    stop_award_change_listener()
+
+
+def child_exit(server, worker):
+    """
+    worker 結束時移除它的 live gauge 數值 (計數器與直方圖仍保留在彙整結果中)。
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        try:
+            from prometheus_client import multiprocess
+        except ImportError:
+            return
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,349 @@
+# invoice_import.py
+"""
+發票大量匯入。
+
+支援的上傳格式：
+- csv        第一行為欄位名稱，需包含 invoice_number 與 invoice_date
+- ndjson     每行一個含相同欄位的 JSON 物件
+- carrier    財政部電子發票整合服務平台匯出的載具消費發票 CSV (以 | 分隔，M 行為發票、D 行為明細)；
+             以 csv 格式上傳時，若第一行為「表頭=M|...」也會自動改用此格式
+- qr         電子發票左側 QR Code 的內容，每行一筆 (前 10 碼為發票號碼，接著 7 碼為民國年月日)
+
+上傳內容以產生器逐行解析與驗證，驗證通過的資料每 IMPORT_BATCH_SIZE 筆以 PostgreSQL COPY
+寫入暫存表，再以 INSERT ... ON CONFLICT (invoice_number) DO NOTHING 合併進 invoices。
+整個過程不會把上傳內容整份讀進記憶體，暫存表也不會隨檔案大小成長。
+"""
+import csv
+import io
+import itertools
+import json
+import re
+from datetime import date, datetime
+
+# 發票號碼：8 碼數字，可帶 2 碼英文字軌 (例如 AB12345678)
+INVOICE_NUMBER_PATTERN = re.compile(r'^(?:[A-Z]{2})?\d{8}$')
+
+# 回應中最多列出幾筆錯誤明細，避免錯誤過多時回應本身過大
+MAX_REPORTED_ERRORS = 100
+
+# 每批寫入暫存表並合併進 invoices 的筆數
+IMPORT_BATCH_SIZE = 50000
+
+IMPORT_FORMATS = ("csv", "ndjson", "carrier", "qr")
+
+# 載具消費發票 CSV 的表頭行 (例如「表頭=M|載具名稱|載具號碼|發票日期|商店統編|商店店名|發票號碼|總金額|發票狀態|」)
+CARRIER_HEADER_PREFIX = "表頭="
+# 沒有表頭行時 M 行的欄位位置 (0 為記錄類型 M)
+CARRIER_DEFAULT_COLUMNS = {"發票日期": 3, "發票號碼": 6, "發票狀態": 8}
+CARRIER_VOID_STATUS = "作廢"
+
+# QR Code 內容：發票號碼 10 碼 + 民國年月日 7 碼 (之後為隨機碼、金額與加密驗證資訊)
+QR_PAYLOAD_MIN_LENGTH = 17
+
+
+def normalize_invoice_number(value):
+    """
+    以與 check_invoice 相同的方式清理發票號碼 (去除前後空白與 '-')，字軌轉為大寫。
+    格式不正確時回傳 None。
+    """
+    if not isinstance(value, str):
+        return None
+    invoice_number = value.strip().replace('-', '').upper()
+    if not INVOICE_NUMBER_PATTERN.match(invoice_number):
+        return None
+    return invoice_number
+
+
+def parse_invoice_date(value):
+    """
+    解析 YYYY-MM-DD 格式的日期，格式不正確時回傳 None。
+    """
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+    except (AttributeError, ValueError):
+        return None
+
+
+def guess_import_format(filename=None, content_type=None):
+    """
+    由檔名副檔名或 Content-Type 推測匯入格式，無法判斷時回傳 None。
+    """
+    if filename:
+        lowered = filename.lower()
+        if lowered.endswith('.csv'):
+            return "csv"
+        if lowered.endswith(('.ndjson', '.jsonl')):
+            return "ndjson"
+    if content_type:
+        mimetype = content_type.split(';')[0].strip().lower()
+        if mimetype in ("text/csv", "application/csv"):
+            return "csv"
+        if mimetype in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+            return "ndjson"
+    return None # 載具 CSV 會在 csv 格式中自動辨識，QR Code 內容需以 format=qr 指定
+
+
+class ImportStats:
+    """
+    匯入結果統計。
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+
+    def add_error(self, line_number, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "message": message})
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "errors_truncated": self.invalid > len(self.errors)
+        }
+
+
+def _text_lines(binary_stream):
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+
+
+def iter_csv_records(binary_stream):
+    """
+    逐行解析 CSV (第一行為欄位名稱，需包含 invoice_number 與 invoice_date)。
+    產生 (行號, 欄位 dict 或 None, 錯誤訊息或 None)。
+    欄位名稱在呼叫時就會先檢查，缺少必要欄位時直接拋出 ValueError。
+    第一行為載具消費發票 CSV 的表頭時，改以 iter_carrier_records 解析。
+    """
+    text_stream = _text_lines(binary_stream)
+    first_line = text_stream.readline()
+    if first_line.startswith(CARRIER_HEADER_PREFIX):
+        return _iter_carrier_lines(itertools.chain([first_line], text_stream))
+    reader = csv.DictReader(itertools.chain([first_line], text_stream))
+    fieldnames = reader.fieldnames or []
+    missing = [field for field in ('invoice_number', 'invoice_date') if field not in fieldnames]
+    if missing:
+        raise ValueError(f"CSV 缺少必要欄位: {', '.join(missing)}")
+
+    def generate():
+        for record in reader:
+            yield reader.line_num, record, None
+    return generate()
+
+
+def iter_ndjson_records(binary_stream):
+    """
+    逐行解析 NDJSON，每行一個 JSON 物件，空白行會被略過。
+    產生 (行號, 欄位 dict 或 None, 錯誤訊息或 None)。
+    """
+    for line_number, raw_line in enumerate(binary_stream, start=1):
+        line = raw_line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, None, "JSON 格式不正確"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "每行應為一個 JSON 物件"
+            continue
+        yield line_number, record, None
+
+
+def _carrier_columns(header_line):
+    """
+    由「表頭=M|...」找出發票日期、發票號碼與發票狀態所在的欄位位置。
+    """
+    names = [name.strip() for name in header_line[len(CARRIER_HEADER_PREFIX):].split('|')]
+    missing = [name for name in ("發票日期", "發票號碼") if name not in names]
+    if missing:
+        raise ValueError(f"載具 CSV 表頭缺少必要欄位: {', '.join(missing)}")
+    return {name: names.index(name) for name in CARRIER_DEFAULT_COLUMNS if name in names}
+
+
+def _iter_carrier_lines(lines):
+    columns = CARRIER_DEFAULT_COLUMNS
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if line.startswith(CARRIER_HEADER_PREFIX):
+            if line[len(CARRIER_HEADER_PREFIX):].startswith('M|'):
+                columns = _carrier_columns(line)
+            continue # 明細的表頭 (表頭=D|...) 不需要
+        fields = [field.strip() for field in line.split('|')]
+        if fields[0] != 'M':
+            continue # 空白行與 D (消費明細) 行
+        if len(fields) <= max(columns.values()):
+            yield line_number, None, "載具發票資料的欄位數不足"
+            continue
+        status_column = columns.get("發票狀態")
+        if status_column is not None and CARRIER_VOID_STATUS in fields[status_column]:
+            yield line_number, None, "發票已作廢"
+            continue
+        try:
+            invoice_date = datetime.strptime(fields[columns["發票日期"]], '%Y%m%d').date()
+        except ValueError:
+            yield line_number, None, "發票日期格式不正確，應為YYYYMMDD"
+            continue
+        yield line_number, {"invoice_number": fields[columns["發票號碼"]], "purchase_date": invoice_date.isoformat()}, None
+
+
+def iter_carrier_records(binary_stream):
+    """
+    逐行解析財政部載具消費發票 CSV，只取 M (發票) 行，略過表頭、D (明細) 行與空白行。
+    欄位位置依「表頭=M|...」判斷，沒有表頭時使用平台預設的欄位順序。
+    產生 (行號, 欄位 dict 或 None, 錯誤訊息或 None)，開立日期轉為 YYYY-MM-DD 的 purchase_date；作廢的發票視為錯誤。
+    """
+    return _iter_carrier_lines(_text_lines(binary_stream))
+
+
+def parse_qr_payload(payload):
+    """
+    解析電子發票左側 QR Code 內容，回傳 (發票號碼, 開立日期, 錯誤訊息或 None)。
+    日期為民國年 (3 碼) 月日，例如 1130105 為 2024-01-05。
+    """
+    if len(payload) < QR_PAYLOAD_MIN_LENGTH:
+        return None, None, "QR Code 內容長度不足"
+    roc_date = payload[10:17]
+    try:
+        if not roc_date.isdigit():
+            raise ValueError
+        invoice_date = date(int(roc_date[:3]) + 1911, int(roc_date[3:5]), int(roc_date[5:7]))
+    except ValueError:
+        return None, None, "QR Code 的發票日期格式不正確，應為民國年月日 (YYYMMDD)"
+    return payload[:10], invoice_date, None
+
+
+def iter_qr_records(binary_stream):
+    """
+    逐行解析 QR Code 內容 (每行一筆)，略過空白行與右側 QR Code (以 ** 開頭) 的內容。
+    產生 (行號, 欄位 dict 或 None, 錯誤訊息或 None)，開立日期轉為 YYYY-MM-DD 的 purchase_date。
+    """
+    for line_number, line in enumerate(_text_lines(binary_stream), start=1):
+        line = line.strip()
+        if not line or line.startswith('**'):
+            continue
+        invoice_number, invoice_date, error_message = parse_qr_payload(line)
+        if error_message:
+            yield line_number, None, error_message
+            continue
+        yield line_number, {"invoice_number": invoice_number, "purchase_date": invoice_date.isoformat()}, None
+
+
+def iter_records(binary_stream, import_format):
+    if import_format == "csv":
+        return iter_csv_records(binary_stream)
+    if import_format == "ndjson":
+        return iter_ndjson_records(binary_stream)
+    if import_format == "carrier":
+        return iter_carrier_records(binary_stream)
+    if import_format == "qr":
+        return iter_qr_records(binary_stream)
+    raise ValueError(f"不支援的匯入格式: {import_format}")
+
+
+def iter_valid_invoices(records, stats):
+    """
+    驗證並清理解析後的資料，產生 (invoice_number, invoice_date)；
+    不合法的資料記錄在 stats 中並略過。
+    """
+    for line_number, record, error_message in records:
+        stats.total += 1
+        if error_message:
+            stats.add_error(line_number, error_message)
+            continue
+        invoice_number = normalize_invoice_number(record.get('invoice_number'))
+        if invoice_number is None:
+            stats.add_error(line_number, "發票號碼應為8位數字 (可含2碼英文字軌)")
+            continue
+        # 載具 CSV 與 QR Code 內容只有開立日期 (purchase_date)，即 invoices 儲存的購買日期
+        date_field = 'invoice_date' if 'invoice_date' in record else 'purchase_date'
+        invoice_date = parse_invoice_date(record.get(date_field))
+        if invoice_date is None:
+            stats.add_error(line_number, f"{date_field} 格式不正確，應為YYYY-MM-DD")
+            continue
+        yield invoice_number, invoice_date
+
+
+class _CopyRowStream:
+    """
+    提供 COPY ... FROM STDIN 讀取的類檔案物件，依需求從產生器取出資料列並轉成 COPY text 格式。
+    """
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._buffer = ''
+        self.row_count = 0
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        for invoice_number, invoice_date in self._rows:
+            line = f"{invoice_number}\t{invoice_date.isoformat()}\n"
+            chunks.append(line)
+            length += len(line)
+            self.row_count += 1
+            if 0 < size <= length:
+                break
+        data = ''.join(chunks)
+        if size is None or size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def copy_invoices(connection, rows, stats, batch_size=IMPORT_BATCH_SIZE):
+    """
+    將 (invoice_number, invoice_date) 資料列每 batch_size 筆以 COPY 寫入暫存表，
+    再合併進 invoices；已存在的發票號碼 (含同一次匯入中重複者) 計為 duplicates。
+    connection 為 SQLAlchemy Connection，交易由呼叫端負責提交。
+    """
+    rows = iter(rows)
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS invoice_import_staging (
+                invoice_number VARCHAR(10) NOT NULL,
+                invoice_date DATE NOT NULL
+            ) ON COMMIT DROP
+        """)
+        while True:
+            cursor.execute("TRUNCATE invoice_import_staging")
+            row_stream = _CopyRowStream(itertools.islice(rows, batch_size))
+            cursor.copy_expert(
+                "COPY invoice_import_staging (invoice_number, invoice_date) FROM STDIN",
+                row_stream
+            )
+            if row_stream.row_count == 0:
+                break
+
+            cursor.execute("""
+                INSERT INTO invoices (invoice_number, invoice_date, winning_status)
+                SELECT invoice_number, invoice_date, FALSE
+                FROM invoice_import_staging
+                ON CONFLICT (invoice_number) DO NOTHING
+            """)
+            stats.inserted += cursor.rowcount
+            stats.duplicates += row_stream.row_count - cursor.rowcount
+            if row_stream.row_count < batch_size:
+                break
+    finally:
+        cursor.close()
+    return stats
+
+
+def import_invoices(connection, binary_stream, import_format):
+    """
+    從二進位串流匯入發票，回傳 ImportStats。
+    """
+    stats = ImportStats()
+    rows = iter_valid_invoices(iter_records(binary_stream, import_format), stats)
+    return copy_invoices(connection, rows, stats)
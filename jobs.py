@@ -0,0 +1,194 @@
+# jobs.py
+"""
+大型批次對獎與匯入的背景工作。
+
+web 服務只負責把上傳內容串流寫入 JOB_STORAGE_DIR (web 與 scheduler 共用的目錄) 並在 jobs 資料表新增一筆工作；
+scheduler 服務以 SELECT ... FOR UPDATE SKIP LOCKED 領取工作，在父程序逐行解析上傳內容並切成
+JOB_CHUNK_SIZE 筆一塊，交給程序池 (JOB_WORKERS 個程序，預設為 CPU 數) 平行處理：
+- check_invoices   每一塊在子程序中驗證並對獎，結果依原本順序寫成 NDJSON 結果檔供下載
+- import_invoices  每一塊在子程序中驗證後以 COPY 寫入 invoices，並各自提交 (整個檔案不是單一交易)
+每完成一塊就更新工作的進度，不需要額外的訊息佇列。
+
+本模組只包含與 Flask 無關的部分，子程序不會載入 app.py。
+"""
+import itertools
+import os
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from api_common import build_check_result, no_award_data_message, parse_check_item
+from award_matcher import compile_award_matchers
+from invoice_import import (
+    MAX_REPORTED_ERRORS, ImportStats, copy_invoices, iter_records, iter_valid_invoices, normalize_invoice_number
+)
+from serializers import dumps
+
+JOB_STORAGE_DIR = os.getenv('JOB_STORAGE_DIR', '/tmp/invoice_lottery_jobs')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '0')) or os.cpu_count() or 1
+# 每塊的筆數：越大子程序間傳遞的次數越少，但進度更新的間隔越長
+JOB_CHUNK_SIZE = int(os.getenv('JOB_CHUNK_SIZE', '50000'))
+
+JOB_KINDS = ("check_invoices", "import_invoices")
+JOB_STATUSES = ("pending", "running", "succeeded", "failed")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    取得共用的程序池 (第一次呼叫時建立)。
+    使用 forkserver 而非 fork，子程序不會繼承父程序的資料庫連線與排程器執行緒。
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=get_context("forkserver"))
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+
+def new_job_paths(kind):
+    """
+    回傳新工作的 (上傳內容路徑, 結果檔路徑)；只有對獎工作有結果檔。
+    """
+    os.makedirs(JOB_STORAGE_DIR, exist_ok=True)
+    name = uuid.uuid4().hex
+    result_path = os.path.join(JOB_STORAGE_DIR, f"{name}.result.ndjson") if kind == "check_invoices" else None
+    return os.path.join(JOB_STORAGE_DIR, f"{name}.input"), result_path
+
+
+def save_upload(binary_stream, path, chunk_size=1024 * 1024):
+    """
+    將上傳內容分段寫入檔案 (不整份讀進記憶體)，回傳寫入的位元組數。
+    """
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            chunk = binary_stream.read(chunk_size)
+            if not chunk:
+                return size
+            f.write(chunk)
+            size += len(chunk)
+
+
+def iter_record_chunks(path, import_format, chunk_size=JOB_CHUNK_SIZE):
+    """
+    逐行解析上傳內容，每次產生 chunk_size 筆 (行號, 欄位 dict 或 None, 錯誤訊息或 None)。
+    """
+    with open(path, 'rb') as binary_stream:
+        records = iter_records(binary_stream, import_format)
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def run_chunks(executor, function, chunks, extra_args, on_result, max_in_flight=None):
+    """
+    將每一塊交給程序池執行 function(chunk, *extra_args)，並依原本順序呼叫 on_result(結果)。
+    同時在處理中的塊數有上限，讀取速度不會超前處理速度太多，記憶體用量與檔案大小無關。
+    """
+    max_in_flight = max_in_flight or JOB_WORKERS * 2
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(function, chunk, *extra_args))
+        if len(pending) >= max_in_flight:
+            on_result(pending.popleft().result())
+    while pending:
+        on_result(pending.popleft().result())
+
+
+# --- 子程序中執行的函數 ---
+
+# 子程序內已編譯的對獎器 (開獎資料版本號, {award_date: AwardMatcher})
+_worker_matchers = (None, {})
+# 子程序內匯入用的資料庫 engine
+_worker_engine = None
+
+
+def _without_track(record):
+    """
+    對獎只比對 8 碼數字，載具 CSV 與 QR Code 內容的發票號碼帶有 2 碼字軌 (例如 AB12345678)，先去除。
+    """
+    invoice_number = normalize_invoice_number(record.get('invoice_number'))
+    if invoice_number is not None and len(invoice_number) == 10:
+        return {**record, 'invoice_number': invoice_number[2:]}
+    return record
+
+
+def check_chunk(records, award_version, award_rows):
+    """
+    對一塊資料對獎，回傳 (NDJSON 結果字串, 統計 dict)。
+    award_rows 為所有 (award_date, award_id, prize_name, winning_numbers)，
+    同一個子程序在開獎資料版本未變時只編譯一次對獎器。
+    """
+    global _worker_matchers
+    if _worker_matchers[0] != award_version:
+        _worker_matchers = (award_version, compile_award_matchers(award_rows))
+    matchers = _worker_matchers[1]
+
+    lines = []
+    counts = {"total": 0, "checked": 0, "winning": 0, "failed": 0}
+    for line_number, record, error_message in records:
+        counts["total"] += 1
+        if error_message is None:
+            invoice_number, check_date, error_message = parse_check_item(_without_track(record))
+        if error_message:
+            result = {"line": line_number, "status": 400, "message": error_message}
+        elif check_date not in matchers:
+            result = {
+                "line": line_number, "status": 404, "message": no_award_data_message(check_date),
+                "invoice_number": invoice_number, "invoice_date": check_date.isoformat()
+            }
+        else:
+            result = {
+                "line": line_number, "status": 200,
+                **build_check_result(invoice_number, check_date, matchers[check_date].match(invoice_number))
+            }
+        if result["status"] == 200:
+            counts["checked"] += 1
+            counts["winning"] += result["winning_status"]
+        else:
+            counts["failed"] += 1
+        lines.append(dumps(result))
+    return "".join(line + "\n" for line in lines), counts
+
+
+def import_chunk(records, database_url):
+    """
+    驗證一塊資料並以 COPY 寫入 invoices (在子程序自己的連線中提交)，回傳 ImportStats.to_dict()。
+    """
+    global _worker_engine
+    if _worker_engine is None:
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import NullPool
+        _worker_engine = create_engine(database_url, poolclass=NullPool)
+
+    stats = ImportStats()
+    with _worker_engine.begin() as connection:
+        copy_invoices(connection, iter_valid_invoices(iter(records), stats), stats)
+    return stats.to_dict()
+
+
+def merge_import_stats(summary, chunk_stats):
+    """
+    將一塊的匯入統計累加到 summary (格式與 ImportStats.to_dict() 相同)，錯誤明細最多保留 MAX_REPORTED_ERRORS 筆。
+    """
+    for key in ("total", "inserted", "duplicates", "invalid"):
+        summary[key] = summary.get(key, 0) + chunk_stats[key]
+    errors = summary.setdefault("errors", [])
+    errors.extend(chunk_stats["errors"][:MAX_REPORTED_ERRORS - len(errors)])
+    summary["errors_truncated"] = summary["invalid"] > len(errors)
+    return summary
@@ -0,0 +1,233 @@
+# metrics.py
+"""
+Prometheus 監控指標 (GET /metrics)。
+
+prometheus_client 為選用套件：未安裝時所有記錄函數都不做任何事，/metrics 回傳 503。
+記錄的指標：
+- 每個路由、方法與狀態碼的請求延遲
+- 每個請求的 SQL 查詢數與查詢總時間，以及每個查詢的耗時 (SQLAlchemy 事件)
+- 從連線池取得連線的等待時間 (TimedQueuePool) 與各連線池 (主資料庫、副本) 使用中的連線數
+- 開獎資料快照與對獎器快取的命中/未命中次數 (命中率 = hit / (hit + miss))
+- 爬蟲抓取、解析、儲存各階段的耗時與抓取結果
+
+gunicorn 多個 worker 時設定 PROMETHEUS_MULTIPROC_DIR (所有 worker 共用的空目錄)，
+各 worker 把數值寫入該目錄，/metrics 由任一個 worker 彙整後輸出 (見 gunicorn.conf.py)。
+排程器等沒有 HTTP 路由的程序可以 start_metrics_server 另開一個埠輸出自己的指標。
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = "invoice_lottery"
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+if MULTIPROC_DIR:
+    # 多程序模式在建立指標時就會寫入檔案，目錄必須先存在
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+try:
+    import prometheus_client
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+    from prometheus_client import multiprocess
+except ImportError: # prometheus_client 為選用套件，未安裝時不記錄任何指標
+    prometheus_client = None
+
+# 不屬於任何 HTTP 請求的查詢 (排程器、CLI 指令) 使用的路由標籤
+NO_ROUTE = "-"
+
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+SCRAPER_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+if prometheus_client is not None:
+    REQUEST_DURATION = Histogram(
+        f"{METRICS_PREFIX}_http_request_duration_seconds", "HTTP 請求處理時間 (不含串流輸出的傳送時間)",
+        ["method", "route", "status"]
+    )
+    DB_QUERY_DURATION = Histogram(
+        f"{METRICS_PREFIX}_db_query_duration_seconds", "單一 SQL 查詢的耗時", ["route"], buckets=DB_BUCKETS
+    )
+    DB_QUERIES_PER_REQUEST = Histogram(
+        f"{METRICS_PREFIX}_db_queries_per_request", "每個請求執行的 SQL 查詢數", ["route"], buckets=QUERY_COUNT_BUCKETS
+    )
+    DB_TIME_PER_REQUEST = Histogram(
+        f"{METRICS_PREFIX}_db_time_per_request_seconds", "每個請求花在 SQL 查詢的總時間", ["route"], buckets=DB_BUCKETS
+    )
+    POOL_CHECKOUT_WAIT = Histogram(
+        f"{METRICS_PREFIX}_db_pool_checkout_wait_seconds", "從連線池取得連線的等待時間", buckets=DB_BUCKETS
+    )
+    # 多程序模式下加總所有存活 worker 的數值；使用中 / 上限即為連線池飽和度
+    DB_POOL_CHECKED_OUT = Gauge(
+        f"{METRICS_PREFIX}_db_pool_checked_out", "連線池使用中的連線數", ["pool"], multiprocess_mode="livesum"
+    )
+    DB_POOL_CAPACITY = Gauge(
+        f"{METRICS_PREFIX}_db_pool_capacity", "連線池的連線數上限 (pool_size + max_overflow)", ["pool"],
+        multiprocess_mode="livesum"
+    )
+    AWARD_LOOKUPS = Counter(
+        f"{METRICS_PREFIX}_award_lookups_total", "以開獎日期查找對獎器的次數", ["layer", "result"]
+    )
+    SCRAPER_PHASE_DURATION = Histogram(
+        f"{METRICS_PREFIX}_scraper_phase_duration_seconds", "爬蟲各階段 (fetch / parse / save) 的耗時",
+        ["phase"], buckets=SCRAPER_BUCKETS
+    )
+    SCRAPER_FETCHES = Counter(
+        f"{METRICS_PREFIX}_scraper_fetches_total", "開獎網頁抓取結果", ["result"]
+    )
+
+
+class TimedQueuePool(QueuePool):
+    """
+    記錄取得連線等待時間的 QueuePool (以 SQLALCHEMY_ENGINE_OPTIONS 的 poolclass 指定)。
+    連線池已滿時，等待其他請求歸還連線的時間也會計入。
+    """
+
+    def _do_get(self):
+        if prometheus_client is None:
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def record_award_lookups(layer, hits, misses):
+    """
+    記錄 layer ("snapshot" 或 "matcher_cache") 命中與未命中的開獎日期數。
+    """
+    if prometheus_client is None:
+        return
+    if hits:
+        AWARD_LOOKUPS.labels(layer, "hit").inc(hits)
+    if misses:
+        AWARD_LOOKUPS.labels(layer, "miss").inc(misses)
+
+
+def observe_scraper_phase(phase, seconds):
+    if prometheus_client is not None:
+        SCRAPER_PHASE_DURATION.labels(phase).observe(seconds)
+
+
+@contextmanager
+def time_scraper_phase(phase):
+    """
+    記錄區塊內的耗時為爬蟲的 phase 階段 (發生例外時也會記錄)。
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_scraper_phase(phase, time.perf_counter() - started)
+
+
+def record_scraper_fetch(result):
+    """
+    記錄一次抓取的結果："updated"、"unchanged"、"not_modified" 或 "error"。
+    """
+    if prometheus_client is not None:
+        SCRAPER_FETCHES.labels(result).inc()
+
+
+def render_metrics():
+    """
+    回傳 (內容, Content-Type)；多程序模式下彙整所有 worker 的數值。
+    """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port):
+    """
+    在背景執行緒以獨立的 HTTP 埠輸出指標 (供排程器等沒有 Flask 路由的程序使用)。
+    """
+    if prometheus_client is None:
+        logger.warning("未安裝 prometheus_client，不提供監控指標")
+        return
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        prometheus_client.start_http_server(port, registry=registry)
+    else:
+        prometheus_client.start_http_server(port)
+    logger.info("--- 監控指標已在 :%d/metrics 提供 ---", port)
+
+
+def _track_pool(name, engine):
+    """
+    連線被取出或歸還時更新該連線池使用中的連線數。
+    """
+    pool = engine.pool
+    DB_POOL_CAPACITY.labels(name).set(pool.size() + max(pool._max_overflow, 0))
+
+    def update_checked_out(*args):
+        DB_POOL_CHECKED_OUT.labels(name).set(pool.checkedout())
+
+    event.listen(pool, "checkout", update_checked_out)
+    event.listen(pool, "checkin", update_checked_out)
+
+
+def init_app(app, engines):
+    """
+    為 Flask 應用程式註冊請求計時、SQL 查詢計時、連線池使用狀況與 GET /metrics。
+    engines 為 {連線池名稱: engine}，例如 {"primary": ..., "replica": ...}。
+    """
+    from flask import Response, g, has_request_context, jsonify, request
+
+    def current_route():
+        if not has_request_context():
+            return NO_ROUTE
+        return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if prometheus_client is not None:
+            DB_QUERY_DURATION.labels(current_route()).observe(elapsed)
+        if has_request_context():
+            g.db_query_count = g.get("db_query_count", 0) + 1
+            g.db_query_time = g.get("db_query_time", 0.0) + elapsed
+
+    for name, engine in engines.items():
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        if prometheus_client is not None:
+            _track_pool(name, engine)
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.get("request_started")
+        if prometheus_client is not None and started is not None:
+            route = current_route()
+            REQUEST_DURATION.labels(request.method, route, str(response.status_code)).observe(
+                time.perf_counter() - started
+            )
+            DB_QUERIES_PER_REQUEST.labels(route).observe(g.get("db_query_count", 0))
+            DB_TIME_PER_REQUEST.labels(route).observe(g.get("db_query_time", 0.0))
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        if prometheus_client is None:
+            return jsonify({"message": "未安裝 prometheus_client，無法提供監控指標"}), 503
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
@@ -0,0 +1,44 @@
+"""Add covering indexes for award and invoice hot paths
+
+Revision ID: 3a7e5f90d1b4
+Revises: 9e4b7d21c3a8
+Create Date: 2026-10-16 13:37:08.562190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a7e5f90d1b4'
+down_revision: Union[str, None] = '9e4b7d21c3a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # invoices 可能有數百萬列，以 CONCURRENTLY 建立索引避免長時間鎖住寫入 (不能在交易中執行)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_invoices_invoice_date_id', 'invoices', ['invoice_date', 'id'],
+            postgresql_include=['invoice_number', 'winning_status', 'award_id'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_invoices_award_id', 'invoices', ['award_id'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_awards_award_date_id', 'awards', ['award_date', 'id'],
+            postgresql_include=['prize_name', 'winning_numbers'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_awards_award_date_id', table_name='awards', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_invoices_award_id', table_name='invoices', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_invoices_invoice_date_id', table_name='invoices', postgresql_concurrently=True, if_exists=True)
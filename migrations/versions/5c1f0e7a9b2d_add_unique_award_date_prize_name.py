@@ -0,0 +1,44 @@
+"""Add unique index on awards (award_date, prize_name)
+
+Revision ID: 5c1f0e7a9b2d
+Revises: af6d12bb6685
+Create Date: 2026-10-16 10:12:31.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1f0e7a9b2d'
+down_revision: Union[str, None] = 'af6d12bb6685'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 先移除並行抓取時可能產生的重複獎項：保留 ID 最小的一筆，並將發票改為關聯到保留的獎項
+    op.execute("""
+        WITH ranked AS (
+            SELECT id, min(id) OVER (PARTITION BY award_date, prize_name) AS keep_id
+            FROM awards
+        )
+        UPDATE invoices
+        SET award_id = ranked.keep_id
+        FROM ranked
+        WHERE invoices.award_id = ranked.id AND ranked.id <> ranked.keep_id
+    """)
+    op.execute("""
+        DELETE FROM awards a
+        USING awards b
+        WHERE a.award_date = b.award_date
+          AND a.prize_name = b.prize_name
+          AND a.id > b.id
+    """)
+    op.create_index('uq_awards_award_date_prize_name', 'awards', ['award_date', 'prize_name'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_awards_award_date_prize_name', table_name='awards')
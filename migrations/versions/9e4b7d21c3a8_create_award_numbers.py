@@ -0,0 +1,54 @@
+"""Create award_numbers table with indexed suffix columns
+
+Revision ID: 9e4b7d21c3a8
+Revises: 5c1f0e7a9b2d
+Create Date: 2026-10-16 11:04:52.117364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b7d21c3a8'
+down_revision: Union[str, None] = '5c1f0e7a9b2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SUFFIX_LENGTHS = (7, 6, 5, 4, 3)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'award_numbers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('award_id', sa.Integer(), nullable=False),
+        sa.Column('award_date', sa.Date(), nullable=False),
+        sa.Column('number', sa.String(length=8), nullable=False),
+        *[
+            sa.Column(f'suffix_{length}', sa.String(length=length),
+                      sa.Computed(f'right(number, {length})', persisted=True))
+            for length in SUFFIX_LENGTHS
+        ],
+        sa.ForeignKeyConstraint(['award_id'], ['awards.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_award_numbers_award_id', 'award_numbers', ['award_id'])
+    op.create_index('ix_award_numbers_award_date_number', 'award_numbers', ['award_date', 'number'])
+    for length in SUFFIX_LENGTHS:
+        op.create_index(f'ix_award_numbers_award_date_suffix_{length}', 'award_numbers', ['award_date', f'suffix_{length}'])
+
+    # 由既有的 awards.winning_numbers 回填個別號碼
+    op.execute("""
+        INSERT INTO award_numbers (award_id, award_date, number)
+        SELECT a.id, a.award_date, btrim(n.number)
+        FROM awards a
+        CROSS JOIN LATERAL unnest(string_to_array(a.winning_numbers, ',')) AS n(number)
+        WHERE btrim(n.number) <> ''
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('award_numbers')
@@ -0,0 +1,34 @@
+"""Create award_data_version table
+
+Revision ID: b81d2c4e6f07
+Revises: 3a7e5f90d1b4
+Create Date: 2026-10-16 15:21:44.903218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b81d2c4e6f07'
+down_revision: Union[str, None] = '3a7e5f90d1b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'award_data_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # 既有資料視為第 1 版
+    op.execute("INSERT INTO award_data_version (id, version, updated_at) VALUES (1, 1, now())")
+
+
+def downgrade() -> None:
+    op.drop_table('award_data_version')
@@ -0,0 +1,49 @@
+"""Create jobs table
+
+Revision ID: e7a2c5f81d39
+Revises: d4c93a1e7b25
+Create Date: 2026-10-17 09:12:40.381562
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a2c5f81d39'
+down_revision: Union[str, None] = 'd4c93a1e7b25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('import_format', sa.String(length=10), nullable=False),
+        sa.Column('input_path', sa.String(length=255), nullable=False),
+        sa.Column('input_size', sa.BigInteger(), nullable=False),
+        sa.Column('result_path', sa.String(length=255), nullable=True),
+        sa.Column('processed', sa.BigInteger(), nullable=False),
+        sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_jobs_unfinished', 'jobs', ['id'], unique=False,
+        postgresql_where=sa.text("status IN ('pending', 'running')")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobs_unfinished', table_name='jobs', postgresql_where=sa.text("status IN ('pending', 'running')"))
+    op.drop_table('jobs')
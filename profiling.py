@@ -0,0 +1,124 @@
+# profiling.py
+"""
+請求層級的效能剖析與慢請求日誌。
+
+- 剖析：請求帶有 X-Profile 標頭且值等於 PROFILE_TOKEN，或依 PROFILE_SAMPLE_RATE 抽樣時，
+  以 cProfile 剖析該請求並寫入 PROFILE_DIR (.prof，可用 snakeviz 或 pstats 檢視)；
+  PROFILER=pyinstrument 且已安裝 pyinstrument 時改寫成 .html 報表。
+  未設定 PROFILE_DIR 時完全停用，不影響正常請求。
+- 慢請求日誌：處理時間超過 SLOW_REQUEST_MS 的請求以 WARNING 記錄，
+  並拆分 SQL 時間 (metrics.init_app 累計的 g.db_query_time) 與其餘的 Python 時間。
+
+剖析與計時都只涵蓋到 after_request 為止，串流回應 (NDJSON / CSV) 的輸出時間不計入。
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+
+try:
+    import pyinstrument
+except ImportError: # pyinstrument 為選用套件，未安裝時使用 cProfile
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv('PROFILE_DIR')
+# 以 X-Profile 標頭觸發剖析時需要的權杖；未設定時不接受標頭觸發
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+# 不帶標頭的請求被抽樣剖析的比例 (0 ~ 1)，預設 0 表示只剖析帶標頭的請求
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILER = os.getenv('PROFILER', 'cprofile').lower()
+PROFILE_HEADER = 'X-Profile'
+# 超過此毫秒數的請求記錄為慢請求，0 表示停用
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '1000'))
+
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def should_profile(header_value):
+    """
+    判斷這個請求是否需要剖析 (標頭權杖相符或被抽樣到)。
+    """
+    if not PROFILE_DIR:
+        return False
+    if PROFILE_TOKEN and header_value == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start_profiler():
+    """
+    開始剖析，回傳 profiler；同一時間已有其他剖析器在執行 (例如另一個執行緒的請求) 時回傳 None。
+    """
+    try:
+        if PROFILER == 'pyinstrument' and pyinstrument is not None:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+    except (ValueError, RuntimeError) as e:
+        logger.debug("略過請求剖析: %s", e)
+        return None
+    return profiler
+
+
+def write_profile(profiler, method, route, duration):
+    """
+    停止剖析並寫入 PROFILE_DIR，回傳檔案路徑。
+    檔名包含時間、方法、路由與耗時，方便依檔名挑出最慢的請求。
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    route_name = _UNSAFE_FILENAME_CHARS.sub('_', route).strip('_') or 'root'
+    basename = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{method}-{route_name}-{duration * 1000:.0f}ms"
+    if pyinstrument is not None and isinstance(profiler, pyinstrument.Profiler):
+        profiler.stop()
+        path = os.path.join(PROFILE_DIR, basename + '.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        path = os.path.join(PROFILE_DIR, basename + '.prof')
+        profiler.dump_stats(path)
+    return path
+
+
+def init_app(app):
+    """
+    為 Flask 應用程式註冊請求剖析與慢請求日誌；需在 metrics.init_app 之後呼叫，
+    以使用其記錄的請求開始時間與 SQL 查詢時間。
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_profiling():
+        if should_profile(request.headers.get(PROFILE_HEADER)):
+            g.profiler = start_profiler()
+
+    @app.after_request
+    def _finish_profiling(response):
+        started = g.get("request_started")
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            try:
+                path = write_profile(profiler, request.method, route, duration)
+                logger.info("已寫入請求剖析結果: %s", path)
+            except OSError as e:
+                logger.warning("寫入請求剖析結果失敗: %s", e)
+
+        if SLOW_REQUEST_MS and duration * 1000 >= SLOW_REQUEST_MS:
+            sql_time = g.get("db_query_time", 0.0)
+            logger.warning(
+                "慢請求: %s %s -> %d，共 %.1f ms (SQL %.1f ms / %d 個查詢，Python %.1f ms)",
+                request.method, request.full_path.rstrip('?'), response.status_code, duration * 1000,
+                sql_time * 1000, g.get("db_query_count", 0), (duration - sql_time) * 1000
+            )
+        return response
@@ -1,22 +1,48 @@
 # scheduler_worker.py
+import logging
+import os
 import time
-from app import app, scheduler # 從 app.py 導入 app 和 scheduler 實例
-
-print("--- scheduler_worker.py: 準備啟動 APScheduler ---", flush=True)
-
-with app.app_context(): # 確保在 Flask 應用程式上下文中啟動排程器
-    if not scheduler.running:
-        try:
-            scheduler.start()
-            print("--- scheduler_worker.py: APScheduler 已成功啟動 ---", flush=True)
-        except Exception as e:
-            print(f"--- scheduler_worker.py: APScheduler 啟動失敗: {e} ---", flush=True)
-
-try:
-    while True:
-        time.sleep(1)
-except (KeyboardInterrupt, SystemExit):
-    if scheduler.running:
-        scheduler.shutdown()
-        print("--- scheduler_worker.py: APScheduler 已停止 ---", flush=True)
-    print("--- scheduler_worker.py: 腳本終止 ---", flush=True)
\ No newline at end of file
+import jobs
+import metrics
+
+logger = logging.getLogger("scheduler_worker")
+
+
+def main():
+    # 在 main 中才導入 app：背景工作的程序池以 forkserver 啟動子程序，子程序會重新導入本腳本，
+    # 放在這裡可避免每個子程序都載入 app.py 並啟動排程器
+    from app import app, scheduler, schedule_job_processing, schedule_next_fetch_awards, refresh_draw_snapshot # 從 app.py 導入 app 和 scheduler 實例
+
+    # 排程器沒有 HTTP 路由，設定 METRICS_PORT 時另開一個埠輸出爬蟲等監控指標
+    if os.getenv('METRICS_PORT'):
+        metrics.start_metrics_server(int(os.getenv('METRICS_PORT')))
+
+    logger.info("--- scheduler_worker.py: 準備啟動 APScheduler ---")
+
+    with app.app_context(): # 確保在 Flask 應用程式上下文中啟動排程器
+        if not scheduler.running:
+            try:
+                scheduler.start()
+                logger.info("--- scheduler_worker.py: APScheduler 已成功啟動 ---")
+                # 依開獎日程排定第一次抓取，之後每次執行完會自行排定下一次
+                schedule_next_fetch_awards()
+                # 啟動時確保開獎資料快照與資料庫一致 (未設定 DRAW_SNAPSHOT_PATH 時不做任何事)
+                refresh_draw_snapshot()
+                # 定期領取 web 建立的大型對獎與匯入工作，交給程序池處理
+                schedule_job_processing()
+            except Exception as e:
+                logger.exception("--- scheduler_worker.py: APScheduler 啟動失敗: %s ---", e)
+
+    try:
+        while True:
+            time.sleep(1)
+    except (KeyboardInterrupt, SystemExit):
+        if scheduler.running:
+            scheduler.shutdown()
+            logger.info("--- scheduler_worker.py: APScheduler 已停止 ---")
+        jobs.shutdown_executor()
+        logger.info("--- scheduler_worker.py: 腳本終止 ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# serializers.py
+"""
+發票與獎項的共用序列化，以及 JSON 編碼。
+
+- invoice_to_dict / award_to_dict 以屬性名稱取值，查詢結果的資料列 (只選取需要的欄位) 與 ORM 物件都適用；
+  列表 API 只查詢 INVOICE_FIELDS / AWARD_FIELDS 欄位，不建立 ORM 物件。
+- dumps / dumps_bytes / loads：dumps 為緊湊、依鍵排序、不跳脫中文的 JSON；安裝 orjson 時由 orjson 編碼，
+  否則使用標準函式庫，兩者輸出的內容相同。
+- OrjsonProvider 讓 Flask 的 jsonify 與 request.get_json 也使用 orjson。
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: # orjson 為選用套件，未安裝時使用標準函式庫的 json
+    orjson = None
+
+# 列表與單筆 API 輸出的欄位 (依此順序查詢)
+INVOICE_FIELDS = ("id", "invoice_number", "invoice_date", "winning_status", "award_id")
+AWARD_FIELDS = ("id", "prize_name", "winning_numbers", "award_date")
+
+if orjson is not None:
+    # 日期與時間交給 default 處理 (與標準函式庫一致)，其餘型別由 orjson 原生編碼
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def invoice_to_dict(invoice):
+    return {
+        "id": invoice.id,
+        "invoice_number": invoice.invoice_number,
+        "invoice_date": invoice.invoice_date.isoformat(),
+        "winning_status": invoice.winning_status,
+        "award_id": invoice.award_id # 即使為 None 也會顯示
+    }
+
+
+def award_to_dict(award):
+    return {
+        "id": award.id,
+        "prize_name": award.prize_name,
+        "winning_numbers": award.winning_numbers,
+        "award_date": award.award_date.isoformat()
+    }
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def dumps_bytes(obj):
+    """
+    將 obj 編碼成 UTF-8 JSON bytes；orjson 無法編碼的內容 (例如超過 64 位元的整數、非字串的鍵) 改用標準函式庫。
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+        except TypeError:
+            pass
+    return _stdlib_dumps(obj).encode("utf-8")
+
+
+def dumps(obj):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode("utf-8")
+        except TypeError:
+            pass
+    return _stdlib_dumps(obj)
+
+
+def loads(s):
+    """
+    解析 JSON (str 或 bytes)，格式錯誤時拋出 ValueError。
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            pass # 交給標準函式庫 (支援超過 64 位元的整數，格式錯誤時拋出相同的 ValueError)
+    return json.loads(s)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    以 orjson 編碼回應、解析請求的 Flask JSON provider；
+    需要 orjson 不支援的設定 (ensure_ascii、不排序) 或內容時，交給 Flask 預設的實作。
+    """
+
+    def _orjson_options(self, kwargs):
+        if orjson is None or self.ensure_ascii or not self.sort_keys:
+            return None
+        if kwargs.get("indent"):
+            return _ORJSON_OPTIONS | orjson.OPT_INDENT_2
+        return _ORJSON_OPTIONS
+
+    def dumps(self, obj, **kwargs):
+        option = self._orjson_options(kwargs)
+        if option is not None:
+            try:
+                return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if not kwargs:
+            return loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        dump_args = {}
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            dump_args["indent"] = 2
+        option = self._orjson_options(dump_args)
+        if option is not None:
+            try:
+                # 直接在輸出結尾加上換行，不需再複製一次整個回應
+                body = orjson.dumps(obj, default=self.default, option=option | orjson.OPT_APPEND_NEWLINE)
+                return self._app.response_class(body, mimetype=self.mimetype)
+            except TypeError:
+                pass
+        return super().response(*args, **kwargs)